@@ -0,0 +1,283 @@
+"""
+Bulk DOI lookups in data repositories for the journal scrapers
+
+The repository searches of detect_replication_package start with queries for
+the paper's DOI. A DoiIndex answers those queries for a whole CrossRef page at
+once: `prefetch_steps` sends one OR-ed query per chunk of DOIs to DataCite,
+Zenodo and Harvard Dataverse and maps each dataset found back to the papers it
+references, so a page of 100 papers costs a few requests per repository instead
+of 100 (300 for Dataverse, which was searched three ways per DOI). A DOI that
+was not prefetched (or whose chunk failed) is looked up with a query of its own.
+
+DataCite comes first: most Zenodo, Dataverse, openICPSR and OSF deposits have a
+DataCite DOI whose metadata declares it `IsSupplementTo` the paper, so the
+relations of DataCite resolve most papers before any repository search runs.
+"""
+
+import logging
+import re
+from typing import Callable, Dict, Iterable, List, Optional
+
+from replication_cache import normalize_doi
+from scraper_utils import HttpRequest, MemoCache, Steps
+
+logger = logging.getLogger(__name__)
+
+DATACITE_DOIS_URL = 'https://api.datacite.org/dois'
+ZENODO_RECORDS_URL = 'https://zenodo.org/api/records'
+DATAVERSE_SEARCH_URL = 'https://dataverse.harvard.edu/api/search'
+
+# DOIs per OR-ed query: enough to save most requests, few enough to keep URLs short
+DOI_CHUNK_SIZE = 25
+
+# Candidate datasets kept per DOI (the one-by-one searches checked the top 5)
+MAX_HITS_PER_DOI = 5
+
+# Zenodo results per page (the maximum for anonymous requests) and pages per query
+ZENODO_PAGE_SIZE = 25
+MAX_PAGES_PER_QUERY = 4
+
+# Dataverse and DataCite results per page (both APIs allow up to 1000)
+DATAVERSE_PAGE_SIZE = 100
+DATACITE_PAGE_SIZE = 100
+
+# DataCite resource types that are publications rather than replication packages
+DATACITE_EXCLUDED_TYPES = ('Text', 'JournalArticle', 'Preprint', 'Book', 'BookChapter',
+                           'ConferencePaper', 'Dissertation', 'PeerReview', 'Report')
+
+# Sources whose search runs first in every search chain: DOIs they resolve are not
+# looked up in the other repositories
+FIRST_PASS_SOURCES = ('datacite',)
+
+# Paper DOIs remembered per repository by a DoiIndex
+DOI_INDEX_SIZE = 100000
+
+# A lookup takes the DOIs of a chunk (as given) and returns the dataset URLs found for
+# each of them by normalized DOI, or None if the query failed
+Lookup = Callable[[List[str]], Steps[Optional[Dict[str, List[str]]]]]
+
+
+def _chunks(items: List[str], size: int) -> Iterable[List[str]]:
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def mentions_doi(text: str, doi: str) -> bool:
+    """Whether lowercase text cites a normalized DOI itself, not a longer DOI starting with it
+
+    The DOI must not follow a word character or a dot, and may only be followed by
+    closing punctuation before a space, quote, tag, separator or the end of the text
+    (so 10.1016/j.x.2023.10485 is not found in '10.1016/j.x.2023.104851').
+    """
+    return re.search(r'(?<![\w.])' + re.escape(doi) + r'[.)\]]*(?=[\s"\'<>;,&]|$)', text) is not None
+
+
+def datacite_lookup_steps(dois: List[str]) -> Steps[Optional[Dict[str, List[str]]]]:
+    """DataCite DOIs that declare they are a supplement to each of a chunk of paper DOIs
+
+    One query asks for every DataCite record with one of the DOIs among its related
+    identifiers; a record belongs to a paper if the relation is IsSupplementTo. Its
+    URL is the landing page registered with DataCite (e.g. the Zenodo record).
+    """
+    found: Dict[str, List[str]] = {normalize_doi(doi): [] for doi in dois}
+    variants = dict.fromkeys(v for doi in dois for v in (doi, doi.lower()))
+    params = {
+        'query': 'relatedIdentifiers.relatedIdentifier:(' + ' OR '.join(f'"{doi}"' for doi in variants) + ')',
+        'page[size]': min(DATACITE_PAGE_SIZE, MAX_HITS_PER_DOI * len(dois))
+    }
+
+    fetched = 0
+    for page in range(1, MAX_PAGES_PER_QUERY + 1):
+        response = yield HttpRequest(DATACITE_DOIS_URL, params={**params, 'page[number]': page}, timeout=10)
+        if response.status_code != 200:
+            return None
+        data = response.json()
+        records = data.get('data', [])
+
+        for record in records:
+            attributes = record.get('attributes', {})
+            if attributes.get('types', {}).get('resourceTypeGeneral') in DATACITE_EXCLUDED_TYPES:
+                continue
+            url = attributes.get('url') or f"https://doi.org/{attributes.get('doi') or record.get('id')}"
+
+            for related in attributes.get('relatedIdentifiers', []):
+                doi = normalize_doi(str(related.get('relatedIdentifier', '')))
+                if related.get('relationType') == 'IsSupplementTo' and doi in found and \
+                        url not in found[doi] and len(found[doi]) < MAX_HITS_PER_DOI:
+                    found[doi].append(url)
+
+        fetched += len(records)
+        if len(records) < params['page[size]'] or fetched >= data.get('meta', {}).get('total', 0):
+            break
+
+    return found
+
+
+def zenodo_lookup_steps(dois: List[str]) -> Steps[Optional[Dict[str, List[str]]]]:
+    """Zenodo datasets referencing each of a chunk of DOIs, found with one OR-ed query
+
+    A dataset belongs to a paper if the paper's DOI is one of its related identifiers
+    or is cited in its description (see mentions_doi): all the papers of a chunk come
+    from the same journal, so a DOI can be the start of another paper's DOI.
+    """
+    found: Dict[str, List[str]] = {normalize_doi(doi): [] for doi in dois}
+    max_results = MAX_HITS_PER_DOI * len(dois)
+    params = {
+        'q': ' OR '.join(f'related.identifier:"{doi}" OR "{doi}"' for doi in dois),
+        'type': 'dataset',
+        'size': min(ZENODO_PAGE_SIZE, max_results)
+    }
+
+    fetched = 0
+    for page in range(1, MAX_PAGES_PER_QUERY + 1):
+        response = yield HttpRequest(ZENODO_RECORDS_URL, params={**params, 'page': page}, timeout=10)
+        if response.status_code != 200:
+            return None
+        data = response.json()
+        hits = data.get('hits', {}).get('hits', [])
+
+        for hit in hits:
+            metadata = hit.get('metadata', {})
+            related_ids = [normalize_doi(str(rel_id.get('identifier', '')))
+                           for rel_id in metadata.get('related_identifiers', [])]
+            description = metadata.get('description', '').lower()
+            url = f"https://zenodo.org/record/{hit['id']}"
+
+            for doi, urls in found.items():
+                if len(urls) < MAX_HITS_PER_DOI and (doi in related_ids or mentions_doi(description, doi)):
+                    urls.append(url)
+
+        fetched += len(hits)
+        if len(hits) < params['size'] or fetched >= max_results or \
+                fetched >= data.get('hits', {}).get('total', 0):
+            break
+
+    return found
+
+
+def dataverse_url(global_id: str) -> str:
+    """Landing page URL of a Dataverse dataset from its global id (doi:..., hdl:...)"""
+    if global_id.startswith('doi:'):
+        return f"https://doi.org/{global_id.replace('doi:', '')}"
+    elif global_id.startswith('hdl:'):
+        return f"https://hdl.handle.net/{global_id.replace('hdl:', '')}"
+    return f"https://dataverse.harvard.edu/dataset.xhtml?persistentId={global_id}"
+
+
+# Fields holding related publications: of the entries of a Dataverse search result's
+# 'publications', and of the result itself (whose 'url' is the dataset's own page)
+DATAVERSE_PUBLICATION_FIELDS = ('url', 'citation', 'publicationIdValue', 'publicationURL', 'publicationCitation')
+DATAVERSE_RESULT_FIELDS = ('publicationIdValue', 'relatedPublication')
+
+
+def _dataverse_publications(item: Dict) -> List[str]:
+    """Lowercase publication references (URLs, citations, ids) of a Dataverse search result"""
+    values = [item.get(field) for field in DATAVERSE_RESULT_FIELDS]
+    values += [publication.get(field) for publication in item.get('publications') or []
+               if isinstance(publication, dict) for field in DATAVERSE_PUBLICATION_FIELDS]
+    references = []
+    for value in values:
+        references += [v.lower() for v in (value if isinstance(value, list) else [value]) if isinstance(v, str)]
+    return references
+
+
+def dataverse_lookup_steps(dois: List[str]) -> Steps[Optional[Dict[str, List[str]]]]:
+    """Harvard Dataverse datasets referencing each of a chunk of DOIs, found with one OR-ed query
+
+    Each DOI is matched as publication ID, as related publication and anywhere in the
+    dataset, like the three queries of the one-by-one search. A result is mapped to
+    the DOIs its publications cite exactly (see mentions_doi), not to DOIs found
+    elsewhere in the record (references, description) or starting the cited DOI; if a
+    result matches none of them, the DOIs left without a dataset are not answered, so
+    they are queried one by one again rather than missed.
+    """
+    found: Dict[str, List[str]] = {normalize_doi(doi): [] for doi in dois}
+    max_results = MAX_HITS_PER_DOI * len(dois)
+    params = {
+        'q': ' OR '.join(f'publicationIdValue:"{doi}" OR "{doi}" OR relatedPublication:"{doi}"' for doi in dois),
+        'type': 'dataset',
+        'per_page': min(DATAVERSE_PAGE_SIZE, max_results)
+    }
+
+    unmatched = False
+    fetched = 0
+    for _ in range(MAX_PAGES_PER_QUERY):
+        response = yield HttpRequest(DATAVERSE_SEARCH_URL, params={**params, 'start': fetched}, timeout=10)
+        if response.status_code != 200:
+            return None
+        data = response.json().get('data', {})
+        items = data.get('items', [])
+
+        for item in items:
+            global_id = item.get('global_id', '')
+            if not global_id:
+                continue
+            url = dataverse_url(global_id)
+            publications = _dataverse_publications(item)
+            matches = [doi for doi in found if any(normalize_doi(reference) == doi or mentions_doi(reference, doi)
+                                                   for reference in publications)] \
+                if len(found) > 1 else list(found)
+            unmatched = unmatched or not matches
+            for doi in matches:
+                if len(found[doi]) < MAX_HITS_PER_DOI:
+                    found[doi].append(url)
+
+        fetched += len(items)
+        if len(items) < params['per_page'] or fetched >= max_results or fetched >= data.get('total_count', 0):
+            break
+
+    if unmatched:
+        return {doi: urls for doi, urls in found.items() if urls}
+    return found
+
+
+# Bulk lookups by repository, in the order prefetch_steps runs them
+LOOKUPS: Dict[str, Lookup] = {
+    'datacite': datacite_lookup_steps,
+    'zenodo': zenodo_lookup_steps,
+    'dataverse': dataverse_lookup_steps,
+}
+
+
+class DoiIndex:
+    """Thread-safe index of the repository datasets found for paper DOIs"""
+
+    def __init__(self, maxsize: int = DOI_INDEX_SIZE):
+        """
+        Args:
+            maxsize: Number of (repository, DOI) entries kept, least recently used first out
+        """
+        self._entries = MemoCache(maxsize)
+
+    def prefetch_steps(self, dois: Iterable[str]) -> Steps[None]:
+        """Look up every DOI not in the index yet, with one query per chunk and repository"""
+        dois = list({normalize_doi(doi): doi for doi in dois if doi and doi != 'N/A'}.items())
+        resolved = set()
+        for source in LOOKUPS:
+            new = [doi for key, doi in dois if key not in resolved and self._entries.get((source, key)) is None]
+            for chunk in _chunks(new, DOI_CHUNK_SIZE):
+                yield from self._lookup_steps(source, chunk)
+            if source in FIRST_PASS_SOURCES:
+                resolved.update(key for key, _ in dois if self._entries.get((source, key)))
+
+    def lookup_steps(self, source: str, doi: str) -> Steps[List[str]]:
+        """URLs of the datasets of a repository referencing a DOI, from the index or a query of its own"""
+        urls = self._entries.get((source, normalize_doi(doi)))
+        if urls is None:
+            found = yield from self._lookup_steps(source, [doi])
+            urls = found.get(normalize_doi(doi), [])
+        return urls
+
+    def _lookup_steps(self, source: str, dois: List[str]) -> Steps[Dict[str, List[str]]]:
+        try:
+            found = yield from LOOKUPS[source](dois)
+        except Exception as e:
+            logger.debug(f"Bulk {source} lookup error: {e}")
+            found = None
+
+        if found is None:
+            # Not recorded, so these DOIs are queried again when their papers are searched
+            return {}
+        for doi, urls in found.items():
+            self._entries.put((source, doi), urls)
+        return found
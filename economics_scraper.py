@@ -3,29 +3,89 @@ Economics Journal Scraper - Top 15 Economics Journals
 Based on RePEc rankings and journal impact factors
 """
 
-import requests
 import pandas as pd
-import time
 import logging
-from typing import List, Dict, Optional, Tuple
+import os
+from typing import Iterator, List, Dict, Optional, Tuple
 from collections import defaultdict
+from itertools import count
 import re
-from bs4 import BeautifulSoup
+import asyncio
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from bulk_lookup import DoiIndex
+from html_pages import HtmlPage, KeywordScan, parse_html
+from incremental_sync import SyncState, merge_results, sync_date
+from openicpsr_index import OpenICPSRIndex
+from paper_store import PaperStore
+from replication_cache import ReplicationCache
+from response_cache import ResponseCache
+from scrape_checkpoint import DEFAULT_CHECKPOINT_PATH, ScrapeCheckpoint
+from scraper_utils import (CROSSREF_MAX_ROWS, VERIFY_CACHE_SIZE, VERIFY_MAX_BYTES, AsyncHttpClient, HttpRequest,
+                           JournalCheck, MemoCache, RateLimiter, Steps, TransportConfig, TransportWatch,
+                           create_session, crossref_rows, fetch_crossref_batch, first_hit_steps, iter_threaded,
+                           normalize_url, run_steps, run_steps_async, url_is_live_steps)
+from topic_matcher import TopicMatcher, paper_texts
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Strings whose presence in a page's text indicates replication content, and how many
+# of them a page needs to pass verify_url_has_content
+CONTENT_INDICATORS = [
+    'download', 'dataset', 'replication', 'supplementary',
+    'code', 'data files', '.zip', '.tar', '.do', '.R', '.py'
+]
+MIN_CONTENT_INDICATORS = 2
+
+# Topic keywords whose occurrences count double in classify_paper_topic
+WEIGHTED_TOPIC_KEYWORDS = [
+    'monetary policy', 'fiscal policy', 'unemployment', 'wage', 'trade', 'poverty',
+    'regression', 'causal', 'climate change'
+]
+
 class EconomicsJournalScraper:
     """Scraper for top economics journals using CrossRef API"""
 
-    def __init__(self):
-        """Initialize with journal mappings for top 15 economics journals"""
-        self.session = requests.Session()
-        self.session.headers.update({
+    def __init__(self, rate_limiter: Optional[RateLimiter] = None, cache: Optional[ResponseCache] = None,
+                 replication_cache: Optional[ReplicationCache] = None, parallel_search: bool = False,
+                 transport: Optional[TransportConfig] = None, openicpsr_index: Optional[OpenICPSRIndex] = None):
+        """Initialize with journal mappings for top 15 economics journals
+
+        Args:
+            rate_limiter: Per-host RateLimiter for all requests (default: RateLimiter() with
+                          DEFAULT_RATE_LIMITS); pass one instance to share limits between scrapers
+            cache: On-disk ResponseCache (e.g. SQLiteResponseCache('http_cache.sqlite')) that
+                   answers repeated requests without hitting the network; None disables caching
+            replication_cache: ReplicationCache of earlier detect_replication_package results by DOI;
+                               papers with a known package are not searched again
+            parallel_search: Query the repositories of detect_replication_package all at once
+                             instead of one after another (the search order still decides
+                             which URL wins)
+            transport: Connection pool, keep-alive and retry settings shared by every request,
+                       sync or async (default: TransportConfig())
+            openicpsr_index: Local OpenICPSRIndex that search_openicpsr matches papers against
+                             instead of scraping openICPSR, once a harvest completed
+                             (see refresh_openicpsr_index)
+        """
+        self.rate_limiter = rate_limiter or RateLimiter()
+        self.cache = cache
+        self.replication_cache = replication_cache
+        self.parallel_search = parallel_search
+        self.transport = transport or TransportConfig()
+        self.openicpsr_index = openicpsr_index
+        self._openicpsr_index_warned = False
+        self.session = create_session({
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
             'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
-        })
+        }, self.rate_limiter, cache=cache, transport=self.transport)
+
+        # Verdicts of verify_url_has_content by normalised URL, so each URL is checked once per run
+        self.verify_cache = MemoCache(VERIFY_CACHE_SIZE)
+
+        # Datasets found for paper DOIs by the bulk repository lookups of each CrossRef page
+        self.doi_index = DoiIndex()
 
         # Top 15 Economics Journals with their ISSNs
         self.journal_issns = {
@@ -77,57 +137,95 @@ class EconomicsJournalScraper:
                                  'lobbying', 'conflict', 'war', 'governance']
         }
 
+        # Single-pass matcher of the topic keywords (see classify_paper_topic)
+        self.topic_matcher = TopicMatcher(self.topic_keywords, WEIGHTED_TOPIC_KEYWORDS)
+
     def verify_url_has_content(self, url: str) -> bool:
-        """Verify that a URL actually contains replication package content"""
-        try:
-            # Filter out API URLs and other non-replication URLs
-            excluded_patterns = [
-                'api.crossref.org/v1/works',
-                '/transform'
-            ]
-
-            url_lower = url.lower()
-            if any(pattern in url_lower for pattern in excluded_patterns):
-                logger.debug(f"URL excluded by pattern filter: {url}")
-                return False
-
-            # Allow known repository domains without full verification
-            trusted_domains = [
-                'zenodo.org/record',
-                'dataverse.harvard.edu',
-                'osf.io',
-                'figshare.com',
-                'pubs.aeaweb.org',  # AER journal pages
-                'econometricsociety.org'  # Econometrica
-            ]
-
-            if any(domain in url_lower for domain in trusted_domains):
-                # For trusted domains, just check if URL is accessible
-                response = self.session.get(url, timeout=10, allow_redirects=True)
-                return response.status_code == 200
-
-            # For other URLs, do full content verification
-            response = self.session.get(url, timeout=10, allow_redirects=True)
-            if response.status_code != 200:
-                return False
-
-            soup = BeautifulSoup(response.text, 'html.parser')
-
-            # Look for actual content indicators
-            content_indicators = [
-                'download', 'dataset', 'replication', 'supplementary',
-                'code', 'data files', '.zip', '.tar', '.do', '.R', '.py'
-            ]
-
-            page_text = soup.get_text().lower()
-            # Require at least 2 strong indicators
-            matches = sum(1 for indicator in content_indicators if indicator in page_text)
-            return matches >= 2
+        """Verify that a URL actually contains replication package content
 
+        Verdicts are memoized in self.verify_cache by normalised URL, unless the page could not
+        be fetched (request errors, or a status other than 2xx or 404/410).
+        """
+        return run_steps(self._verify_url_has_content_steps(url), self.session)
+
+    def _verify_url_has_content_steps(self, url: str) -> Steps[bool]:
+        """Step generator for verify_url_has_content (see scraper_utils.run_steps)"""
+        key = normalize_url(url)
+        verdict = self.verify_cache.get(key)
+        if verdict is not None:
+            return verdict
+
+        watch = TransportWatch()
+        try:
+            verdict = yield from watch.steps(self._check_url_content_steps(url))
         except Exception as e:
+            # Not memoized, so a later call can retry after a network error
             logger.debug(f"URL verification error for {url}: {e}")
             return False
 
+        # Only verdicts of a definitive answer are memoized: a throttled (429) or failing
+        # (5xx, 403, ...) server may serve the page on a later call
+        if watch.definitive:
+            self.verify_cache.put(key, verdict)
+        return verdict
+
+    def _check_url_content_steps(self, url: str) -> Steps[bool]:
+        """Download and check a URL for verify_url_has_content, without memoization"""
+        if self._is_excluded_url(url):
+            logger.debug(f"URL excluded by pattern filter: {url}")
+            return False
+
+        # For trusted domains, just check if URL is accessible (without downloading the page)
+        if self._is_trusted_url(url):
+            return (yield from url_is_live_steps(url))
+
+        # For other URLs, scan the page for content indicators while it downloads, and stop
+        # reading once enough are found (or after VERIFY_MAX_BYTES)
+        scan = KeywordScan(CONTENT_INDICATORS, MIN_CONTENT_INDICATORS)
+        response = yield HttpRequest(url, timeout=10, allow_redirects=True, scan=scan.feed,
+                                     max_bytes=VERIFY_MAX_BYTES)
+        return response.status_code == 200 and scan.close()
+
+    def _verify_fetched_page(self, url: str, soup: HtmlPage) -> bool:
+        """verify_url_has_content for a page that was already downloaded (status 200) and parsed"""
+        key = normalize_url(url)
+        verdict = self.verify_cache.get(key)
+        if verdict is None:
+            verdict = not self._is_excluded_url(url) and (self._is_trusted_url(url) or self._page_has_content(soup))
+            self.verify_cache.put(key, verdict)
+        return verdict
+
+    def _is_excluded_url(self, url: str) -> bool:
+        """Filter out API URLs and other non-replication URLs"""
+        excluded_patterns = [
+            'api.crossref.org/v1/works',
+            '/transform'
+        ]
+
+        url_lower = url.lower()
+        return any(pattern in url_lower for pattern in excluded_patterns)
+
+    def _is_trusted_url(self, url: str) -> bool:
+        """Allow known repository domains without full verification"""
+        trusted_domains = [
+            'zenodo.org/record',
+            'dataverse.harvard.edu',
+            'osf.io',
+            'figshare.com',
+            'pubs.aeaweb.org',  # AER journal pages
+            'econometricsociety.org'  # Econometrica
+        ]
+
+        url_lower = url.lower()
+        return any(domain in url_lower for domain in trusted_domains)
+
+    def _page_has_content(self, soup: HtmlPage) -> bool:
+        """Check a parsed page for replication content indicators"""
+        page_text = soup.get_text().lower()
+        # Require at least 2 strong indicators
+        matches = sum(1 for indicator in CONTENT_INDICATORS if indicator in page_text)
+        return matches >= MIN_CONTENT_INDICATORS
+
     def _calculate_title_similarity(self, title1: str, title2: str) -> float:
         """Calculate similarity between two titles (Jaccard similarity)"""
         words1 = set(w for w in title1.split() if len(w) > 3)
@@ -141,15 +239,29 @@ class EconomicsJournalScraper:
 
         return intersection / union if union > 0 else 0.0
 
+    def search_datacite(self, doi: str) -> Optional[str]:
+        """Find a dataset that DataCite records as a supplement to the paper (IsSupplementTo its DOI)"""
+        return run_steps(self._search_datacite_steps(doi), self.session)
+
+    def _search_datacite_steps(self, doi: str) -> Steps[Optional[str]]:
+        """Step generator for search_datacite (see scraper_utils.run_steps)"""
+        # Usually looked up in bulk for the whole CrossRef page (see _prefetch_dois)
+        urls = yield from self.doi_index.lookup_steps('datacite', doi)
+        return urls[0] if urls else None
+
     def search_osf(self, title: str, doi: str = '') -> Optional[str]:
         """Search Open Science Framework for replication packages"""
+        return run_steps(self._search_osf_steps(title, doi), self.session)
+
+    def _search_osf_steps(self, title: str, doi: str = '') -> Steps[Optional[str]]:
+        """Step generator for search_osf (see scraper_utils.run_steps)"""
         try:
             base_url = 'https://api.osf.io/v2/search/nodes/'
 
             # Strategy 1: Search by DOI
             if doi:
                 params = {'q': doi}
-                response = self.session.get(base_url, params=params, timeout=5)
+                response = yield HttpRequest(base_url, params=params, timeout=5)
                 if response.status_code == 200:
                     data = response.json()
                     results = data.get('data', [])
@@ -162,7 +274,7 @@ class EconomicsJournalScraper:
             search_title = ' '.join(title_words)
 
             params = {'q': search_title}
-            response = self.session.get(base_url, params=params, timeout=5)
+            response = yield HttpRequest(base_url, params=params, timeout=5)
             if response.status_code == 200:
                 data = response.json()
                 results = data.get('data', [])
@@ -181,40 +293,19 @@ class EconomicsJournalScraper:
 
     def search_zenodo(self, title: str, authors: str, doi: str = '') -> Optional[str]:
         """Search Zenodo for replication packages using DOI as primary method"""
+        return run_steps(self._search_zenodo_steps(title, authors, doi), self.session)
+
+    def _search_zenodo_steps(self, title: str, authors: str, doi: str = '') -> Steps[Optional[str]]:
+        """Step generator for search_zenodo (see scraper_utils.run_steps)"""
         try:
             # Strategy 1: Search by DOI (most accurate) - check if DOI is linked in Zenodo metadata
             if doi:
-                # Search for datasets related to this DOI
-                params = {
-                    'q': f'related.identifier:"{doi}" OR "{doi}"',
-                    'type': 'dataset',
-                    'size': 5
-                }
-
-                response = self.session.get('https://zenodo.org/api/records', params=params, timeout=5)
-                if response.status_code == 200:
-                    data = response.json()
-                    hits = data.get('hits', {}).get('hits', [])
-
-                    for hit in hits:
-                        metadata = hit.get('metadata', {})
-
-                        # Check if this dataset explicitly references our DOI in related_identifiers
-                        related_ids = metadata.get('related_identifiers', [])
-                        doi_match = any(
-                            doi.lower() in str(rel_id.get('identifier', '')).lower()
-                            for rel_id in related_ids
-                        )
-
-                        # Also check in description for DOI
-                        description = metadata.get('description', '').lower()
-                        doi_in_description = doi.lower() in description
-
-                        if doi_match or doi_in_description:
-                            url = f"https://zenodo.org/record/{hit['id']}"
-                            # Verify the URL actually has replication content
-                            if self.verify_url_has_content(url):
-                                return url
+                # Datasets referencing this DOI in their related_identifiers or description,
+                # usually looked up in bulk for the whole CrossRef page (see _prefetch_dois)
+                for url in (yield from self.doi_index.lookup_steps('zenodo', doi)):
+                    # Verify the URL actually has replication content
+                    if (yield from self._verify_url_has_content_steps(url)):
+                        return url
 
             # Strategy 2: Search by title and author (fallback)
             clean_title = re.sub(r'[^\w\s]', ' ', title).strip()
@@ -234,7 +325,7 @@ class EconomicsJournalScraper:
                 'size': 5
             }
 
-            response = self.session.get('https://zenodo.org/api/records', params=params, timeout=3)
+            response = yield HttpRequest('https://zenodo.org/api/records', params=params, timeout=3)
             if response.status_code == 200:
                 data = response.json()
                 hits = data.get('hits', {}).get('hits', [])
@@ -265,7 +356,7 @@ class EconomicsJournalScraper:
                         if similarity >= 0.5 or (author_match and similarity >= 0.3):
                             url = f"https://zenodo.org/record/{hit['id']}"
                             # Verify before returning
-                            if self.verify_url_has_content(url):
+                            if (yield from self._verify_url_has_content_steps(url)):
                                 return url
 
         except Exception as e:
@@ -275,39 +366,21 @@ class EconomicsJournalScraper:
 
     def search_harvard_dataverse(self, title: str, doi: str = '', authors: str = '') -> Optional[str]:
         """Search Harvard Dataverse for replication packages using DOI as primary method"""
+        return run_steps(self._search_harvard_dataverse_steps(title, doi, authors), self.session)
+
+    def _search_harvard_dataverse_steps(self, title: str, doi: str = '', authors: str = '') -> Steps[Optional[str]]:
+        """Step generator for search_harvard_dataverse (see scraper_utils.run_steps)"""
         try:
             base_url = 'https://dataverse.harvard.edu/api/search'
 
             # Strategy 1: Search by DOI (most accurate)
             if doi:
-                # Search for datasets that reference this DOI
-                search_queries = [
-                    f'publicationIdValue:"{doi}"',  # Direct DOI reference
-                    f'"{doi}"',  # DOI mentioned anywhere
-                    f'relatedPublication:"{doi}"'  # Related publication field
-                ]
-
-                for query in search_queries:
-                    params = {
-                        'q': query,
-                        'type': 'dataset',
-                        'per_page': 5
-                    }
-
-                    response = self.session.get(base_url, params=params, timeout=5)
-                    if response.status_code == 200:
-                        data = response.json()
-                        items = data.get('data', {}).get('items', [])
-                        if items:
-                            # Return the first matching dataset
-                            global_id = items[0].get('global_id', '')
-                            if global_id:
-                                if global_id.startswith('doi:'):
-                                    return f"https://doi.org/{global_id.replace('doi:', '')}"
-                                elif global_id.startswith('hdl:'):
-                                    return f"https://hdl.handle.net/{global_id.replace('hdl:', '')}"
-                                else:
-                                    return f"https://dataverse.harvard.edu/dataset.xhtml?persistentId={global_id}"
+                # Datasets that reference this DOI (as publication ID, related publication or
+                # anywhere), usually looked up in bulk for the whole CrossRef page (see _prefetch_dois)
+                urls = yield from self.doi_index.lookup_steps('dataverse', doi)
+                if urls:
+                    # Return the first matching dataset
+                    return urls[0]
 
             # Strategy 2: Search by title (fallback)
             clean_title = re.sub(r'[^\w\s]', ' ', title).strip()
@@ -321,7 +394,7 @@ class EconomicsJournalScraper:
                 'per_page': 5
             }
 
-            response = self.session.get(base_url, params=params, timeout=3)
+            response = yield HttpRequest(base_url, params=params, timeout=3)
             if response.status_code == 200:
                 data = response.json()
                 items = data.get('data', {}).get('items', [])
@@ -362,6 +435,19 @@ class EconomicsJournalScraper:
         2. Use title similarity scoring
         3. Match author names
         """
+        return run_steps(self._search_openicpsr_steps(title, doi, authors), self.session)
+
+    def _search_openicpsr_steps(self, title: str, doi: str = '', authors: str = '') -> Steps[Optional[str]]:
+        """Step generator for search_openicpsr (see scraper_utils.run_steps)"""
+        if self.openicpsr_index is not None:
+            if self.openicpsr_index.ready:
+                # Match by DOI, then by title, in memory: no search or project pages to fetch
+                return (doi and self.openicpsr_index.match_doi(doi)) or self.openicpsr_index.match_title(title, authors)
+            if not self._openicpsr_index_warned:
+                self._openicpsr_index_warned = True
+                logger.warning("The openICPSR index has no completed harvest (see refresh_openicpsr_index): "
+                               "searching openICPSR pages instead")
+
         try:
             # Strategy 1: Try direct DOI-based search in openICPSR
             if doi:
@@ -370,9 +456,9 @@ class EconomicsJournalScraper:
                 search_url = f"https://www.openicpsr.org/openicpsr/search/studies?q={doi_clean}"
 
                 try:
-                    response = self.session.get(search_url, timeout=10)
+                    response = yield HttpRequest(search_url, timeout=10)
                     if response.status_code == 200:
-                        soup = BeautifulSoup(response.text, 'html.parser')
+                        soup = parse_html(response.text, only=['a'])
                         study_links = soup.find_all('a', href=re.compile(r'/openicpsr/project/\d+', re.I))
 
                         if study_links:
@@ -385,7 +471,7 @@ class EconomicsJournalScraper:
                                     study_url = study_href
 
                                 try:
-                                    study_response = self.session.get(study_url, timeout=8)
+                                    study_response = yield HttpRequest(study_url, timeout=8)
                                     if study_response.status_code == 200:
                                         study_text = study_response.text.lower()
                                         # Check if DOI is mentioned on the page
@@ -405,9 +491,9 @@ class EconomicsJournalScraper:
             search_query = '+'.join(search_words)
             search_url = f"https://www.openicpsr.org/openicpsr/search/studies?q={search_query}"
 
-            response = self.session.get(search_url, timeout=10)
+            response = yield HttpRequest(search_url, timeout=10)
             if response.status_code == 200:
-                soup = BeautifulSoup(response.text, 'html.parser')
+                soup = parse_html(response.text, only=['a'])
 
                 # Look for study result items - openICPSR has result containers
                 # Find all study links in search results
@@ -426,9 +512,9 @@ class EconomicsJournalScraper:
                             study_url = study_href
 
                         try:
-                            study_response = self.session.get(study_url, timeout=8)
+                            study_response = yield HttpRequest(study_url, timeout=8)
                             if study_response.status_code == 200:
-                                study_soup = BeautifulSoup(study_response.text, 'html.parser')
+                                study_soup = parse_html(study_response.text)
                                 study_text = study_soup.get_text().lower()
 
                                 # Extract the study title from the page
@@ -476,21 +562,34 @@ class EconomicsJournalScraper:
 
         return None
 
+    def refresh_openicpsr_index(self) -> int:
+        """Harvest the openICPSR projects added or changed since the last refresh of openicpsr_index
+
+        The first refresh harvests every project. Returns the number of projects stored.
+        """
+        if self.openicpsr_index is None:
+            raise ValueError("No openicpsr_index was given to the scraper")
+        return run_steps(self.openicpsr_index.refresh_steps(), self.session)
+
     def check_aer_replication_package(self, doi: str) -> Optional[str]:
         """
         Check AER/AEA paper pages for replication package links
         AER papers are accessible at: https://www.aeaweb.org/articles?id={doi}
         """
+        return run_steps(self._check_aer_replication_package_steps(doi), self.session)
+
+    def _check_aer_replication_package_steps(self, doi: str) -> Steps[Optional[str]]:
+        """Step generator for check_aer_replication_package (see scraper_utils.run_steps)"""
         try:
             if not doi:
                 return None
 
             # Access the AER article page
             article_url = f"https://www.aeaweb.org/articles?id={doi}"
-            response = self.session.get(article_url, timeout=15)
+            response = yield HttpRequest(article_url, timeout=15)
 
             if response.status_code == 200:
-                soup = BeautifulSoup(response.text, 'html.parser')
+                soup = parse_html(response.text, only=['a'])
 
                 # Look for "Replication Package" link
                 # AER papers typically have a link with text "Replication Package"
@@ -527,22 +626,33 @@ class EconomicsJournalScraper:
 
         return None
 
-    def check_journal_supporting_info(self, doi: str, journal: str) -> Optional[str]:
-        """Check for supporting information on journal websites with actual verification"""
+    def check_journal_supporting_info(self, doi: str, journal: str) -> Optional[JournalCheck]:
+        """Check for supporting information on journal websites with actual verification
+
+        Returns a JournalCheck with the page URL, the parsed page and whether it passes
+        verify_url_has_content (judged on the page already downloaded), or None.
+        """
+        return run_steps(self._check_journal_supporting_info_steps(doi, journal), self.session)
+
+    def _check_journal_supporting_info_steps(self, doi: str, journal: str) -> Steps[Optional[JournalCheck]]:
+        """Step generator for check_journal_supporting_info (see scraper_utils.run_steps)"""
         try:
             if not doi:
                 return None
 
             # American Economic Association journals (AER, etc.)
             if 'American Economic Review' in journal:
-                # Use the specialized AER checker
-                return self.check_aer_replication_package(doi)
+                # Use the specialized AER checker (it doesn't keep the page, so verify by URL)
+                aer_url = yield from self._check_aer_replication_package_steps(doi)
+                if aer_url:
+                    return JournalCheck(aer_url, None, (yield from self._verify_url_has_content_steps(aer_url)))
+                return None
 
             # Quarterly Journal of Economics (Oxford)
             elif 'Quarterly Journal of Economics' in journal:
-                response = self.session.get(f'https://doi.org/{doi}', timeout=10, allow_redirects=True)
+                response = yield HttpRequest(f'https://doi.org/{doi}', timeout=10, allow_redirects=True)
                 if response.status_code == 200 and 'academic.oup.com' in response.url:
-                    soup = BeautifulSoup(response.text, 'html.parser')
+                    soup = parse_html(response.text)
                     page_text = soup.get_text().lower()
 
                     # Look for supplementary data section with actual files
@@ -551,13 +661,13 @@ class EconomicsJournalScraper:
                     has_download = soup.find_all('a', href=re.compile(r'download|supplementary', re.I))
 
                     if (supplementary_section and has_data_files) or has_download:
-                        return response.url
+                        return self._journal_check(response.url, soup)
 
             # Journal of Political Economy (Chicago)
             elif 'Journal of Political Economy' in journal:
-                response = self.session.get(f'https://doi.org/{doi}', timeout=10, allow_redirects=True)
+                response = yield HttpRequest(f'https://doi.org/{doi}', timeout=10, allow_redirects=True)
                 if response.status_code == 200:
-                    soup = BeautifulSoup(response.text, 'html.parser')
+                    soup = parse_html(response.text)
                     page_text = soup.get_text().lower()
 
                     # Check for actual supplemental material with data/code
@@ -566,13 +676,13 @@ class EconomicsJournalScraper:
                     has_download = soup.find_all('a', href=re.compile(r'supplement|download', re.I))
 
                     if has_supplement and (has_data_code or has_download):
-                        return response.url
+                        return self._journal_check(response.url, soup)
 
             # Econometrica (Wiley / Econometric Society)
             elif 'Econometrica' in journal:
-                response = self.session.get(f'https://doi.org/{doi}', timeout=10, allow_redirects=True)
+                response = yield HttpRequest(f'https://doi.org/{doi}', timeout=10, allow_redirects=True)
                 if response.status_code == 200:
-                    soup = BeautifulSoup(response.text, 'html.parser')
+                    soup = parse_html(response.text)
                     page_text = soup.get_text().lower()
 
                     # Econometrica has strict data/code requirements since 2019
@@ -583,13 +693,13 @@ class EconomicsJournalScraper:
 
                     # If any of these strong indicators are present, the paper has replication materials
                     if has_supplementary or has_replication or has_data_code:
-                        return response.url
+                        return self._journal_check(response.url, soup)
 
             # Review of Economic Studies (Oxford)
             elif 'Review of Economic Studies' in journal:
-                response = self.session.get(f'https://doi.org/{doi}', timeout=10, allow_redirects=True)
+                response = yield HttpRequest(f'https://doi.org/{doi}', timeout=10, allow_redirects=True)
                 if response.status_code == 200 and 'academic.oup.com' in response.url:
-                    soup = BeautifulSoup(response.text, 'html.parser')
+                    soup = parse_html(response.text)
                     page_text = soup.get_text().lower()
 
                     # Check for supplementary data with replication materials
@@ -598,15 +708,15 @@ class EconomicsJournalScraper:
                     has_download = soup.find_all('a', href=re.compile(r'download|supplementary', re.I))
 
                     if (supplementary_section and has_replication) or (has_download and 'data' in page_text):
-                        return response.url
+                        return self._journal_check(response.url, soup)
 
             # Elsevier journals
             elif journal in ['Journal of Economic Theory', 'Journal of Monetary Economics',
                             'Journal of International Economics', 'Journal of Public Economics',
                             'Journal of Development Economics']:
-                response = self.session.get(f'https://doi.org/{doi}', timeout=10, allow_redirects=True)
+                response = yield HttpRequest(f'https://doi.org/{doi}', timeout=10, allow_redirects=True)
                 if response.status_code == 200 and 'sciencedirect.com' in response.url:
-                    soup = BeautifulSoup(response.text, 'html.parser')
+                    soup = parse_html(response.text)
                     page_text = soup.get_text().lower()
 
                     # Check for research data or supplementary content
@@ -615,13 +725,32 @@ class EconomicsJournalScraper:
                     has_download = soup.find_all('a', href=re.compile(r'download|mmc|supplementary', re.I))
 
                     if (has_research_data or has_supplementary) and has_download:
-                        return response.url
+                        return self._journal_check(response.url, soup)
 
         except Exception as e:
             logger.debug(f"Journal supporting info check error: {e}")
 
         return None
 
+    def _journal_check(self, url: str, soup: HtmlPage) -> JournalCheck:
+        """Result of a journal page check, verified on the already-fetched page"""
+        return JournalCheck(url, soup, self._verify_fetched_page(url, soup))
+
+    def _prefetch_dois(self, dois: List[str]):
+        """Look up a page of DOIs in the repositories in bulk (see _prefetch_dois_steps)"""
+        run_steps(self._prefetch_dois_steps(dois), self.session)
+
+    def _prefetch_dois_steps(self, dois: List[str]) -> Steps[None]:
+        """Look up the DOIs of a page of papers in bulk, ahead of their one-by-one searches
+
+        The DOI searches of the repositories then answer from self.doi_index instead of
+        sending a query per paper (see bulk_lookup.DoiIndex).
+        """
+        if self.replication_cache is not None:
+            # Papers with a cached result are never searched
+            dois = [doi for doi in dois if doi and self.replication_cache.get(doi) is None]
+        yield from self.doi_index.prefetch_steps(dois)
+
     def detect_replication_package(self, title: str, abstract: str, doi: str = '',
                                  journal: str = '', authors: str = '', check_external: bool = True) -> Tuple[int, str]:
         """
@@ -630,13 +759,40 @@ class EconomicsJournalScraper:
 
         Hierarchical search strategy:
         1. Check abstract/title for direct links
-        2. For AER papers: prioritize openICPSR
-        3. For other journals: Zenodo → Harvard Dataverse → OSF → openICPSR
-        4. Check journal websites
+        2. Look up DataCite relations (deposits declaring IsSupplementTo the DOI)
+        3. For AER papers: prioritize openICPSR
+        4. For other journals: Zenodo → Harvard Dataverse → OSF → openICPSR
+        5. Check journal websites
 
         Args:
             check_external: If True, search external repositories (slower but more thorough)
         """
+        return run_steps(self._detect_replication_package_steps(title, abstract, doi, journal, authors,
+                                                                check_external), self.session)
+
+    def _detect_replication_package_steps(self, title: str, abstract: str, doi: str = '',
+                                 journal: str = '', authors: str = '', check_external: bool = True) -> Steps[Tuple[int, str]]:
+        """Step generator for detect_replication_package (see scraper_utils.run_steps)"""
+        # Only full searches are cached: without external repositories a miss proves little
+        use_cache = self.replication_cache is not None and doi and check_external
+        if use_cache:
+            cached = self.replication_cache.get(doi)
+            if cached is not None:
+                return cached.has_package, cached.url
+
+        watch = TransportWatch()
+        has_package, package_url = yield from watch.steps(self._search_replication_package_steps(
+            title, abstract, doi, journal, authors, check_external))
+
+        # A miss is only stored if every repository answered: one that was throttled or
+        # unreachable would hide the paper's package until the negative TTL expires
+        if use_cache and (has_package or not watch.failed):
+            self.replication_cache.put(doi, has_package, package_url)
+        return has_package, package_url
+
+    def _search_replication_package_steps(self, title: str, abstract: str, doi: str = '',
+                                 journal: str = '', authors: str = '', check_external: bool = True) -> Steps[Tuple[int, str]]:
+        """Run the repository search chain of detect_replication_package, bypassing the replication cache"""
         # First check abstract/title for direct links
         text = f"{title} {abstract}".lower()
 
@@ -649,7 +805,7 @@ class EconomicsJournalScraper:
             if any(repo in url.lower() for repo in ['github.com', 'zenodo.org', 'dataverse.harvard.edu',
                                                     'figshare.com', 'osf.io', 'openicpsr.org']):
                 # Verify the URL actually works and has content
-                if self.verify_url_has_content(url):
+                if (yield from self._verify_url_has_content_steps(url)):
                     return 1, url
 
         # Check for replication indicators in text
@@ -670,6 +826,13 @@ class EconomicsJournalScraper:
                 'supplement' in text
             )
 
+            searches = []
+
+            # 0. DataCite relations: deposits (Zenodo, Dataverse, openICPSR, OSF) that declare
+            # they supplement this paper resolve it before any search by title
+            if doi:
+                searches.append(self._search_datacite_steps(doi))
+
             if should_search_external or True:  # Always search for better coverage
                 # HIERARCHICAL SEARCH STRATEGY
                 # For American Economic Review and AEA journals: prioritize openICPSR
@@ -684,100 +847,89 @@ class EconomicsJournalScraper:
 
                     # 1. Check AER paper page first (most reliable for AER)
                     if doi and 'American Economic Review' in journal:
-                        aer_url = self.check_aer_replication_package(doi)
-                        if aer_url:
-                            return 1, aer_url
-
-                    # 2. Search openICPSR directly (fallback)
-                    icpsr_url = self.search_openicpsr(title, doi, authors)
-                    if icpsr_url:
-                        return 1, icpsr_url
-
-                    # 3. Fallback to Zenodo (some authors upload there too)
-                    zenodo_url = self.search_zenodo(title, authors, doi)
-                    if zenodo_url:
-                        return 1, zenodo_url
-
-                    # 3. Harvard Dataverse
-                    dataverse_url = self.search_harvard_dataverse(title, doi, authors)
-                    if dataverse_url:
-                        return 1, dataverse_url
-
-                    # 4. OSF
-                    osf_url = self.search_osf(title, doi)
-                    if osf_url:
-                        return 1, osf_url
+                        searches.append(self._check_aer_replication_package_steps(doi))
+
+                    searches += [
+                        # 2. Search openICPSR directly (fallback)
+                        self._search_openicpsr_steps(title, doi, authors),
+                        # 3. Fallback to Zenodo (some authors upload there too)
+                        self._search_zenodo_steps(title, authors, doi),
+                        # 4. Harvard Dataverse
+                        self._search_harvard_dataverse_steps(title, doi, authors),
+                        # 5. OSF
+                        self._search_osf_steps(title, doi),
+                    ]
 
                 else:
                     # For non-AEA journals: Zenodo → Dataverse → OSF → openICPSR
                     # Zenodo is most commonly used for general economics papers
-
-                    # 1. Search Zenodo (most popular for European/international journals)
-                    zenodo_url = self.search_zenodo(title, authors, doi)
-                    if zenodo_url:
-                        return 1, zenodo_url
-
-                    # 2. Search Harvard Dataverse (popular in US)
-                    dataverse_url = self.search_harvard_dataverse(title, doi, authors)
-                    if dataverse_url:
-                        return 1, dataverse_url
-
-                    # 3. Search OSF
-                    osf_url = self.search_osf(title, doi)
-                    if osf_url:
-                        return 1, osf_url
-
-                    # 4. Try openICPSR as last resort (less common but some non-AEA use it)
-                    icpsr_url = self.search_openicpsr(title, doi, authors)
-                    if icpsr_url:
-                        return 1, icpsr_url
+                    searches += [
+                        # 1. Search Zenodo (most popular for European/international journals)
+                        self._search_zenodo_steps(title, authors, doi),
+                        # 2. Search Harvard Dataverse (popular in US)
+                        self._search_harvard_dataverse_steps(title, doi, authors),
+                        # 3. Search OSF
+                        self._search_osf_steps(title, doi),
+                        # 4. Try openICPSR as last resort (less common but some non-AEA use it)
+                        self._search_openicpsr_steps(title, doi, authors),
+                    ]
 
             # 5. ALWAYS check journal page (works for Econometrica, QJE, RES, etc.)
             # This runs regardless of text content since abstracts may be missing
             if doi:
-                journal_url = self.check_journal_supporting_info(doi, journal)
-                if journal_url and self.verify_url_has_content(journal_url):
-                    return 1, journal_url
+                searches.append(self._journal_page_url_steps(doi, journal))
+
+            # The first search in this order that finds a package wins, also with parallel_search
+            url = yield from first_hit_steps(searches, self.parallel_search)
+            if url:
+                return 1, url
 
         # Don't return false positives - only return 1 if we found and verified something
         return 0, ''
 
+    def _journal_page_url_steps(self, doi: str, journal: str) -> Steps[Optional[str]]:
+        """URL of the paper's journal page if check_journal_supporting_info verified it has content"""
+        journal_check = yield from self._check_journal_supporting_info_steps(doi, journal)
+        return journal_check.url if journal_check and journal_check.verified else None
+
     def classify_paper_topic(self, title: str, abstract: str) -> str:
-        """Classify a paper into one of the economics topics based on title and abstract"""
-        text = f"{title} {abstract}".lower()
+        """Classify a paper into one of the economics topics based on title and abstract
 
-        # Score each topic based on keyword matches
-        topic_scores = {}
+        Each topic scores the occurrences of its keywords in the text (keywords in
+        WEIGHTED_TOPIC_KEYWORDS count double), all counted in one pass by self.topic_matcher.
+        """
+        text = f"{title} {abstract}".lower()
 
-        for topic, keywords in self.topic_keywords.items():
-            score = 0
-            for keyword in keywords:
-                # Count occurrences (weighted by keyword importance)
-                keyword_lower = keyword.lower()
-                occurrences = text.count(keyword_lower)
+        # The highest-scoring topic, or 'general_economics' if no keyword matches
+        return self._compiled_topic_matcher().classify(text, 'general_economics')
 
-                # Give extra weight to certain important keywords
-                if keyword_lower in ['monetary policy', 'fiscal policy', 'unemployment', 'wage',
-                                    'trade', 'poverty', 'regression', 'causal', 'climate change']:
-                    occurrences *= 2
+    def classify_topics(self, df: pd.DataFrame) -> pd.Series:
+        """Classify every paper of a result set at once, e.g. after editing topic_keywords
 
-                score += occurrences
+        Gives each paper the topic classify_paper_topic would, scoring all papers
+        against all topics with sparse keyword counts and NumPy (see
+        TopicMatcher.classify_texts), so a whole archive is relabelled in seconds.
 
-            topic_scores[topic] = score
+        Args:
+            df: Papers with a 'title' and, if available, an 'abstract' column
 
-        # Find the topic with the highest score
-        if topic_scores:
-            best_topic = max(topic_scores, key=topic_scores.get)
-            # Only assign if there's at least some match
-            if topic_scores[best_topic] > 0:
-                return best_topic
+        Returns:
+            Topic of each paper, on the index of df (assign it to df['topic'])
+        """
+        topics = self._compiled_topic_matcher().classify_texts(paper_texts(df).tolist(), 'general_economics')
+        return pd.Series(topics, index=df.index, name='topic')
 
-        # Default to 'general_economics' if no strong match
-        return 'general_economics'
+    def _compiled_topic_matcher(self) -> TopicMatcher:
+        """self.topic_matcher, compiled again if topic_keywords was changed since"""
+        if self.topic_matcher.topic_keywords != self.topic_keywords:
+            self.topic_matcher = TopicMatcher(self.topic_keywords, WEIGHTED_TOPIC_KEYWORDS)
+        return self.topic_matcher
 
     def scrape_journal(self, journal_name: str, start_year: int, end_year: int,
                       min_papers: int = 10, check_external_repos: bool = True,
-                      num_papers: Optional[int] = None) -> List[Dict]:
+                      num_papers: Optional[int] = None, max_workers: int = 1,
+                      since: Optional[str] = None, fetch_all: bool = False,
+                      checkpoint: Optional[ScrapeCheckpoint] = None) -> List[Dict]:
         """Scrape papers from a single journal
 
         Args:
@@ -787,6 +939,188 @@ class EconomicsJournalScraper:
             min_papers: Minimum number of papers to collect (default: 10)
             check_external_repos: If True, search external repositories for replication packages
             num_papers: If specified, collect exactly this many papers (overrides min_papers)
+            max_workers: Number of threads used to process each CrossRef page (default: 1, serial)
+            since: Only fetch works CrossRef indexed (added or updated) on or after this date,
+                   e.g. '2025-01-31' (see sync_all_journals)
+            fetch_all: Fetch every matching work, ignoring min_papers and num_papers
+            checkpoint: ScrapeCheckpoint recording the progress of the scrape and restoring
+                        earlier progress (see scrape_all_journals)
+        """
+        return list(self._iter_journal(journal_name, start_year, end_year, min_papers, check_external_repos,
+                                       num_papers, max_workers, since, fetch_all, checkpoint=checkpoint))
+
+    def _iter_journal(self, journal_name: str, start_year: int, end_year: int,
+                      min_papers: int = 10, check_external_repos: bool = True,
+                      num_papers: Optional[int] = None, max_workers: int = 1,
+                      since: Optional[str] = None, fetch_all: bool = False,
+                      harvest_only: bool = False,
+                      checkpoint: Optional[ScrapeCheckpoint] = None) -> Iterator[Dict]:
+        """Generator behind scrape_journal: yields each paper as soon as it is processed
+
+        With harvest_only, papers are parsed by _parse_metadata, without replication detection.
+        With a checkpoint, papers restored from it come first, and new papers, page cursors
+        and the completion of the journal are recorded in it.
+        """
+        collected = 0
+        failed = False
+        issn = self.journal_issns.get(journal_name)
+
+        if not issn:
+            logger.error(f"No ISSN found for {journal_name}")
+            return
+
+        base_url = 'https://api.crossref.org/works'
+
+        if fetch_all:
+            num_papers = None
+
+        # Use num_papers if specified, otherwise use min_papers
+        target_papers = num_papers if num_papers is not None else min_papers
+
+        # Deep paging with a CrossRef cursor: unlike offsets it works past 10,000 items
+        # and doesn't slow down on later pages, so there is no cap on requests
+        rows_per_request = CROSSREF_MAX_ROWS if fetch_all else crossref_rows(target_papers)
+        cursor = '*'
+
+        logger.info(f"Scraping {journal_name} (ISSN: {issn}) from {start_year} to {end_year}")
+        if since:
+            logger.info(f"  Only works indexed since {since}")
+        logger.info(f"  Target: {'all' if fetch_all else target_papers} papers")
+
+        # Continue a checkpointed run: restore the papers done and skip them when they come up again
+        done_dois = set()
+        if checkpoint:
+            restored = checkpoint.papers(journal_name)
+            yield from restored
+            collected = len(restored)
+            done_dois = {paper['doi'] for paper in restored if paper.get('doi')}
+            if checkpoint.is_finished(journal_name) or (not fetch_all and collected >= target_papers):
+                logger.info(f"  ✅ Restored {collected} papers for {journal_name} from checkpoint")
+                return
+            cursor = checkpoint.cursor(journal_name) or cursor
+
+        for request_num in count():
+            params = {
+                'filter': f'issn:{issn},from-pub-date:{start_year},until-pub-date:{end_year}'
+                          + (f',from-index-date:{since}' if since else ''),
+                'rows': rows_per_request,
+                'cursor': cursor,
+                'select': 'title,author,published-print,published-online,DOI,abstract,container-title',
+                'sort': 'published',
+                'order': 'desc'
+            }
+
+            try:
+                response = self.session.get(base_url, params=params, timeout=30)
+
+                if request_num == 0 and cursor != '*' and not (response.status_code == 200 and
+                                                               response.json().get('message', {}).get('items')):
+                    # CrossRef cursors expire a few minutes after their last use: start over
+                    # from the first page instead, skipping the papers already done
+                    logger.info(f"  Checkpointed cursor expired, restarting {journal_name} from the first page")
+                    cursor = params['cursor'] = '*'
+                    response = self.session.get(base_url, params=params, timeout=30)
+
+                if response.status_code == 200:
+                    data = response.json()
+                    items = data.get('message', {}).get('items', [])
+                    total_results = data.get('message', {}).get('total-results', 0)
+
+                    logger.info(f"  Request {request_num + 1}: Got {len(items)} papers (Total available: {total_results})")
+
+                    # If num_papers is specified, stop when we reach exactly that number
+                    remaining = num_papers - collected if num_papers is not None else None
+                    new_items = [item for item in items if item.get('DOI') not in done_dois]
+                    for paper in self._iter_page(new_items, journal_name, check_external_repos,
+                                                 max_workers, remaining, harvest_only):
+                        if checkpoint:
+                            checkpoint.add_paper(journal_name, paper)
+                        collected += 1
+                        yield paper
+
+                    # Check if we have enough papers
+                    if not fetch_all and collected >= target_papers:
+                        logger.info(f"  ✅ Collected {collected} papers for {journal_name}")
+                        break
+
+                    # Check if there are more results
+                    if len(items) < rows_per_request:
+                        break  # No more results
+
+                    cursor = data.get('message', {}).get('next-cursor')
+                    if not cursor:
+                        break
+                    if checkpoint:
+                        checkpoint.set_cursor(journal_name, cursor)
+
+                else:
+                    if fetch_all:
+                        raise RuntimeError(f"API error: {response.status_code}")
+                    logger.error(f"  API error: {response.status_code}")
+                    failed = True
+                    break
+
+            except Exception as e:
+                logger.error(f"  Error fetching data: {e}")
+                if fetch_all:
+                    # An incomplete fetch must not be recorded as synced (see sync_all_journals)
+                    raise
+                failed = True
+                break
+
+        if not fetch_all and collected < target_papers:
+            logger.warning(f"  ⚠️  Only found {collected} papers for {journal_name} (target: {target_papers})")
+
+        if checkpoint and not failed:
+            checkpoint.finish_journal(journal_name)
+
+    def _iter_page(self, items: List[dict], journal_name: str, check_external_repos: bool = True,
+                   max_workers: int = 1, limit: Optional[int] = None,
+                   harvest_only: bool = False) -> Iterator[Dict]:
+        """Parse a page of CrossRef items, yielding papers in CrossRef order
+
+        With max_workers > 1, all items are submitted to a thread pool at once (replication
+        detection is network-bound) and each paper is yielded as soon as it and the papers
+        before it are done. Once `limit` papers are yielded, or the caller stops iterating,
+        items that have not started yet are cancelled. With harvest_only, items are parsed
+        serially by _parse_metadata (no network calls, so nothing to parallelize).
+        """
+        if check_external_repos and not harvest_only:
+            self._prefetch_dois([item.get('DOI', '') for item in items])
+        executor = ThreadPoolExecutor(max_workers=max_workers) if max_workers > 1 and not harvest_only else None
+        futures = []
+
+        try:
+            if executor:
+                futures = [executor.submit(self._parse_paper, item, journal_name, check_external_repos)
+                           for item in items]
+                results = (future.result() for future in futures)
+            elif harvest_only:
+                results = (self._parse_metadata(item, journal_name) for item in items)
+            else:
+                results = (self._parse_paper(item, journal_name, check_external_repos) for item in items)
+
+            collected = 0
+            for paper in results:
+                if paper:
+                    yield paper
+                    collected += 1
+                    if limit is not None and collected >= limit:
+                        break
+        finally:
+            for future in futures:
+                future.cancel()
+            if executor:
+                executor.shutdown()
+
+    async def scrape_journal_async(self, client: AsyncHttpClient, journal_name: str, start_year: int,
+                                   end_year: int, min_papers: int = 10, check_external_repos: bool = True,
+                                   num_papers: Optional[int] = None) -> List[Dict]:
+        """Async version of scrape_journal: all papers of a CrossRef page are checked concurrently
+
+        Args:
+            client: Open AsyncHttpClient used for every request
+            (other arguments as in scrape_journal)
         """
         papers = []
         issn = self.journal_issns.get(journal_name)
@@ -800,43 +1134,39 @@ class EconomicsJournalScraper:
         # Use num_papers if specified, otherwise use min_papers
         target_papers = num_papers if num_papers is not None else min_papers
 
-        # Calculate how many papers we need per request
-        rows_per_request = 50
-        offset = 0
-        max_requests = 20  # Maximum requests to prevent infinite loops
+        # Deep paging with a CrossRef cursor: unlike offsets it works past 10,000 items
+        # and doesn't slow down on later pages, so there is no cap on requests
+        rows_per_request = crossref_rows(target_papers)
+        cursor = '*'
 
         logger.info(f"Scraping {journal_name} (ISSN: {issn}) from {start_year} to {end_year}")
         logger.info(f"  Target: {target_papers} papers")
 
-        for request_num in range(max_requests):
+        for request_num in count():
             params = {
                 'filter': f'issn:{issn},from-pub-date:{start_year},until-pub-date:{end_year}',
                 'rows': rows_per_request,
-                'offset': offset,
+                'cursor': cursor,
                 'select': 'title,author,published-print,published-online,DOI,abstract,container-title',
                 'sort': 'published',
                 'order': 'desc'
             }
 
             try:
-                time.sleep(1)  # Be polite to the API
-                response = self.session.get(base_url, params=params, timeout=30)
+                response = await client.get(HttpRequest(base_url, params=params, timeout=30))
 
                 if response.status_code == 200:
                     data = response.json()
                     items = data.get('message', {}).get('items', [])
                     total_results = data.get('message', {}).get('total-results', 0)
 
-                    logger.info(f"  Request {request_num + 1}: Got {len(items)} papers (Total available: {total_results})")
-
-                    for item in items:
-                        paper = self._parse_paper(item, journal_name, check_external_repos)
-                        if paper:
-                            papers.append(paper)
+                    logger.info(f"  {journal_name} request {request_num + 1}: Got {len(items)} papers "
+                                f"(Total available: {total_results})")
 
-                            # If num_papers is specified, stop when we reach exactly that number
-                            if num_papers is not None and len(papers) >= num_papers:
-                                break
+                    # If num_papers is specified, stop when we reach exactly that number
+                    remaining = num_papers - len(papers) if num_papers is not None else None
+                    papers.extend(await self._parse_page_async(client, items, journal_name,
+                                                               check_external_repos, remaining))
 
                     # Check if we have enough papers
                     if len(papers) >= target_papers:
@@ -847,14 +1177,16 @@ class EconomicsJournalScraper:
                     if len(items) < rows_per_request:
                         break  # No more results
 
-                    offset += rows_per_request
+                    cursor = data.get('message', {}).get('next-cursor')
+                    if not cursor:
+                        break
 
                 else:
-                    logger.error(f"  API error: {response.status_code}")
+                    logger.error(f"  API error for {journal_name}: {response.status_code}")
                     break
 
             except Exception as e:
-                logger.error(f"  Error fetching data: {e}")
+                logger.error(f"  Error fetching data for {journal_name}: {e}")
                 break
 
         if len(papers) < target_papers:
@@ -862,8 +1194,46 @@ class EconomicsJournalScraper:
 
         return papers
 
+    async def _parse_page_async(self, client: AsyncHttpClient, items: List[dict], journal_name: str,
+                                check_external_repos: bool = True, limit: Optional[int] = None) -> List[Dict]:
+        """Parse a page of CrossRef items concurrently, keeping CrossRef order (see _iter_page)"""
+        papers = []
+        if check_external_repos:
+            await run_steps_async(self._prefetch_dois_steps([item.get('DOI', '') for item in items]), client)
+        tasks = [asyncio.ensure_future(run_steps_async(
+                     self._parse_paper_steps(item, journal_name, check_external_repos), client))
+                 for item in items]
+
+        try:
+            for task in tasks:
+                paper = await task
+                if paper:
+                    papers.append(paper)
+                    if limit is not None and len(papers) >= limit:
+                        break
+        finally:
+            for task in tasks:
+                task.cancel()
+
+        return papers
+
     def _parse_paper(self, item: dict, journal_name: str, check_external_repos: bool = True) -> Optional[Dict]:
         """Parse a single paper from CrossRef response"""
+        return run_steps(self._parse_paper_steps(item, journal_name, check_external_repos), self.session)
+
+    def _parse_paper_steps(self, item: dict, journal_name: str, check_external_repos: bool = True) -> Steps[Optional[Dict]]:
+        """Step generator for _parse_paper (see scraper_utils.run_steps)"""
+        record = self._parse_metadata(item, journal_name)
+        if record is None:
+            return None
+        return (yield from self._enrich_paper_steps(record, check_external_repos))
+
+    def _parse_metadata(self, item: dict, journal_name: str) -> Optional[Dict]:
+        """Parse the metadata of a paper from CrossRef response, without any network call
+
+        The record has the columns of a paper with the replication fields still unset,
+        plus the abstract that replication detection needs (see _enrich_paper).
+        """
         try:
             # Title
             title = ' '.join(item.get('title', ['N/A']))
@@ -902,36 +1272,79 @@ class EconomicsJournalScraper:
             # Classify topic based on title and abstract
             topic = self.classify_paper_topic(title, abstract_full if abstract_full != 'N/A' else title)
 
+            return {
+                'title': title,
+                'authors': authors,
+                'journal': journal_name,
+                'topic': topic,  # Add classified topic
+                'replication_package': 0,
+                'replication_url': '',
+                'year': str(year),
+                'date': date,
+                'doi': doi,
+                'link': link,
+                'abstract': abstract_full
+            }
+
+        except Exception as e:
+            logger.debug(f"Error parsing paper: {e}")
+            return None
+
+    def _enrich_paper(self, record: Dict, check_external_repos: bool = True) -> Optional[Dict]:
+        """Detect the replication package of a record from _parse_metadata and return the finished paper
+
+        Returns None if the search failed: it raised, or it found no package while a
+        request failed in transport (see TransportWatch), so the miss proves nothing.
+        """
+        watch = TransportWatch()
+        paper = run_steps(watch.steps(self._enrich_paper_steps(record, check_external_repos)), self.session)
+        if paper is not None and not paper['replication_package'] and watch.failed:
+            return None
+        return paper
+
+    def _enrich_paper_steps(self, record: Dict, check_external_repos: bool = True) -> Steps[Optional[Dict]]:
+        """Step generator for _enrich_paper (see scraper_utils.run_steps)"""
+        try:
+            paper = dict(record)
+            title, authors = paper['title'], paper['authors']
+            abstract_full = paper.pop('abstract', 'N/A')
+
             # Detect replication package and get URL
-            has_replication, replication_url = self.detect_replication_package(
+            has_replication, replication_url = yield from self._detect_replication_package_steps(
                 title,
                 abstract_full if abstract_full != 'N/A' else title,
-                doi,
-                journal_name,
+                paper['doi'],
+                paper['journal'],
                 authors,
                 check_external=check_external_repos  # Control external API calls
             )
 
-            return {
+            paper.update({
                 'title': title[:300],  # Limit title length
                 'authors': authors[:500],  # Limit authors length
-                'journal': journal_name,
-                'topic': topic,  # Add classified topic
                 'replication_package': has_replication,  # Binary: 1 if has replication, 0 otherwise
-                'replication_url': replication_url,  # URL to replication package
-                'year': str(year),
-                'date': date,
-                'doi': doi,
-                'link': link
-            }
+                'replication_url': replication_url  # URL to replication package
+            })
+            return paper
 
         except Exception as e:
-            logger.debug(f"Error parsing paper: {e}")
+            logger.debug(f"Error detecting replication package: {e}")
             return None
 
+    def _parse_journal_items(self, items: List[dict], journal_name: str, check_external_repos: bool = True,
+                             num_papers: Optional[int] = None, max_workers: int = 1) -> List[Dict]:
+        """Parse the CrossRef items fetched for one journal by fetch_crossref_batch"""
+        papers = list(self._iter_page(items, journal_name, check_external_repos, max_workers, num_papers))
+
+        logger.info(f"  ✅ Collected {len(papers)} papers for {journal_name}")
+        return papers
+
     def scrape_all_journals(self, start_year: int = 2020, end_year: int = 2024,
                            topic: Optional[str] = None, min_papers_per_journal: int = 10,
-                           check_external_repos: bool = True, num_papers_per_journal: Optional[int] = None) -> pd.DataFrame:
+                           check_external_repos: bool = True, num_papers_per_journal: Optional[int] = None,
+                           max_workers: int = 1, journal_workers: int = 1,
+                           batch_crossref: bool = False, checkpoint_path: Optional[str] = None,
+                           resume: bool = False) -> pd.DataFrame:
         """Scrape all journals
 
         Args:
@@ -941,6 +1354,14 @@ class EconomicsJournalScraper:
             min_papers_per_journal: Minimum papers per journal (default: 10)
             check_external_repos: Search external repositories for replication packages
             num_papers_per_journal: If specified, collect exactly this many papers per journal
+            max_workers: Number of threads used to process each CrossRef page (default: 1, serial)
+            journal_workers: Number of journals scraped at the same time (default: 1, serial)
+            batch_crossref: Fetch the metadata of all journals with one CrossRef cursor stream
+                            instead of one per journal (default: False)
+            checkpoint_path: Record finished papers and CrossRef cursors in this file as the
+                             run goes (default: no checkpoint, or DEFAULT_CHECKPOINT_PATH with resume)
+            resume: Continue the run recorded in the checkpoint file: finished journals are
+                    restored without any request and the others continue where they stopped
         """
         all_papers = []
         journal_counts = defaultdict(int)
@@ -948,33 +1369,328 @@ class EconomicsJournalScraper:
         # Determine target papers per journal
         target_papers = num_papers_per_journal if num_papers_per_journal is not None else min_papers_per_journal
 
-        logger.info(f"\n{'='*70}")
-        logger.info(f"Starting scrape: {start_year}-{end_year}")
-        logger.info(f"Topic filter: {topic if topic else 'ALL TOPICS (no filter)'}")
-        logger.info(f"Target: {target_papers} papers per journal")
-        logger.info(f"External repository search: {'ENABLED' if check_external_repos else 'DISABLED'}")
-        logger.info(f"{'='*70}\n")
+        self._log_scrape_start(start_year, end_year, topic, target_papers, check_external_repos)
+
+        # If num_papers_per_journal is specified, use it; otherwise fetch more than min to allow for filtering
+        journal_target = min_papers_per_journal * 2 if num_papers_per_journal is None else target_papers
+
+        # Record progress as the run goes, so an interrupted run can be resumed
+        checkpoint = None
+        if checkpoint_path or resume:
+            run = {'scraper': type(self).__name__, 'start_year': start_year, 'end_year': end_year,
+                   'min_papers_per_journal': min_papers_per_journal,
+                   'num_papers_per_journal': num_papers_per_journal,
+                   'check_external_repos': check_external_repos, 'batch_crossref': batch_crossref}
+            checkpoint = ScrapeCheckpoint(checkpoint_path or DEFAULT_CHECKPOINT_PATH, run, resume)
+
+        journal_names = list(self.journal_issns.keys())
+        if batch_crossref:
+            pending = {name: issn for name, issn in self.journal_issns.items()
+                       if not (checkpoint and checkpoint.is_finished(name))}
+            journal_items = fetch_crossref_batch(self.session, pending, start_year, end_year,
+                                                 {name: journal_target for name in pending}) if pending else {}
+
+        def scrape(journal_name: str) -> List[Dict]:
+            if batch_crossref:
+                if checkpoint and checkpoint.is_finished(journal_name):
+                    return checkpoint.papers(journal_name)
+                papers = self._parse_journal_items(journal_items[journal_name], journal_name, check_external_repos,
+                                                   num_papers_per_journal, max_workers)
+                if checkpoint:
+                    checkpoint.finish_journal(journal_name, papers)
+                return papers
+            return self.scrape_journal(
+                journal_name,
+                start_year,
+                end_year,
+                min_papers=journal_target,
+                check_external_repos=check_external_repos,
+                num_papers=num_papers_per_journal,
+                max_workers=max_workers,
+                checkpoint=checkpoint
+            )
+
+        # Journals share self.session (and its connection pool); results are collected
+        # in journal order so the summary stays grouped by journal
+        if journal_workers > 1:
+            with ThreadPoolExecutor(max_workers=journal_workers) as executor:
+                results = list(executor.map(scrape, journal_names))
+        else:
+            results = map(scrape, journal_names)
+
+        for journal_name, papers in zip(journal_names, results):
+            papers = self._filter_by_topic(papers, topic)
+            all_papers.extend(papers)
+            journal_counts[journal_name] = len(papers)
+
+        if checkpoint:
+            checkpoint.close()
+
+        return self._summarize_results(all_papers, journal_counts, min_papers_per_journal)
 
-        for journal_name in self.journal_issns.keys():
-            # If num_papers_per_journal is specified, use it; otherwise fetch more than min to allow for filtering
-            papers = self.scrape_journal(
+    def iter_papers(self, start_year: int = 2020, end_year: int = 2024,
+                    topic: Optional[str] = None, min_papers_per_journal: int = 10,
+                    check_external_repos: bool = True, num_papers_per_journal: Optional[int] = None,
+                    max_workers: int = 1,
+                    journal_workers: int = 1) -> Iterator[Dict]:
+        """Stream the papers of all journals, yielding each one as soon as its replication check is done
+
+        Takes the same arguments as scrape_all_journals but never holds more than the
+        papers in flight, so results can be written out while the scrape is running:
+
+            for paper in scraper.iter_papers(2022, 2025, num_papers_per_journal=100):
+                writer.writerow(paper)
+
+        Args:
+            start_year: Starting year for papers
+            end_year: Ending year for papers
+            topic: Filter papers by topic (optional)
+            min_papers_per_journal: Minimum papers per journal (default: 10)
+            check_external_repos: Search external repositories for replication packages
+            num_papers_per_journal: If specified, collect exactly this many papers per journal
+            max_workers: Number of threads used to process each CrossRef page (default: 1, serial)
+            journal_workers: Number of journals scraped at the same time (default: 1, serial);
+                             with several, papers are yielded in the order they finish
+        """
+        target_papers = num_papers_per_journal if num_papers_per_journal is not None else min_papers_per_journal
+        self._log_scrape_start(start_year, end_year, topic, target_papers, check_external_repos)
+
+        # Same per-journal target as scrape_all_journals, so both return the same papers
+        journal_target = min_papers_per_journal * 2 if num_papers_per_journal is None else target_papers
+
+        def journal_papers(journal_name: str) -> Iterator[Dict]:
+            return self._iter_journal(
                 journal_name,
                 start_year,
                 end_year,
-                min_papers=min_papers_per_journal * 2 if num_papers_per_journal is None else target_papers,
+                min_papers=journal_target,
                 check_external_repos=check_external_repos,
-                num_papers=num_papers_per_journal
+                num_papers=num_papers_per_journal,
+                max_workers=max_workers
             )
 
-            # Apply topic filter if specified
-            if topic and topic in self.topic_keywords:
-                filtered_papers = [p for p in papers if p.get('topic') == topic]
-                logger.info(f"  After topic filter: {len(filtered_papers)} papers (from {len(papers)} total)")
-                papers = filtered_papers
+        journal_names = list(self.journal_issns.keys())
+        if journal_workers > 1:
+            papers = iter_threaded([lambda name=name: journal_papers(name) for name in journal_names],
+                                   journal_workers)
+        else:
+            papers = (paper for name in journal_names for paper in journal_papers(name))
+
+        for paper in papers:
+            if not topic or topic not in self.topic_keywords or paper.get('topic') == topic:
+                yield paper
+
+    async def scrape_all_journals_async(self, start_year: int = 2020, end_year: int = 2024,
+                                        topic: Optional[str] = None, min_papers_per_journal: int = 10,
+                                        check_external_repos: bool = True,
+                                        num_papers_per_journal: Optional[int] = None,
+                                        max_concurrency: int = 100, per_host_limit: int = 10,
+                                        host_limits: Optional[Dict[str, int]] = None) -> pd.DataFrame:
+        """Async version of scrape_all_journals (requires aiohttp)
+
+        All journals, CrossRef pages and repository searches run as coroutines on one
+        event loop. Use: df = asyncio.run(scraper.scrape_all_journals_async(...))
+
+        Args:
+            max_concurrency: Maximum number of HTTP requests in flight (default: 100)
+            per_host_limit: Maximum number of requests in flight per host (default: 10)
+            host_limits: Per-host overrides of per_host_limit, e.g. {'www.openicpsr.org': 2}
+            (other arguments as in scrape_all_journals)
+        """
+        target_papers = num_papers_per_journal if num_papers_per_journal is not None else min_papers_per_journal
+
+        self._log_scrape_start(start_year, end_year, topic, target_papers, check_external_repos)
+
+        async with AsyncHttpClient(self.session.headers, max_concurrency, per_host_limit, host_limits,
+                                   self.rate_limiter, cache=self.cache, transport=self.transport) as client:
+            results = await asyncio.gather(*(
+                self.scrape_journal_async(
+                    client,
+                    journal_name,
+                    start_year,
+                    end_year,
+                    min_papers=min_papers_per_journal * 2 if num_papers_per_journal is None else target_papers,
+                    check_external_repos=check_external_repos,
+                    num_papers=num_papers_per_journal
+                )
+                for journal_name in self.journal_issns
+            ))
+
+        all_papers = []
+        journal_counts = defaultdict(int)
 
+        for journal_name, papers in zip(self.journal_issns, results):
+            papers = self._filter_by_topic(papers, topic)
             all_papers.extend(papers)
             journal_counts[journal_name] = len(papers)
 
+        return self._summarize_results(all_papers, journal_counts, min_papers_per_journal)
+
+    def sync_all_journals(self, existing: pd.DataFrame, sync_state: SyncState, start_year: int = 2020,
+                          end_year: int = 2024, topic: Optional[str] = None, check_external_repos: bool = True,
+                          max_workers: int = 1, journal_workers: int = 1) -> pd.DataFrame:
+        """Incrementally update the results of an earlier scrape_all_journals run
+
+        Only works CrossRef indexed (added or updated) since each journal's last sync in
+        `sync_state` are fetched; journals never synced before are fetched in full. The
+        papers are merged into `existing` by DOI and the new sync dates are saved.
+
+        Args:
+            existing: Results of an earlier run (e.g. read back with pd.read_excel)
+            sync_state: SyncState holding the last sync date per ISSN
+            (other arguments as in scrape_all_journals)
+        """
+        started = sync_date()
+
+        logger.info(f"\n{'='*70}")
+        logger.info(f"Starting incremental sync: {start_year}-{end_year} ({len(existing)} existing papers)")
+        logger.info(f"{'='*70}\n")
+
+        def sync(journal_name: str) -> Optional[List[Dict]]:
+            try:
+                return self.scrape_journal(
+                    journal_name,
+                    start_year,
+                    end_year,
+                    check_external_repos=check_external_repos,
+                    max_workers=max_workers,
+                    since=sync_state.last_sync(self.journal_issns[journal_name]),
+                    fetch_all=True
+                )
+            except Exception:
+                logger.warning(f"  ⚠️  Sync of {journal_name} failed; it will be retried from its last sync date")
+                return None
+
+        journal_names = list(self.journal_issns.keys())
+        if journal_workers > 1:
+            with ThreadPoolExecutor(max_workers=journal_workers) as executor:
+                results = list(executor.map(sync, journal_names))
+        else:
+            results = map(sync, journal_names)
+
+        updates = []
+        for journal_name, papers in zip(journal_names, results):
+            if papers is None:
+                continue
+            papers = self._filter_by_topic(papers, topic)
+            updates.extend(papers)
+            sync_state.mark_synced(self.journal_issns[journal_name], started)
+            logger.info(f"  {journal_name}: {len(papers)} new or updated papers")
+
+        sync_state.save()
+
+        all_papers = merge_results(existing, updates)
+        journal_counts = defaultdict(int, {journal_name: 0 for journal_name in journal_names})
+        for paper in all_papers:
+            journal_counts[paper.get('journal')] += 1
+
+        return self._summarize_results(all_papers, journal_counts, 0)
+
+    def harvest_metadata(self, store: PaperStore, start_year: int = 2020, end_year: int = 2024,
+                         topic: Optional[str] = None, min_papers_per_journal: int = 10, num_papers_per_journal: Optional[int] = None,
+                         journal_workers: int = 1) -> int:
+        """Phase one of a two-phase scrape: store the CrossRef metadata of all journals
+
+        Only CrossRef is queried, so this takes seconds where scrape_all_journals takes
+        hours; enrich_papers then runs the replication searches over the stored records.
+        Papers already in the store (e.g. enriched by an earlier run) are left as they are.
+
+        Args:
+            store: PaperStore receiving the records
+            (other arguments as in scrape_all_journals)
+
+        Returns:
+            Number of new records stored
+        """
+        target_papers = num_papers_per_journal if num_papers_per_journal is not None else min_papers_per_journal
+        journal_target = min_papers_per_journal * 2 if num_papers_per_journal is None else target_papers
+
+        def harvest(journal_name: str) -> List[Dict]:
+            return list(self._iter_journal(journal_name, start_year, end_year, min_papers=journal_target,
+                                           num_papers=num_papers_per_journal, harvest_only=True))
+
+        journal_names = list(self.journal_issns.keys())
+        if journal_workers > 1:
+            with ThreadPoolExecutor(max_workers=journal_workers) as executor:
+                results = list(executor.map(harvest, journal_names))
+        else:
+            results = map(harvest, journal_names)
+
+        added = 0
+        for journal_name, records in zip(journal_names, results):
+            added += store.add(self._filter_by_topic(records, topic))
+
+        logger.info(f"Stored {added} new papers ({store.counts()['pending']} awaiting replication search)")
+        return added
+
+    def enrich_papers(self, store: PaperStore, check_external_repos: bool = True, max_workers: int = 8,
+                      limit: Optional[int] = None) -> pd.DataFrame:
+        """Phase two of a two-phase scrape: detect the replication packages of the stored papers
+
+        Papers are searched in parallel and each one is saved as soon as its search
+        finishes, so calling this again after an interruption continues with the
+        papers still pending. A paper whose search found nothing while a repository
+        could not be reached (connection error, timeout, 429 or 5xx) stays pending too.
+
+        Args:
+            store: PaperStore filled by harvest_metadata
+            check_external_repos: Search external repositories for replication packages
+            max_workers: Number of papers searched at the same time (default: 8)
+            limit: Search at most this many pending papers (default: all)
+
+        Returns:
+            DataFrame of every enriched paper in the store, as from scrape_all_journals
+        """
+        pending = store.pending(limit)
+        logger.info(f"Searching replication packages for {len(pending)} papers")
+        if check_external_repos:
+            self._prefetch_dois([record.get('doi', '') for record in pending])
+
+        failed = 0
+        executor = ThreadPoolExecutor(max_workers=max_workers)
+        try:
+            futures = [executor.submit(self._enrich_paper, record, check_external_repos) for record in pending]
+            for future in as_completed(futures):
+                paper = future.result()
+                if paper is None:
+                    failed += 1
+                else:
+                    store.update(paper)
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        if failed:
+            logger.warning(f"  ⚠️  {failed} searches failed or could not reach a repository; "
+                           f"those papers stay pending")
+
+        all_papers = store.records(enriched_only=True)
+        journal_counts = defaultdict(int, {journal_name: 0 for journal_name in self.journal_issns})
+        for paper in all_papers:
+            journal_counts[paper.get('journal')] += 1
+
+        return self._summarize_results(all_papers, journal_counts, 0)
+
+    def _log_scrape_start(self, start_year: int, end_year: int, topic: Optional[str],
+                          target_papers: int, check_external_repos: bool):
+        """Log the settings of a scrape_all_journals run"""
+        logger.info(f"\n{'='*70}")
+        logger.info(f"Starting scrape: {start_year}-{end_year}")
+        logger.info(f"Topic filter: {topic if topic else 'ALL TOPICS (no filter)'}")
+        logger.info(f"Target: {target_papers} papers per journal")
+        logger.info(f"External repository search: {'ENABLED' if check_external_repos else 'DISABLED'}")
+        logger.info(f"{'='*70}\n")
+
+    def _filter_by_topic(self, papers: List[Dict], topic: Optional[str]) -> List[Dict]:
+        """Apply the topic filter of scrape_all_journals, if specified"""
+        if topic and topic in self.topic_keywords:
+            filtered_papers = [p for p in papers if p.get('topic') == topic]
+            logger.info(f"  After topic filter: {len(filtered_papers)} papers (from {len(papers)} total)")
+            return filtered_papers
+        return papers
+
+    def _summarize_results(self, all_papers: List[Dict], journal_counts: Dict[str, int],
+                           min_papers_per_journal: int) -> pd.DataFrame:
+        """Log the final summary of a scrape_all_journals run and build the results DataFrame"""
         # Summary
         logger.info(f"\n{'='*70}")
         logger.info("FINAL SUMMARY")
@@ -1103,16 +1819,21 @@ if __name__ == "__main__":
     # )
 
     # Default: Thorough mode - Including external searches (smaller sample)
+    # This takes hours, so progress is checkpointed and an interrupted run resumes where it stopped
+    checkpoint_path = 'economics_papers_thorough_checkpoint.jsonl'
     df_thorough = scraper.scrape_all_journals(
         start_year=2022,
         end_year=2025,
         topic=None,
         min_papers_per_journal=100,
-        check_external_repos=True
+        check_external_repos=True,
+        checkpoint_path=checkpoint_path,
+        resume=True
     )
 
     if not df_thorough.empty:
         scraper.save_to_excel(df_thorough, 'economics_papers_2023_2024_thorough.xlsx')
+        os.remove(checkpoint_path)  # The results are saved, so the next run starts over
         print(f"\n📊 Thorough mode results: {len(df_thorough)} papers")
 
         if 'journal' in df_thorough.columns:
@@ -2,29 +2,70 @@
 Simplified Finance Journal Scraper - Focus on CrossRef API
 """
 
-import requests
 import pandas as pd
-import time
 import logging
-from typing import List, Dict, Optional, Tuple
+from typing import Iterator, List, Dict, Optional, Tuple
 from collections import defaultdict
+from itertools import count
 import re
-from bs4 import BeautifulSoup
+import asyncio
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from bulk_lookup import DoiIndex
+from html_pages import parse_html
+from incremental_sync import SyncState, merge_results, sync_date
+from paper_store import PaperStore
+from replication_cache import ReplicationCache
+from response_cache import ResponseCache
+from scrape_checkpoint import DEFAULT_CHECKPOINT_PATH, ScrapeCheckpoint
+from scraper_utils import (CROSSREF_MAX_ROWS, AsyncHttpClient, HttpRequest, RateLimiter, Steps, TransportConfig,
+                           TransportWatch, create_session, crossref_rows, fetch_crossref_batch, first_hit_steps,
+                           iter_threaded, run_steps, run_steps_async)
+from topic_matcher import TopicMatcher, paper_texts
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Topic keywords whose occurrences count double in classify_paper_topic
+WEIGHTED_TOPIC_KEYWORDS = [
+    'ipo', 'merger', 'acquisition', 'capm', 'liquidity', 'blockchain', 'cryptocurrency',
+    'bank', 'option'
+]
+
 class SimpleFinanceScraper:
     """Simple scraper focusing on CrossRef API which works reliably"""
 
-    def __init__(self):
-        """Initialize with journal mappings"""
-        self.session = requests.Session()
-        self.session.headers.update({
+    def __init__(self, rate_limiter: Optional[RateLimiter] = None, cache: Optional[ResponseCache] = None,
+                 replication_cache: Optional[ReplicationCache] = None, parallel_search: bool = False,
+                 transport: Optional[TransportConfig] = None):
+        """Initialize with journal mappings
+
+        Args:
+            rate_limiter: Per-host RateLimiter for all requests (default: RateLimiter() with
+                          DEFAULT_RATE_LIMITS); pass one instance to share limits between scrapers
+            cache: On-disk ResponseCache (e.g. SQLiteResponseCache('http_cache.sqlite')) that
+                   answers repeated requests without hitting the network; None disables caching
+            replication_cache: ReplicationCache of earlier detect_replication_package results by DOI;
+                               papers with a known package are not searched again
+            parallel_search: Query the repositories of detect_replication_package all at once
+                             instead of one after another (the search order still decides
+                             which URL wins)
+            transport: Connection pool, keep-alive and retry settings shared by every request,
+                       sync or async (default: TransportConfig())
+        """
+        self.rate_limiter = rate_limiter or RateLimiter()
+        self.cache = cache
+        self.replication_cache = replication_cache
+        self.parallel_search = parallel_search
+        self.transport = transport or TransportConfig()
+        self.session = create_session({
             'User-Agent': 'Academic Research Bot 1.0 (mailto:research@university.edu)',
             'Accept': 'application/json',
-        })
+        }, self.rate_limiter, cache=cache, transport=self.transport)
+
+        # Datasets found for paper DOIs by the bulk repository lookups of each CrossRef page
+        self.doi_index = DoiIndex()
 
         # Journal ISSN mapping for CrossRef
         self.journal_issns = {
@@ -48,43 +89,90 @@ class SimpleFinanceScraper:
             'fintech': ['blockchain', 'cryptocurrency', 'bitcoin', 'digital']
         }
 
+        # Single-pass matcher of the topic keywords (see classify_paper_topic)
+        self.topic_matcher = TopicMatcher(self.topic_keywords, WEIGHTED_TOPIC_KEYWORDS)
+
     def scrape_journal(self, journal_name: str, start_year: int, end_year: int,
-                      min_papers: int = 10, check_external_repos: bool = True) -> List[Dict]:
+                      min_papers: int = 10, check_external_repos: bool = True,
+                      since: Optional[str] = None, fetch_all: bool = False,
+                      checkpoint: Optional[ScrapeCheckpoint] = None) -> List[Dict]:
         """Scrape papers from a single journal
 
         Args:
             check_external_repos: If True, search Zenodo and Harvard Dataverse for replication packages
+            since: Only fetch works CrossRef indexed (added or updated) on or after this date,
+                   e.g. '2025-01-31' (see sync_all_journals)
+            fetch_all: Fetch every matching work, ignoring min_papers
+            checkpoint: ScrapeCheckpoint recording the progress of the scrape and restoring
+                        earlier progress (see scrape_all_journals)
         """
-        papers = []
+        return list(self._iter_journal(journal_name, start_year, end_year, min_papers, check_external_repos,
+                                       since, fetch_all, checkpoint=checkpoint))
+
+    def _iter_journal(self, journal_name: str, start_year: int, end_year: int,
+                      min_papers: int = 10, check_external_repos: bool = True,
+                      since: Optional[str] = None, fetch_all: bool = False,
+                      harvest_only: bool = False,
+                      checkpoint: Optional[ScrapeCheckpoint] = None) -> Iterator[Dict]:
+        """Generator behind scrape_journal: yields each paper as soon as it is processed
+
+        With harvest_only, papers are parsed by _parse_metadata, without replication detection.
+        With a checkpoint, papers restored from it come first, and new papers, page cursors
+        and the completion of the journal are recorded in it.
+        """
+        collected = 0
+        failed = False
         issn = self.journal_issns.get(journal_name)
 
         if not issn:
             logger.error(f"No ISSN found for {journal_name}")
-            return papers
+            return
 
         base_url = 'https://api.crossref.org/works'
 
-        # Calculate how many papers we need per request
-        rows_per_request = 50
-        offset = 0
-        max_requests = 10  # Maximum requests to prevent infinite loops
+        # Deep paging with a CrossRef cursor: unlike offsets it works past 10,000 items
+        # and doesn't slow down on later pages, so there is no cap on requests
+        rows_per_request = CROSSREF_MAX_ROWS if fetch_all else crossref_rows(min_papers)
+        cursor = '*'
 
         logger.info(f"Scraping {journal_name} (ISSN: {issn}) from {start_year} to {end_year}")
-
-        for request_num in range(max_requests):
+        if since:
+            logger.info(f"  Only works indexed since {since}")
+
+        # Continue a checkpointed run: restore the papers done and skip them when they come up again
+        done_dois = set()
+        if checkpoint:
+            restored = checkpoint.papers(journal_name)
+            yield from restored
+            collected = len(restored)
+            done_dois = {paper['doi'] for paper in restored if paper.get('doi')}
+            if checkpoint.is_finished(journal_name) or (not fetch_all and collected >= min_papers):
+                logger.info(f"  ✅ Restored {collected} papers for {journal_name} from checkpoint")
+                return
+            cursor = checkpoint.cursor(journal_name) or cursor
+
+        for request_num in count():
             params = {
-                'filter': f'issn:{issn},from-pub-date:{start_year},until-pub-date:{end_year}',
+                'filter': f'issn:{issn},from-pub-date:{start_year},until-pub-date:{end_year}'
+                          + (f',from-index-date:{since}' if since else ''),
                 'rows': rows_per_request,
-                'offset': offset,
+                'cursor': cursor,
                 'select': 'title,author,published-print,published-online,DOI,abstract,container-title',
                 'sort': 'published',
                 'order': 'desc'
             }
 
             try:
-                time.sleep(1)  # Be polite to the API
                 response = self.session.get(base_url, params=params, timeout=30)
 
+                if request_num == 0 and cursor != '*' and not (response.status_code == 200 and
+                                                               response.json().get('message', {}).get('items')):
+                    # CrossRef cursors expire a few minutes after their last use: start over
+                    # from the first page instead, skipping the papers already done
+                    logger.info(f"  Checkpointed cursor expired, restarting {journal_name} from the first page")
+                    cursor = params['cursor'] = '*'
+                    response = self.session.get(base_url, params=params, timeout=30)
+
                 if response.status_code == 200:
                     data = response.json()
                     items = data.get('message', {}).get('items', [])
@@ -92,28 +180,132 @@ class SimpleFinanceScraper:
 
                     logger.info(f"  Request {request_num + 1}: Got {len(items)} papers (Total available: {total_results})")
 
+                    if check_external_repos and not harvest_only and self._searches_repositories(journal_name):
+                        self._prefetch_dois([item.get('DOI', '') for item in items
+                                             if item.get('DOI') not in done_dois])
                     for item in items:
-                        paper = self._parse_paper(item, journal_name, check_external_repos)
+                        if item.get('DOI') in done_dois:
+                            continue
+                        if harvest_only:
+                            paper = self._parse_metadata(item, journal_name)
+                        else:
+                            paper = self._parse_paper(item, journal_name, check_external_repos)
                         if paper:
-                            papers.append(paper)
+                            if checkpoint:
+                                checkpoint.add_paper(journal_name, paper)
+                            collected += 1
+                            yield paper
 
                     # Check if we have enough papers
-                    if len(papers) >= min_papers:
-                        logger.info(f"  ✅ Collected {len(papers)} papers for {journal_name}")
+                    if not fetch_all and collected >= min_papers:
+                        logger.info(f"  ✅ Collected {collected} papers for {journal_name}")
                         break
 
                     # Check if there are more results
                     if len(items) < rows_per_request:
                         break  # No more results
 
-                    offset += rows_per_request
+                    cursor = data.get('message', {}).get('next-cursor')
+                    if not cursor:
+                        break
+                    if checkpoint:
+                        checkpoint.set_cursor(journal_name, cursor)
 
                 else:
+                    if fetch_all:
+                        raise RuntimeError(f"API error: {response.status_code}")
                     logger.error(f"  API error: {response.status_code}")
+                    failed = True
                     break
 
             except Exception as e:
                 logger.error(f"  Error fetching data: {e}")
+                if fetch_all:
+                    # An incomplete fetch must not be recorded as synced (see sync_all_journals)
+                    raise
+                failed = True
+                break
+
+        if not fetch_all and collected < min_papers:
+            logger.warning(f"  ⚠️  Only found {collected} papers for {journal_name} (target: {min_papers})")
+
+        if checkpoint and not failed:
+            checkpoint.finish_journal(journal_name)
+
+    async def scrape_journal_async(self, client: AsyncHttpClient, journal_name: str, start_year: int,
+                                   end_year: int, min_papers: int = 10,
+                                   check_external_repos: bool = True) -> List[Dict]:
+        """Async version of scrape_journal: all papers of a CrossRef page are checked concurrently
+
+        Args:
+            client: Open AsyncHttpClient used for every request
+            (other arguments as in scrape_journal)
+        """
+        papers = []
+        issn = self.journal_issns.get(journal_name)
+
+        if not issn:
+            logger.error(f"No ISSN found for {journal_name}")
+            return papers
+
+        base_url = 'https://api.crossref.org/works'
+
+        # Deep paging with a CrossRef cursor: unlike offsets it works past 10,000 items
+        # and doesn't slow down on later pages, so there is no cap on requests
+        rows_per_request = crossref_rows(min_papers)
+        cursor = '*'
+
+        logger.info(f"Scraping {journal_name} (ISSN: {issn}) from {start_year} to {end_year}")
+
+        for request_num in count():
+            params = {
+                'filter': f'issn:{issn},from-pub-date:{start_year},until-pub-date:{end_year}',
+                'rows': rows_per_request,
+                'cursor': cursor,
+                'select': 'title,author,published-print,published-online,DOI,abstract,container-title',
+                'sort': 'published',
+                'order': 'desc'
+            }
+
+            try:
+                response = await client.get(HttpRequest(base_url, params=params, timeout=30))
+
+                if response.status_code == 200:
+                    data = response.json()
+                    items = data.get('message', {}).get('items', [])
+                    total_results = data.get('message', {}).get('total-results', 0)
+
+                    logger.info(f"  {journal_name} request {request_num + 1}: Got {len(items)} papers "
+                                f"(Total available: {total_results})")
+
+                    if check_external_repos and self._searches_repositories(journal_name):
+                        await run_steps_async(self._prefetch_dois_steps([item.get('DOI', '') for item in items]),
+                                              client)
+                    results = await asyncio.gather(*(
+                        run_steps_async(self._parse_paper_steps(item, journal_name, check_external_repos), client)
+                        for item in items
+                    ))
+                    papers.extend(paper for paper in results if paper)
+
+                    # Check if we have enough papers
+                    if len(papers) >= min_papers:
+                        logger.info(f"  ✅ Collected {len(papers)} papers for {journal_name}")
+                        break
+
+                    # Check if there are more results
+                    if len(items) < rows_per_request:
+                        break  # No more results
+
+                    cursor = data.get('message', {}).get('next-cursor')
+                    if not cursor:
+                        break
+
+                else:
+                    logger.error(f"  API error for {journal_name}: {response.status_code}")
+                    break
+
+            except Exception as e:
+                logger.error(f"  Error fetching data for {journal_name}: {e}")
                 break
 
         if len(papers) < min_papers:
@@ -122,57 +314,63 @@ class SimpleFinanceScraper:
         return papers
 
     def classify_paper_topic(self, title: str, abstract: str) -> str:
-        """Classify a paper into one of the finance topics based on title and abstract"""
+        """Classify a paper into one of the finance topics based on title and abstract
+
+        Each topic scores the occurrences of its keywords in the text (keywords in
+        WEIGHTED_TOPIC_KEYWORDS count double), all counted in one pass by self.topic_matcher.
+        """
         text = f"{title} {abstract}".lower()
 
-        # Score each topic based on keyword matches
-        topic_scores = {}
+        # The highest-scoring topic, or 'general_finance' if no keyword matches
+        return self._compiled_topic_matcher().classify(text, 'general_finance')
 
-        for topic, keywords in self.topic_keywords.items():
-            score = 0
-            for keyword in keywords:
-                # Count occurrences (weighted by keyword importance)
-                keyword_lower = keyword.lower()
-                occurrences = text.count(keyword_lower)
+    def classify_topics(self, df: pd.DataFrame) -> pd.Series:
+        """Classify every paper of a result set at once, e.g. after editing topic_keywords
 
-                # Give extra weight to certain important keywords
-                if keyword_lower in ['ipo', 'merger', 'acquisition', 'capm', 'liquidity',
-                                      'blockchain', 'cryptocurrency', 'bank', 'option']:
-                    occurrences *= 2
+        Gives each paper the topic classify_paper_topic would, scoring all papers
+        against all topics with sparse keyword counts and NumPy (see
+        TopicMatcher.classify_texts), so a whole archive is relabelled in seconds.
 
-                score += occurrences
+        Args:
+            df: Papers with a 'title' and, if available, an 'abstract' column
 
-            topic_scores[topic] = score
+        Returns:
+            Topic of each paper, on the index of df (assign it to df['topic'])
+        """
+        topics = self._compiled_topic_matcher().classify_texts(paper_texts(df).tolist(), 'general_finance')
+        return pd.Series(topics, index=df.index, name='topic')
 
-        # Find the topic with the highest score
-        if topic_scores:
-            best_topic = max(topic_scores, key=topic_scores.get)
-            # Only assign if there's at least some match
-            if topic_scores[best_topic] > 0:
-                return best_topic
+    def _compiled_topic_matcher(self) -> TopicMatcher:
+        """self.topic_matcher, compiled again if topic_keywords was changed since"""
+        if self.topic_matcher.topic_keywords != self.topic_keywords:
+            self.topic_matcher = TopicMatcher(self.topic_keywords, WEIGHTED_TOPIC_KEYWORDS)
+        return self.topic_matcher
 
-        # Default to 'general_finance' if no strong match
-        return 'general_finance'
+    def search_datacite(self, doi: str) -> Optional[str]:
+        """Find a dataset that DataCite records as a supplement to the paper (IsSupplementTo its DOI)"""
+        return run_steps(self._search_datacite_steps(doi), self.session)
+
+    def _search_datacite_steps(self, doi: str) -> Steps[Optional[str]]:
+        """Step generator for search_datacite (see scraper_utils.run_steps)"""
+        # Usually looked up in bulk for the whole CrossRef page (see _prefetch_dois)
+        urls = yield from self.doi_index.lookup_steps('datacite', doi)
+        return urls[0] if urls else None
 
     def search_zenodo(self, title: str, authors: str, doi: str = '') -> Optional[str]:
         """Search Zenodo for replication packages using DOI as primary method"""
+        return run_steps(self._search_zenodo_steps(title, authors, doi), self.session)
+
+    def _search_zenodo_steps(self, title: str, authors: str, doi: str = '') -> Steps[Optional[str]]:
+        """Step generator for search_zenodo (see scraper_utils.run_steps)"""
         try:
             # Strategy 1: Search by DOI (most accurate)
             if doi:
-                # Search for datasets related to this DOI
-                params = {
-                    'q': f'related.identifier:"{doi}" OR "{doi}"',
-                    'type': 'dataset',
-                    'size': 5
-                }
-
-                response = self.session.get('https://zenodo.org/api/records', params=params, timeout=5)
-                if response.status_code == 200:
-                    data = response.json()
-                    hits = data.get('hits', {}).get('hits', [])
-                    if hits:
-                        # Return first match with DOI relation
-                        return f"https://zenodo.org/record/{hits[0]['id']}"
+                # Datasets referencing this DOI, usually looked up in bulk for the whole
+                # CrossRef page (see _prefetch_dois)
+                urls = yield from self.doi_index.lookup_steps('zenodo', doi)
+                if urls:
+                    # Return first match with DOI relation
+                    return urls[0]
 
             # Strategy 2: Search by title and author (fallback)
             clean_title = re.sub(r'[^\w\s]', ' ', title).strip()
@@ -192,7 +390,7 @@ class SimpleFinanceScraper:
                 'size': 3
             }
 
-            response = self.session.get('https://zenodo.org/api/records', params=params, timeout=3)
+            response = yield HttpRequest('https://zenodo.org/api/records', params=params, timeout=3)
             if response.status_code == 200:
                 data = response.json()
                 hits = data.get('hits', {}).get('hits', [])
@@ -217,39 +415,21 @@ class SimpleFinanceScraper:
 
     def search_harvard_dataverse(self, title: str, doi: str = '', authors: str = '') -> Optional[str]:
         """Search Harvard Dataverse for replication packages using DOI as primary method"""
+        return run_steps(self._search_harvard_dataverse_steps(title, doi, authors), self.session)
+
+    def _search_harvard_dataverse_steps(self, title: str, doi: str = '', authors: str = '') -> Steps[Optional[str]]:
+        """Step generator for search_harvard_dataverse (see scraper_utils.run_steps)"""
         try:
             base_url = 'https://dataverse.harvard.edu/api/search'
 
             # Strategy 1: Search by DOI (most accurate)
             if doi:
-                # Search for datasets that reference this DOI
-                search_queries = [
-                    f'publicationIdValue:"{doi}"',  # Direct DOI reference
-                    f'"{doi}"',  # DOI mentioned anywhere
-                    f'relatedPublication:"{doi}"'  # Related publication field
-                ]
-
-                for query in search_queries:
-                    params = {
-                        'q': query,
-                        'type': 'dataset',
-                        'per_page': 5
-                    }
-
-                    response = self.session.get(base_url, params=params, timeout=5)
-                    if response.status_code == 200:
-                        data = response.json()
-                        items = data.get('data', {}).get('items', [])
-                        if items:
-                            # Return the first matching dataset
-                            global_id = items[0].get('global_id', '')
-                            if global_id:
-                                if global_id.startswith('doi:'):
-                                    return f"https://doi.org/{global_id.replace('doi:', '')}"
-                                elif global_id.startswith('hdl:'):
-                                    return f"https://hdl.handle.net/{global_id.replace('hdl:', '')}"
-                                else:
-                                    return f"https://dataverse.harvard.edu/dataset.xhtml?persistentId={global_id}"
+                # Datasets that reference this DOI (as publication ID, related publication or
+                # anywhere), usually looked up in bulk for the whole CrossRef page (see _prefetch_dois)
+                urls = yield from self.doi_index.lookup_steps('dataverse', doi)
+                if urls:
+                    # Return the first matching dataset
+                    return urls[0]
 
             # Strategy 2: Search by title (fallback)
             clean_title = re.sub(r'[^\w\s]', ' ', title).strip()
@@ -263,7 +443,7 @@ class SimpleFinanceScraper:
                 'per_page': 5
             }
 
-            response = self.session.get(base_url, params=params, timeout=3)
+            response = yield HttpRequest(base_url, params=params, timeout=3)
             if response.status_code == 200:
                 data = response.json()
                 items = data.get('data', {}).get('items', [])
@@ -298,6 +478,10 @@ class SimpleFinanceScraper:
 
     def check_journal_supporting_info(self, doi: str, journal: str) -> Optional[str]:
         """Check for supporting information on journal websites"""
+        return run_steps(self._check_journal_supporting_info_steps(doi, journal), self.session)
+
+    def _check_journal_supporting_info_steps(self, doi: str, journal: str) -> Steps[Optional[str]]:
+        """Step generator for check_journal_supporting_info (see scraper_utils.run_steps)"""
         try:
             if not doi:
                 return None
@@ -305,9 +489,9 @@ class SimpleFinanceScraper:
             # For Journal of Finance, check Wiley Online Library
             if 'Journal of Finance' in journal:
                 # The DOI link often redirects to the Wiley page
-                response = self.session.get(f'https://doi.org/{doi}', timeout=10, allow_redirects=True)
+                response = yield HttpRequest(f'https://doi.org/{doi}', timeout=10, allow_redirects=True)
                 if response.status_code == 200:
-                    soup = BeautifulSoup(response.text, 'html.parser')
+                    soup = parse_html(response.text)
 
                     # Look for supporting information section
                     # Wiley typically has a section with class 'support-info' or similar
@@ -318,18 +502,18 @@ class SimpleFinanceScraper:
 
             # For JFE (Elsevier), check ScienceDirect
             elif 'Journal of Financial Economics' in journal:
-                response = self.session.get(f'https://doi.org/{doi}', timeout=10, allow_redirects=True)
+                response = yield HttpRequest(f'https://doi.org/{doi}', timeout=10, allow_redirects=True)
                 if response.status_code == 200 and 'sciencedirect.com' in response.url:
                     # ScienceDirect typically includes supplementary material links
-                    soup = BeautifulSoup(response.text, 'html.parser')
+                    soup = parse_html(response.text)
                     if soup.find_all(string=re.compile(r'Supplementary|Data in Brief|Research Data', re.I)):
                         return f"{response.url}#supplementary-content"
 
             # For RFS (Oxford), check Oxford Academic
             elif 'Review of Financial Studies' in journal:
-                response = self.session.get(f'https://doi.org/{doi}', timeout=10, allow_redirects=True)
+                response = yield HttpRequest(f'https://doi.org/{doi}', timeout=10, allow_redirects=True)
                 if response.status_code == 200 and 'academic.oup.com' in response.url:
-                    soup = BeautifulSoup(response.text, 'html.parser')
+                    soup = parse_html(response.text)
                     if soup.find_all(string=re.compile(r'Supplementary data|Supplementary material', re.I)):
                         return f"{response.url}#supplementary-data"
 
@@ -338,6 +522,26 @@ class SimpleFinanceScraper:
 
         return None
 
+    def _prefetch_dois(self, dois: List[str]):
+        """Look up a page of DOIs in the repositories in bulk (see _prefetch_dois_steps)"""
+        run_steps(self._prefetch_dois_steps(dois), self.session)
+
+    def _prefetch_dois_steps(self, dois: List[str]) -> Steps[None]:
+        """Look up the DOIs of a page of papers in bulk, ahead of their one-by-one searches
+
+        The DOI searches of the repositories then answer from self.doi_index instead of
+        sending a query per paper (see bulk_lookup.DoiIndex).
+        """
+        if self.replication_cache is not None:
+            # Papers with a cached result are never searched
+            dois = [doi for doi in dois if doi and self.replication_cache.get(doi) is None]
+        yield from self.doi_index.prefetch_steps(dois)
+
+    def _searches_repositories(self, journal: str) -> bool:
+        """Whether papers of a journal can reach the repository searches (worth a bulk lookup)"""
+        # Journal of Finance papers get their supporting information link instead
+        return 'Journal of Finance' not in journal
+
     def detect_replication_package(self, title: str, abstract: str, doi: str = '',
                                  journal: str = '', authors: str = '', check_external: bool = True) -> Tuple[int, str]:
         """
@@ -347,6 +551,32 @@ class SimpleFinanceScraper:
         Args:
             check_external: If True, search external repositories (slower but more thorough)
         """
+        return run_steps(self._detect_replication_package_steps(title, abstract, doi, journal, authors,
+                                                                check_external), self.session)
+
+    def _detect_replication_package_steps(self, title: str, abstract: str, doi: str = '',
+                                 journal: str = '', authors: str = '', check_external: bool = True) -> Steps[Tuple[int, str]]:
+        """Step generator for detect_replication_package (see scraper_utils.run_steps)"""
+        # Only full searches are cached: without external repositories a miss proves little
+        use_cache = self.replication_cache is not None and doi and check_external
+        if use_cache:
+            cached = self.replication_cache.get(doi)
+            if cached is not None:
+                return cached.has_package, cached.url
+
+        watch = TransportWatch()
+        has_package, package_url = yield from watch.steps(self._search_replication_package_steps(
+            title, abstract, doi, journal, authors, check_external))
+
+        # A miss is only stored if every repository answered: one that was throttled or
+        # unreachable would hide the paper's package until the negative TTL expires
+        if use_cache and (has_package or not watch.failed):
+            self.replication_cache.put(doi, has_package, package_url)
+        return has_package, package_url
+
+    def _search_replication_package_steps(self, title: str, abstract: str, doi: str = '',
+                                 journal: str = '', authors: str = '', check_external: bool = True) -> Steps[Tuple[int, str]]:
+        """Run the repository search chain of detect_replication_package, bypassing the replication cache"""
         # First check abstract/title for direct links
         text = f"{title} {abstract}".lower()
 
@@ -396,15 +626,17 @@ class SimpleFinanceScraper:
             )
 
             if should_search_external:
-                # 1. Search Zenodo (pass DOI for better matching)
-                zenodo_url = self.search_zenodo(title, authors, doi)
-                if zenodo_url:
-                    return 1, zenodo_url
-
-                # 2. Search Harvard Dataverse (DOI is already passed)
-                dataverse_url = self.search_harvard_dataverse(title, doi, authors)
-                if dataverse_url:
-                    return 1, dataverse_url
+                # The first search in this order that finds a package wins, also with parallel_search
+                url = yield from first_hit_steps([
+                    # 0. DataCite relations: deposits that declare they supplement this paper
+                    *([self._search_datacite_steps(doi)] if doi else []),
+                    # 1. Search Zenodo (pass DOI for better matching)
+                    self._search_zenodo_steps(title, authors, doi),
+                    # 2. Search Harvard Dataverse (DOI is already passed)
+                    self._search_harvard_dataverse_steps(title, doi, authors),
+                ], self.parallel_search)
+                if url:
+                    return 1, url
 
         # If we found indicators but no specific URL, return generic indicator
         if has_indicators:
@@ -417,6 +649,21 @@ class SimpleFinanceScraper:
 
     def _parse_paper(self, item: dict, journal_name: str, check_external_repos: bool = True) -> Optional[Dict]:
         """Parse a single paper from CrossRef response"""
+        return run_steps(self._parse_paper_steps(item, journal_name, check_external_repos), self.session)
+
+    def _parse_paper_steps(self, item: dict, journal_name: str, check_external_repos: bool = True) -> Steps[Optional[Dict]]:
+        """Step generator for _parse_paper (see scraper_utils.run_steps)"""
+        record = self._parse_metadata(item, journal_name)
+        if record is None:
+            return None
+        return (yield from self._enrich_paper_steps(record, check_external_repos))
+
+    def _parse_metadata(self, item: dict, journal_name: str) -> Optional[Dict]:
+        """Parse the metadata of a paper from CrossRef response, without any network call
+
+        The record has the columns of a paper with the replication fields still unset,
+        plus the abstract that replication detection needs (see _enrich_paper).
+        """
         try:
             # Title
             title = ' '.join(item.get('title', ['N/A']))
@@ -455,60 +702,365 @@ class SimpleFinanceScraper:
             # Classify topic based on title and abstract
             topic = self.classify_paper_topic(title, abstract_full if abstract_full != 'N/A' else title)
 
+            return {
+                'title': title,
+                'authors': authors,
+                'journal': journal_name,
+                'topic': topic,  # Add classified topic
+                'replication_package': 0,
+                'replication_url': '',
+                'year': str(year),
+                'date': date,
+                'doi': doi,
+                'link': link,
+                'abstract': abstract_full
+            }
+
+        except Exception as e:
+            logger.debug(f"Error parsing paper: {e}")
+            return None
+
+    def _enrich_paper(self, record: Dict, check_external_repos: bool = True) -> Optional[Dict]:
+        """Detect the replication package of a record from _parse_metadata and return the finished paper
+
+        Returns None if the search failed: it raised, or it found no package while a
+        request failed in transport (see TransportWatch), so the miss proves nothing.
+        """
+        watch = TransportWatch()
+        paper = run_steps(watch.steps(self._enrich_paper_steps(record, check_external_repos)), self.session)
+        if paper is not None and not paper['replication_package'] and watch.failed:
+            return None
+        return paper
+
+    def _enrich_paper_steps(self, record: Dict, check_external_repos: bool = True) -> Steps[Optional[Dict]]:
+        """Step generator for _enrich_paper (see scraper_utils.run_steps)"""
+        try:
+            paper = dict(record)
+            title, authors = paper['title'], paper['authors']
+            abstract_full = paper.pop('abstract', 'N/A')
+
             # Detect replication package and get URL
-            has_replication, replication_url = self.detect_replication_package(
+            has_replication, replication_url = yield from self._detect_replication_package_steps(
                 title,
                 abstract_full if abstract_full != 'N/A' else title,
-                doi,
-                journal_name,
+                paper['doi'],
+                paper['journal'],
                 authors,
                 check_external=check_external_repos  # Control external API calls
             )
 
-            return {
+            paper.update({
                 'title': title[:300],  # Limit title length
                 'authors': authors[:500],  # Limit authors length
-                'journal': journal_name,
-                'topic': topic,  # Add classified topic
                 'replication_package': has_replication,  # Binary: 1 if has replication, 0 otherwise
-                'replication_url': replication_url,  # URL to replication package
-                'year': str(year),
-                'date': date,
-                'doi': doi,
-                'link': link
-            }
+                'replication_url': replication_url  # URL to replication package
+            })
+            return paper
 
         except Exception as e:
-            logger.debug(f"Error parsing paper: {e}")
+            logger.debug(f"Error detecting replication package: {e}")
             return None
 
+    def _parse_journal_items(self, items: List[dict], journal_name: str,
+                             check_external_repos: bool = True) -> List[Dict]:
+        """Parse the CrossRef items fetched for one journal by fetch_crossref_batch"""
+        papers = []
+        if check_external_repos and self._searches_repositories(journal_name):
+            self._prefetch_dois([item.get('DOI', '') for item in items])
+        for item in items:
+            paper = self._parse_paper(item, journal_name, check_external_repos)
+            if paper:
+                papers.append(paper)
+
+        logger.info(f"  ✅ Collected {len(papers)} papers for {journal_name}")
+        return papers
+
     def scrape_all_journals(self, start_year: int = 2020, end_year: int = 2024,
                            topic: Optional[str] = None, min_papers_per_journal: int = 10,
-                           check_external_repos: bool = True) -> pd.DataFrame:
-        """Scrape all journals"""
+                           check_external_repos: bool = True, journal_workers: int = 1,
+                           batch_crossref: bool = False, checkpoint_path: Optional[str] = None,
+                           resume: bool = False) -> pd.DataFrame:
+        """Scrape all journals
+
+        Args:
+            journal_workers: Number of journals scraped at the same time (default: 1, serial)
+            batch_crossref: Fetch the metadata of all journals with one CrossRef cursor stream
+                            instead of one per journal (default: False)
+        """
         all_papers = []
         journal_counts = defaultdict(int)
 
+        self._log_scrape_start(start_year, end_year, topic, min_papers_per_journal)
+
+        # Record progress as the run goes, so an interrupted run can be resumed
+        checkpoint = None
+        if checkpoint_path or resume:
+            run = {'scraper': type(self).__name__, 'start_year': start_year, 'end_year': end_year,
+                   'min_papers_per_journal': min_papers_per_journal,
+                   'check_external_repos': check_external_repos, 'batch_crossref': batch_crossref}
+            checkpoint = ScrapeCheckpoint(checkpoint_path or DEFAULT_CHECKPOINT_PATH, run, resume)
+
+        journal_names = list(self.journal_issns.keys())
+        if batch_crossref:
+            pending = {name: issn for name, issn in self.journal_issns.items()
+                       if not (checkpoint and checkpoint.is_finished(name))}
+            journal_items = fetch_crossref_batch(self.session, pending, start_year, end_year,
+                                                 {name: min_papers_per_journal * 2 for name in pending}) if pending else {}
+
+        def scrape(journal_name: str) -> List[Dict]:
+            if batch_crossref:
+                if checkpoint and checkpoint.is_finished(journal_name):
+                    return checkpoint.papers(journal_name)
+                papers = self._parse_journal_items(journal_items[journal_name], journal_name, check_external_repos)
+                if checkpoint:
+                    checkpoint.finish_journal(journal_name, papers)
+                return papers
+            return self.scrape_journal(journal_name, start_year, end_year,
+                                       min_papers_per_journal * 2, check_external_repos, checkpoint=checkpoint)
+
+        # Journals share self.session (and its connection pool); results are collected
+        # in journal order so the summary stays grouped by journal
+        if journal_workers > 1:
+            with ThreadPoolExecutor(max_workers=journal_workers) as executor:
+                results = list(executor.map(scrape, journal_names))
+        else:
+            results = map(scrape, journal_names)
+
+        for journal_name, papers in zip(journal_names, results):
+            papers = self._filter_by_topic(papers, topic)
+            all_papers.extend(papers)
+            journal_counts[journal_name] = len(papers)
+
+        if checkpoint:
+            checkpoint.close()
+
+        return self._summarize_results(all_papers, journal_counts, min_papers_per_journal)
+
+    def iter_papers(self, start_year: int = 2020, end_year: int = 2024,
+                    topic: Optional[str] = None, min_papers_per_journal: int = 10,
+                    check_external_repos: bool = True, journal_workers: int = 1) -> Iterator[Dict]:
+        """Stream the papers of all journals, yielding each one as soon as its replication check is done
+
+        Takes the same arguments as scrape_all_journals but never holds more than the
+        papers in flight, so results can be written out while the scrape is running.
+
+        Args:
+            journal_workers: Number of journals scraped at the same time (default: 1, serial);
+                             with several, papers are yielded in the order they finish
+        """
+        self._log_scrape_start(start_year, end_year, topic, min_papers_per_journal)
+
+        def journal_papers(journal_name: str) -> Iterator[Dict]:
+            return self._iter_journal(journal_name, start_year, end_year,
+                                      min_papers_per_journal * 2, check_external_repos)
+
+        journal_names = list(self.journal_issns.keys())
+        if journal_workers > 1:
+            papers = iter_threaded([lambda name=name: journal_papers(name) for name in journal_names],
+                                   journal_workers)
+        else:
+            papers = (paper for name in journal_names for paper in journal_papers(name))
+
+        for paper in papers:
+            if not topic or topic not in self.topic_keywords or paper.get('topic') == topic:
+                yield paper
+
+    async def scrape_all_journals_async(self, start_year: int = 2020, end_year: int = 2024,
+                                        topic: Optional[str] = None, min_papers_per_journal: int = 10,
+                                        check_external_repos: bool = True, max_concurrency: int = 100,
+                                        per_host_limit: int = 10,
+                                        host_limits: Optional[Dict[str, int]] = None) -> pd.DataFrame:
+        """Async version of scrape_all_journals (requires aiohttp)
+
+        All journals, CrossRef pages and repository searches run as coroutines on one
+        event loop. Use: df = asyncio.run(scraper.scrape_all_journals_async(...))
+
+        Args:
+            max_concurrency: Maximum number of HTTP requests in flight (default: 100)
+            per_host_limit: Maximum number of requests in flight per host (default: 10)
+            host_limits: Per-host overrides of per_host_limit, e.g. {'zenodo.org': 4}
+        """
+        self._log_scrape_start(start_year, end_year, topic, min_papers_per_journal)
+
+        async with AsyncHttpClient(self.session.headers, max_concurrency, per_host_limit, host_limits,
+                                   self.rate_limiter, cache=self.cache, transport=self.transport) as client:
+            results = await asyncio.gather(*(
+                self.scrape_journal_async(client, journal_name, start_year, end_year,
+                                          min_papers_per_journal * 2, check_external_repos)
+                for journal_name in self.journal_issns
+            ))
+
+        all_papers = []
+        journal_counts = defaultdict(int)
+
+        for journal_name, papers in zip(self.journal_issns, results):
+            papers = self._filter_by_topic(papers, topic)
+            all_papers.extend(papers)
+            journal_counts[journal_name] = len(papers)
+
+        return self._summarize_results(all_papers, journal_counts, min_papers_per_journal)
+
+    def sync_all_journals(self, existing: pd.DataFrame, sync_state: SyncState, start_year: int = 2020,
+                          end_year: int = 2024, topic: Optional[str] = None, check_external_repos: bool = True,
+                          journal_workers: int = 1) -> pd.DataFrame:
+        """Incrementally update the results of an earlier scrape_all_journals run
+
+        Only works CrossRef indexed (added or updated) since each journal's last sync in
+        `sync_state` are fetched; journals never synced before are fetched in full. The
+        papers are merged into `existing` by DOI and the new sync dates are saved.
+
+        Args:
+            existing: Results of an earlier run (e.g. read back with pd.read_excel)
+            sync_state: SyncState holding the last sync date per ISSN
+            (other arguments as in scrape_all_journals)
+        """
+        started = sync_date()
+
+        logger.info(f"\n{'='*70}")
+        logger.info(f"Starting incremental sync: {start_year}-{end_year} ({len(existing)} existing papers)")
+        logger.info(f"{'='*70}\n")
+
+        def sync(journal_name: str) -> Optional[List[Dict]]:
+            try:
+                return self.scrape_journal(
+                    journal_name,
+                    start_year,
+                    end_year,
+                    check_external_repos=check_external_repos,
+                    since=sync_state.last_sync(self.journal_issns[journal_name]),
+                    fetch_all=True
+                )
+            except Exception:
+                logger.warning(f"  ⚠️  Sync of {journal_name} failed; it will be retried from its last sync date")
+                return None
+
+        journal_names = list(self.journal_issns.keys())
+        if journal_workers > 1:
+            with ThreadPoolExecutor(max_workers=journal_workers) as executor:
+                results = list(executor.map(sync, journal_names))
+        else:
+            results = map(sync, journal_names)
+
+        updates = []
+        for journal_name, papers in zip(journal_names, results):
+            if papers is None:
+                continue
+            papers = self._filter_by_topic(papers, topic)
+            updates.extend(papers)
+            sync_state.mark_synced(self.journal_issns[journal_name], started)
+            logger.info(f"  {journal_name}: {len(papers)} new or updated papers")
+
+        sync_state.save()
+
+        all_papers = merge_results(existing, updates)
+        journal_counts = defaultdict(int, {journal_name: 0 for journal_name in journal_names})
+        for paper in all_papers:
+            journal_counts[paper.get('journal')] += 1
+
+        return self._summarize_results(all_papers, journal_counts, 0)
+
+    def harvest_metadata(self, store: PaperStore, start_year: int = 2020, end_year: int = 2024,
+                         topic: Optional[str] = None, min_papers_per_journal: int = 10,
+                         journal_workers: int = 1) -> int:
+        """Phase one of a two-phase scrape: store the CrossRef metadata of all journals
+
+        Only CrossRef is queried, so this takes seconds where scrape_all_journals takes
+        hours; enrich_papers then runs the replication searches over the stored records.
+        Papers already in the store (e.g. enriched by an earlier run) are left as they are.
+
+        Args:
+            store: PaperStore receiving the records
+            (other arguments as in scrape_all_journals)
+
+        Returns:
+            Number of new records stored
+        """
+        def harvest(journal_name: str) -> List[Dict]:
+            return list(self._iter_journal(journal_name, start_year, end_year, min_papers_per_journal * 2,
+                                           harvest_only=True))
+
+        journal_names = list(self.journal_issns.keys())
+        if journal_workers > 1:
+            with ThreadPoolExecutor(max_workers=journal_workers) as executor:
+                results = list(executor.map(harvest, journal_names))
+        else:
+            results = map(harvest, journal_names)
+
+        added = 0
+        for journal_name, records in zip(journal_names, results):
+            added += store.add(self._filter_by_topic(records, topic))
+
+        logger.info(f"Stored {added} new papers ({store.counts()['pending']} awaiting replication search)")
+        return added
+
+    def enrich_papers(self, store: PaperStore, check_external_repos: bool = True, max_workers: int = 8,
+                      limit: Optional[int] = None) -> pd.DataFrame:
+        """Phase two of a two-phase scrape: detect the replication packages of the stored papers
+
+        Papers are searched in parallel and each one is saved as soon as its search
+        finishes, so calling this again after an interruption continues with the
+        papers still pending. A paper whose search found nothing while a repository
+        could not be reached (connection error, timeout, 429 or 5xx) stays pending too.
+
+        Args:
+            store: PaperStore filled by harvest_metadata
+            check_external_repos: Search external repositories for replication packages
+            max_workers: Number of papers searched at the same time (default: 8)
+            limit: Search at most this many pending papers (default: all)
+
+        Returns:
+            DataFrame of every enriched paper in the store, as from scrape_all_journals
+        """
+        pending = store.pending(limit)
+        logger.info(f"Searching replication packages for {len(pending)} papers")
+        if check_external_repos:
+            self._prefetch_dois([record.get('doi', '') for record in pending
+                                 if self._searches_repositories(record.get('journal', ''))])
+
+        failed = 0
+        executor = ThreadPoolExecutor(max_workers=max_workers)
+        try:
+            futures = [executor.submit(self._enrich_paper, record, check_external_repos) for record in pending]
+            for future in as_completed(futures):
+                paper = future.result()
+                if paper is None:
+                    failed += 1
+                else:
+                    store.update(paper)
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        if failed:
+            logger.warning(f"  ⚠️  {failed} searches failed or could not reach a repository; "
+                           f"those papers stay pending")
+
+        all_papers = store.records(enriched_only=True)
+        journal_counts = defaultdict(int, {journal_name: 0 for journal_name in self.journal_issns})
+        for paper in all_papers:
+            journal_counts[paper.get('journal')] += 1
+
+        return self._summarize_results(all_papers, journal_counts, 0)
+
+    def _log_scrape_start(self, start_year: int, end_year: int, topic: Optional[str], min_papers_per_journal: int):
+        """Log the settings of a scrape_all_journals run"""
         logger.info(f"\n{'='*70}")
         logger.info(f"Starting scrape: {start_year}-{end_year}")
         logger.info(f"Topic filter: {topic if topic else 'ALL TOPICS (no filter)'}")
         logger.info(f"Target: {min_papers_per_journal}+ papers per journal")
         logger.info(f"{'='*70}\n")
 
-        for journal_name in self.journal_issns.keys():
-            papers = self.scrape_journal(journal_name, start_year, end_year,
-                                        min_papers_per_journal * 2, check_external_repos)
-
-            # Apply topic filter if specified
-            # Since papers now have topics pre-classified, just filter by the topic field
-            if topic and topic in self.topic_keywords:
-                filtered_papers = [p for p in papers if p.get('topic') == topic]
-                logger.info(f"  After topic filter: {len(filtered_papers)} papers (from {len(papers)} total)")
-                papers = filtered_papers
-
-            all_papers.extend(papers)
-            journal_counts[journal_name] = len(papers)
+    def _filter_by_topic(self, papers: List[Dict], topic: Optional[str]) -> List[Dict]:
+        """Apply the topic filter of scrape_all_journals, if specified"""
+        # Since papers now have topics pre-classified, just filter by the topic field
+        if topic and topic in self.topic_keywords:
+            filtered_papers = [p for p in papers if p.get('topic') == topic]
+            logger.info(f"  After topic filter: {len(filtered_papers)} papers (from {len(papers)} total)")
+            return filtered_papers
+        return papers
 
+    def _summarize_results(self, all_papers: List[Dict], journal_counts: Dict[str, int],
+                           min_papers_per_journal: int) -> pd.DataFrame:
+        """Log the final summary of a scrape_all_journals run and build the results DataFrame"""
         # Summary
         logger.info(f"\n{'='*70}")
         logger.info("FINAL SUMMARY")
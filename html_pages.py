@@ -0,0 +1,369 @@
+"""
+HTML parsing for the replication checks
+
+The checks parse publisher, repository and search pages of up to several
+hundred KB, only to read their text and a few anchors or sections. Building a
+BeautifulSoup tree for that, especially with Python's html.parser, took most of
+the scrapers' CPU time. `parse_html` parses a page with lxml's C parser instead
+(an order of magnitude faster) and wraps the tree in a small subset of the
+BeautifulSoup API (get_text, find_all, find, get, string), so the checks read
+the same with either backend. Without lxml, or with another HTML_PARSER, pages
+are parsed by BeautifulSoup, building only the elements named in `only`
+(a SoupStrainer).
+
+A KeywordScan looks for keywords in the text of a page while it downloads
+(see HttpRequest.scan), so a check can stop reading as soon as it has seen enough.
+"""
+
+import codecs
+import html.parser
+import re
+from typing import Iterator, List, Optional, Sequence, Set, Union
+
+from bs4 import BeautifulSoup, SoupStrainer
+
+try:
+    from lxml import etree
+    import lxml.html
+except ImportError:
+    lxml = None
+
+# Parser of parse_html: 'lxml' for the lxml tree (if installed), or any BeautifulSoup tree
+# builder ('html.parser', 'html5lib', ...). Assign another name to switch every scraper.
+HTML_PARSER = 'lxml' if lxml else 'html.parser'
+
+# Elements whose strings BeautifulSoup's get_text leaves out
+NON_TEXT_TAGS = ('script', 'style', 'template')
+
+# Elements inside which BeautifulSoup keeps whitespace-only strings as they are
+PRESERVE_WHITESPACE_TAGS = ('pre', 'textarea')
+
+# The whitespace BeautifulSoup collapses
+_ASCII_SPACES = ' \n\t\f\r'
+
+if lxml:
+    _all_strings = etree.XPath('.//text() | .//comment()')
+    _utf8_parser = lxml.html.HTMLParser(encoding='utf-8')
+
+# Markup before the first element and after </html>: whitespace, comments and declarations,
+# whose whitespace html.parser keeps as strings of the document but libxml2 drops
+_PROLOGUE = re.compile(r'(?:\s|<!--.*?-->|<![^>]*>|<\?[^>]*>)*', re.DOTALL)
+_EPILOGUE = re.compile(r'</html\s*>((?:\s|<!--.*?-->|<\?[^>]*>)*)$', re.DOTALL | re.IGNORECASE)
+_MARKUP = re.compile(r'<!--.*?-->|<[!?][^>]*>', re.DOTALL)
+
+
+def _visible_text(element) -> List[str]:
+    """Strings of an lxml element's content, in order, except those inside NON_TEXT_TAGS
+
+    Whitespace-only strings are collapsed as BeautifulSoup does, outside PRESERVE_WHITESPACE_TAGS.
+    """
+    # (walked in Python: an XPath ancestor test is over ten times slower on large pages)
+    strings = []
+    skipped = None
+    preserved = 0
+    in_preserved = None  # whether element is inside one of PRESERVE_WHITESPACE_TAGS, looked up when needed
+    for event, descendant in etree.iterwalk(element, events=('start', 'end', 'comment', 'pi')):
+        if event == 'start':
+            string = None
+            if skipped is None:
+                if descendant.tag in NON_TEXT_TAGS:
+                    skipped = descendant
+                else:
+                    if descendant.tag in PRESERVE_WHITESPACE_TAGS:
+                        preserved += 1
+                    string = descendant.text
+        elif event == 'end':
+            if descendant is skipped:
+                skipped = None
+            elif descendant.tag in PRESERVE_WHITESPACE_TAGS and skipped is None:
+                preserved -= 1
+            string = descendant.tail if descendant is not element else None
+        else:
+            # A comment or processing instruction: left out like BeautifulSoup's Comment
+            # strings, but not the text after it
+            string = descendant.tail
+        if string and skipped is None:
+            if preserved or not string.isspace() or string.strip(_ASCII_SPACES):
+                strings.append(string)
+                continue
+            if in_preserved is None:
+                in_preserved = next(element.iterancestors(*PRESERVE_WHITESPACE_TAGS), None) is not None
+            strings.append(string if in_preserved else '\n' if '\n' in string else ' ')
+    return strings
+
+
+class LxmlTag:
+    """An lxml element answering the BeautifulSoup queries of the replication checks"""
+
+    __slots__ = ('element',)
+
+    def __init__(self, element):
+        self.element = element
+
+    @property
+    def name(self) -> str:
+        return self.element.tag
+
+    def get(self, key: str, default=None):
+        return self.element.get(key, default)
+
+    def __getitem__(self, key: str) -> str:
+        value = self.element.get(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def get_text(self) -> str:
+        return ''.join(_visible_text(self.element))
+
+    @property
+    def string(self) -> Optional[str]:
+        """The element's only string, through elements with a single child, like Tag.string"""
+        element = self.element
+        while True:
+            children = [element.text] if element.text else []
+            for child in element:
+                children.append(child)
+                if child.tail:
+                    children.append(child.tail)
+            if len(children) != 1:
+                return None
+            if isinstance(children[0], str):
+                return str(children[0])
+            element = children[0]
+            if not isinstance(element.tag, str):
+                # A comment
+                return element.text
+
+    def find_all(self, name: Union[None, str, Sequence[str]] = None, string=None,
+                 limit: Optional[int] = None, **attrs) -> List:
+        """Descendants matching a tag name (or names), attributes and string, like Tag.find_all
+
+        Attribute and string filters are True (present), a string (equal) or a compiled
+        pattern (searched). With only a string filter, the matching strings are returned.
+        """
+        if name is None and not attrs and string is not None:
+            found = [str(s) if isinstance(s, str) else s.text or ''
+                     for s in _all_strings(self.element)]
+            found = [s for s in found if _matches(s, string)]
+        else:
+            found = [LxmlTag(element) for element in self._iter(name)
+                     if all(_matches(element.get('class' if key == 'class_' else key), value)
+                            for key, value in attrs.items())]
+            if string is not None:
+                found = [tag for tag in found if _matches(tag.string, string)]
+        return found[:limit] if limit else found
+
+    def find(self, name: Union[None, str, Sequence[str]] = None, string=None, **attrs):
+        """First match of find_all, or None"""
+        found = self.find_all(name, string=string, limit=1, **attrs)
+        return found[0] if found else None
+
+    def _iter(self, name: Union[None, str, Sequence[str]]) -> Iterator:
+        names = [name] if isinstance(name, str) else list(name or [])
+        for element in self.element.iterdescendants(*names) if names else self.element.iterdescendants():
+            if isinstance(element.tag, str):
+                yield element
+
+
+# A page parsed by parse_html
+HtmlPage = Union[BeautifulSoup, LxmlTag]
+
+
+def _matches(value: Optional[str], pattern) -> bool:
+    if pattern is True:
+        return value is not None
+    if value is None:
+        return False
+    if isinstance(pattern, str):
+        return value == pattern
+    return bool(pattern.search(value))
+
+
+def _keep_outside_strings(document, markup: str, before=None) -> None:
+    """Add the whitespace of markup outside the root element to the document, before an element or at the end
+
+    Each comment or declaration of markup becomes an empty comment, so the strings between
+    them stay separate strings, as in BeautifulSoup.
+    """
+    strings = _MARKUP.split(markup)
+    index = document.index(before) if before is not None else len(document)
+    if index:
+        document[index - 1].tail = strings[0] or None
+    else:
+        document.text = strings[0] or None
+    for string in strings[1:]:
+        comment = etree.Comment()
+        comment.tail = string or None
+        document.insert(index, comment)
+        index += 1
+
+
+def _lxml_page(markup: str, only: Optional[Sequence[str]]) -> LxmlTag:
+    try:
+        root = lxml.html.document_fromstring(markup.encode('utf-8'), parser=_utf8_parser)
+    except etree.ParserError:
+        # An empty document
+        root = lxml.html.Element('html')
+
+    if only:
+        # Keep the outermost elements of the given names, as a SoupStrainer would
+        # (in document order, an element inside a kept one is inside the last one kept)
+        kept = []
+        for element in root.iter(*only):
+            if not kept or not any(ancestor is kept[-1] for ancestor in element.iterancestors()):
+                kept.append(element)
+        root = lxml.html.Element('html')
+        for element in kept:
+            element.tail = None
+            root.append(element)
+
+    # The root is a document for find_all, like the BeautifulSoup object
+    document = lxml.html.Element('document')
+    document.append(root)
+    if not only:
+        _keep_outside_strings(document, _PROLOGUE.match(markup).group(), before=root)
+        epilogue = _EPILOGUE.search(markup)
+        if epilogue:
+            _keep_outside_strings(document, epilogue.group(1))
+    return LxmlTag(document)
+
+
+def parse_html(markup: str, only: Optional[Sequence[str]] = None, parser: Optional[str] = None) -> HtmlPage:
+    """Parse a page into an object with the BeautifulSoup API used by the checks
+
+    Args:
+        markup: HTML of the page
+        only: Tag names of the only elements the page is needed for (e.g. ['a']); the
+              page then contains just those elements and their content
+        parser: Parser to use instead of HTML_PARSER
+    """
+    parser = parser or HTML_PARSER
+    if parser == 'lxml' and lxml:
+        return _lxml_page(markup, only)
+    return BeautifulSoup(markup, parser, parse_only=SoupStrainer(list(only)) if only else None)
+
+
+class _TextTarget:
+    """Parser target passing on the strings get_text would return, as they are parsed"""
+
+    def __init__(self, on_text):
+        self.on_text = on_text
+        self.skipping = 0
+
+    def start(self, tag, attrib):
+        if tag in NON_TEXT_TAGS:
+            self.skipping += 1
+
+    def end(self, tag):
+        if tag in NON_TEXT_TAGS and self.skipping:
+            self.skipping -= 1
+
+    def data(self, data):
+        if not self.skipping:
+            self.on_text(data)
+
+    def close(self):
+        pass
+
+
+class _StdlibTextParser(html.parser.HTMLParser):
+    """html.parser feeding a _TextTarget, for when lxml is not installed"""
+
+    def __init__(self, target: _TextTarget):
+        super().__init__()
+        self.target = target
+
+    def handle_starttag(self, tag, attrs):
+        self.target.start(tag, dict(attrs))
+
+    def handle_endtag(self, tag):
+        self.target.end(tag)
+
+    def handle_data(self, data):
+        self.target.data(data)
+
+
+class KeywordScan:
+    """Incremental search for keywords in the text of a page fed to it chunk by chunk
+
+    Keywords are matched in the lowercased page text as get_text joins it, so a
+    whole page finds the same keywords as `keyword in page.get_text().lower()`.
+    Use `feed` as HttpRequest.scan: it returns True (stop reading) once `needed`
+    different keywords were found.
+    """
+
+    def __init__(self, keywords: Sequence[str], needed: int):
+        """
+        Args:
+            keywords: Strings to look for
+            needed: Number of different keywords after which the scan is done
+        """
+        self.keywords = list(keywords)
+        self.needed = needed
+        self.found: Set[str] = set()
+        # Keywords are ASCII, so bytes of another encoding can't make them (dis)appear
+        self._decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        target = _TextTarget(self._add_text)
+        self._parser = etree.HTMLParser(target=target) if lxml else _StdlibTextParser(target)
+        # End of the text so far, to find keywords split between two strings or chunks
+        self._tail = ''
+        self._overlap = max(map(len, self.keywords), default=1) - 1
+
+    @property
+    def done(self) -> bool:
+        return len(self.found) >= self.needed
+
+    def feed(self, chunk: bytes) -> bool:
+        """Scan the next chunk of the page; True once enough keywords were found"""
+        if not self.done:
+            self._parser.feed(self._decoder.decode(chunk))
+        return self.done
+
+    def close(self) -> bool:
+        """Scan what the parser still buffers at the end of the page; True if enough keywords were found"""
+        if not self.done:
+            try:
+                self._parser.feed(self._decoder.decode(b'', final=True))
+                self._parser.close()
+            except Exception:
+                # lxml raises on a page without any markup
+                pass
+        return self.done
+
+    def _add_text(self, text: str):
+        window = self._tail + text.lower()
+        for keyword in self.keywords:
+            if keyword not in self.found and keyword in window:
+                self.found.add(keyword)
+        self._tail = window[-self._overlap:] if self._overlap else ''
+
+
+# Pages whose lxml text must read exactly as BeautifulSoup's (python html_pages.py checks them)
+_PARITY_PAGES = (
+    '<!DOCTYPE html>\n<html lang="en">\n<head>\n<meta charset="utf-8">\n<title>Trade and Wages | Journal</title>\n'
+    '<script>var dataLayer = [];</script>\n<style>h1 { color: red; }</style>\n</head>\n<body>\n<!-- header -->\n'
+    '<h1>Data &amp; more</h1>\n<!-- supplementary -->\n<p>Supplementary data</p>\n'
+    '<div class="abstract"><p>We use <em>replication</em> files<br>from the <b>AEA</b> archive.</p></div>\n'
+    '<table>\n  <tr><th>File</th><th>Size</th></tr>\n  <tr><td>data.zip</td><td>2 MB</td></tr>\n</table>\n'
+    '<ul>\n  <li><a href="https://doi.org/10.3886/E123V1">Replication package</a></li>\n  <li>Code &nbsp; and data</li>\n</ul>\n'
+    '<pre>\n  stata do main.do\n</pre>\n<template><p>hidden</p></template>\n<footer>&copy; 2024</footer>\n'
+    '</body>\n</html>\n<!-- served from cache -->\n',
+    '<html><head><title>openICPSR</title></head><body><div id="results">\n<h2>Search results</h2><!-- 2 -->'
+    '<div class="result"><a href="/project/1">Project 1</a><!--x-->Data for: paper</div>\n'
+    '<div class="result"><a href="/project/2">Project 2</a></div></div></body></html>',
+    '<?xml version="1.0" encoding="utf-8"?>\n<!DOCTYPE html>\n<html xmlns="http://www.w3.org/1999/xhtml">\n'
+    '<head><title>Dataverse</title></head>\n<body>\n<h1>Replication Data for: Wages</h1>\n'
+    '<p>Files<?php echo 1; ?> and code</p>\n</body>\n</html>\n',
+    '<h1>Data & more</h1><!-- c -->\nSupplementary data\n<p>x</p>\n',
+    '  <div>Only a fragment</div>  \n',
+    '',
+)
+
+
+if __name__ == "__main__":
+    for markup in _PARITY_PAGES:
+        expected = BeautifulSoup(markup, 'html.parser').get_text()
+        text = parse_html(markup, parser='lxml').get_text()
+        assert text == expected, f"get_text differs from BeautifulSoup:\n{text!r}\n{expected!r}"
+    print(f"get_text matches BeautifulSoup (html.parser) on {len(_PARITY_PAGES)} pages")
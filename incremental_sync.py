@@ -0,0 +1,80 @@
+"""
+Incremental CrossRef sync for the journal scrapers
+
+A SyncState remembers, per ISSN, the date of the last successful sync. The
+scrapers' sync_all_journals then asks CrossRef only for works indexed since that
+date (`from-index-date`, which covers new deposits as well as metadata updates)
+and merges them into the previous results with merge_results.
+"""
+
+import json
+import logging
+import os
+import threading
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+
+class SyncState:
+    """Last CrossRef sync date (YYYY-MM-DD, UTC) per ISSN, kept in a JSON file"""
+
+    def __init__(self, path: str = 'crossref_sync.json'):
+        """
+        Args:
+            path: JSON file holding the sync dates (created on the first save)
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._dates: Dict[str, str] = {}
+
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                self._dates = json.load(f)
+
+    def last_sync(self, issn: str) -> Optional[str]:
+        """Date of the last sync of an ISSN, or None if it was never synced"""
+        with self._lock:
+            return self._dates.get(issn)
+
+    def mark_synced(self, issn: str, date: str):
+        """Record that an ISSN is up to date as of `date` (see sync_date)"""
+        with self._lock:
+            self._dates[issn] = date
+
+    def save(self):
+        """Write the sync dates to disk (atomically, so an interrupted save keeps the old state)"""
+        with self._lock:
+            tmp = f"{self.path}.tmp"
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(self._dates, f, indent=2, sort_keys=True)
+            os.replace(tmp, self.path)
+
+
+def sync_date() -> str:
+    """Today's date in UTC, as recorded at the start of a sync
+
+    CrossRef date filters have day granularity and are inclusive, so the next sync
+    overlaps this one by a day rather than missing works indexed during the run.
+    """
+    return datetime.now(timezone.utc).date().isoformat()
+
+
+def merge_results(existing: pd.DataFrame, updates: List[Dict]) -> List[Dict]:
+    """Merge new or updated papers into earlier results
+
+    Papers are matched by DOI (case-insensitively); an updated paper replaces its
+    old row. Papers without a DOI are always kept.
+    """
+    merged = pd.concat([existing, pd.DataFrame(updates)], ignore_index=True)
+    if merged.empty or 'doi' not in merged.columns:
+        return merged.to_dict('records')
+
+    dois = merged['doi'].fillna('').astype(str).str.strip().str.lower()
+    keep = ~dois.duplicated(keep='last') | dois.isin(['', 'n/a'])
+    logger.info(f"Merged {len(updates)} new or updated papers into {len(existing)} existing "
+                f"({keep.sum()} papers after merge)")
+    return merged[keep].to_dict('records')
@@ -0,0 +1,241 @@
+"""
+Local index of openICPSR projects for the economics scraper
+
+search_openicpsr scrapes the openICPSR search page and then downloads up to
+seven project pages per paper, which makes openICPSR the slowest repository to
+search. An OpenICPSRIndex instead harvests the metadata of every project once
+through openICPSR's OAI-PMH interface (project id, title, authors, related
+publication DOIs) and keeps it in a SQLite file; later refreshes only fetch the
+projects added or changed since the last harvest. Papers are matched in memory,
+by DOI and by title similarity, without any request.
+
+An index is only used once a harvest completed and stored projects (see
+`ready`); until then search_openicpsr keeps scraping the search page.
+"""
+
+import logging
+import re
+import sqlite3
+import threading
+import xml.etree.ElementTree as ET
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional, Set
+
+from replication_cache import normalize_doi
+from scraper_utils import HttpRequest, Steps
+
+logger = logging.getLogger(__name__)
+
+OPENICPSR_OAI_URL = 'https://www.openicpsr.org/openicpsr/oai'
+OPENICPSR_PROJECT_URL = 'https://www.openicpsr.org/openicpsr/project/{}'
+
+OAI_NS = {'oai': 'http://www.openarchives.org/OAI/2.0/', 'dc': 'http://purl.org/dc/elements/1.1/'}
+
+# DOIs in free text, and the DOIs of openICPSR projects themselves (10.3886/E123456V1)
+DOI_PATTERN = re.compile(r'10\.\d{4,9}/[^\s"<>;,]+[^\s"<>;,.)]')
+PROJECT_DOI_PATTERN = re.compile(r'10\.3886/e(\d+)v\d+', re.I)
+
+# Minimum score of a title match, as in the search page strategy of search_openicpsr
+MIN_TITLE_SCORE = 0.4
+
+# Projects sharing the most title words with a paper that are scored in full
+MAX_TITLE_CANDIDATES = 20
+
+
+def _title_words(text: str) -> Set[str]:
+    """Significant (longer than 3 characters) lowercase words of a title"""
+    return {w for w in re.findall(r'\w+', text.lower()) if len(w) > 3}
+
+
+class OpenICPSRIndex:
+    """Thread-safe, SQLite-backed index of openICPSR project metadata, queried in memory"""
+
+    def __init__(self, path: str = 'openicpsr_index.sqlite', oai_url: str = OPENICPSR_OAI_URL):
+        """
+        Args:
+            path: SQLite database file (created if missing)
+            oai_url: OAI-PMH endpoint the projects are harvested from
+        """
+        self.path = path
+        self.oai_url = oai_url
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS projects (
+                project_id TEXT PRIMARY KEY,
+                title TEXT NOT NULL,
+                authors TEXT NOT NULL,
+                dois TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+        """)
+
+        self._harvested = self.last_harvest is not None
+        self._projects: Dict[str, Dict] = {}
+        self._by_doi: Dict[str, Set[str]] = defaultdict(set)
+        self._by_word: Dict[str, Set[str]] = defaultdict(set)
+        for project_id, title, authors, dois in self._db.execute('SELECT * FROM projects'):
+            self._add(project_id, title, authors, dois.split())
+
+    def __len__(self) -> int:
+        return len(self._projects)
+
+    @property
+    def ready(self) -> bool:
+        """Whether a harvest completed and the index holds projects to match papers against"""
+        return self._harvested and len(self) > 0
+
+    @property
+    def last_harvest(self) -> Optional[str]:
+        """Date (YYYY-MM-DD, UTC) the last complete harvest started, or None if there was none"""
+        with self._lock:
+            row = self._db.execute("SELECT value FROM meta WHERE key = 'last_harvest'").fetchone()
+        return row[0] if row else None
+
+    def _add(self, project_id: str, title: str, authors: str, dois: List[str]):
+        self._remove(project_id)
+        self._projects[project_id] = {'title': title, 'authors': authors, 'dois': dois,
+                                      'words': _title_words(title)}
+        for doi in dois:
+            self._by_doi[doi].add(project_id)
+        for word in self._projects[project_id]['words']:
+            self._by_word[word].add(project_id)
+
+    def _remove(self, project_id: str):
+        project = self._projects.pop(project_id, None)
+        if project:
+            for doi in project['dois']:
+                self._by_doi[doi].discard(project_id)
+            for word in project['words']:
+                self._by_word[word].discard(project_id)
+
+    def refresh_steps(self) -> Steps[int]:
+        """Step generator harvesting the projects added or changed since the last harvest
+
+        Returns the number of projects stored. The harvest date is only saved once every
+        page is done, so an interrupted refresh is repeated from the same date.
+        """
+        last_harvest = self.last_harvest
+        params = {'verb': 'ListRecords', 'metadataPrefix': 'oai_dc'}
+        if last_harvest:
+            params['from'] = last_harvest
+        logger.info(f"Harvesting openICPSR projects {'since ' + last_harvest if last_harvest else '(full)'}")
+
+        stored = records = 0
+        started = None
+        while True:
+            response = yield HttpRequest(self.oai_url, params=params, timeout=60)
+            if response.status_code != 200:
+                raise RuntimeError(f"openICPSR OAI-PMH error: {response.status_code}")
+
+            root = ET.fromstring(response.text)
+            if started is None:
+                started = (root.findtext('oai:responseDate', '', OAI_NS) or '')[:10]
+
+            error = root.find('oai:error', OAI_NS)
+            if error is not None:
+                if error.get('code') == 'noRecordsMatch':
+                    break
+                raise RuntimeError(f"openICPSR OAI-PMH error: {error.get('code')} {error.text}")
+
+            page = root.findall('oai:ListRecords/oai:record', OAI_NS)
+            records += len(page)
+            stored += self._store_records(page)
+
+            token = root.findtext('oai:ListRecords/oai:resumptionToken', '', OAI_NS).strip()
+            if not token:
+                break
+            params = {'verb': 'ListRecords', 'resumptionToken': token}
+
+        if started:
+            with self._lock:
+                self._db.execute("INSERT OR REPLACE INTO meta VALUES ('last_harvest', ?)", (started,))
+            self._harvested = True
+        logger.info(f"  {stored} openICPSR projects stored ({len(self)} in the index)")
+        if records and not stored:
+            logger.warning(f"None of the {records} openICPSR records harvested had a project id: "
+                           f"check the metadata of {self.oai_url}")
+        if not self.ready:
+            logger.warning("The openICPSR index is still empty: papers are searched on openICPSR instead")
+        return stored
+
+    def _store_records(self, records: List[ET.Element]) -> int:
+        """Store (or remove, if deleted) the projects of a page of OAI-PMH records"""
+        rows, deleted = [], []
+        for record in records:
+            header = record.find('oai:header', OAI_NS)
+            identifiers = [header.findtext('oai:identifier', '', OAI_NS)]
+            identifiers += [e.text or '' for e in record.iterfind('oai:metadata//dc:identifier', OAI_NS)]
+            project_id = self._project_id(identifiers)
+            if not project_id:
+                continue
+            if header.get('status') == 'deleted':
+                deleted.append(project_id)
+                continue
+
+            metadata = record.find('oai:metadata', OAI_NS)
+            title = metadata.findtext('.//dc:title', '', OAI_NS).strip() if metadata is not None else ''
+            authors = '; '.join(e.text.strip() for e in record.iterfind('oai:metadata//dc:creator', OAI_NS) if e.text)
+            related = ' '.join(e.text or '' for tag in ('relation', 'source', 'description')
+                               for e in record.iterfind(f'oai:metadata//dc:{tag}', OAI_NS))
+            dois = sorted({normalize_doi(doi) for doi in DOI_PATTERN.findall(related)
+                           if not PROJECT_DOI_PATTERN.match(doi)})
+            rows.append((project_id, title, authors, ' '.join(dois)))
+
+        with self._lock:
+            self._db.executemany('INSERT OR REPLACE INTO projects VALUES (?, ?, ?, ?)', rows)
+            self._db.executemany('DELETE FROM projects WHERE project_id = ?', [(p,) for p in deleted])
+            for project_id, title, authors, dois in rows:
+                self._add(project_id, title, authors, dois.split())
+            for project_id in deleted:
+                self._remove(project_id)
+        return len(rows)
+
+    @staticmethod
+    def _project_id(identifiers: List[str]) -> Optional[str]:
+        """openICPSR project number from a record's identifiers (project DOI, URL or OAI id)"""
+        for identifier in identifiers:
+            match = PROJECT_DOI_PATTERN.search(identifier) or re.search(r'/project/(\d+)', identifier) or \
+                re.search(r'openicpsr[^\d]*(\d+)$', identifier, re.I)
+            if match:
+                return match.group(1)
+        return None
+
+    def match_doi(self, doi: str) -> Optional[str]:
+        """URL of a project whose related publications include a DOI"""
+        with self._lock:
+            project_ids = sorted(self._by_doi.get(normalize_doi(doi), ()))
+        return OPENICPSR_PROJECT_URL.format(project_ids[0]) if project_ids else None
+
+    def match_title(self, title: str, authors: str = '') -> Optional[str]:
+        """URL of the project whose title best matches a paper's, if its score is high enough
+
+        The score weighs the Jaccard similarity of the titles' significant words (0.6),
+        the share of the paper's title words in the project title (0.3) and whether the
+        first author is among the project's authors (0.1), like the search page strategy.
+        """
+        words = _title_words(title)
+        if not words:
+            return None
+
+        author_last = ''
+        if authors and authors != 'N/A':
+            author_parts = authors.split(';')[0].strip().split()
+            author_last = author_parts[-1].lower() if author_parts else ''
+
+        with self._lock:
+            shared = Counter(project_id for word in words for project_id in self._by_word.get(word, ()))
+            best_match, best_score = None, 0.0
+            for project_id, common in shared.most_common(MAX_TITLE_CANDIDATES):
+                project = self._projects[project_id]
+                similarity = common / len(words | project['words'])
+                author_match = bool(author_last) and author_last in project['authors'].lower()
+                score = similarity * 0.6 + (common / len(words)) * 0.3 + (0.1 if author_match else 0)
+                if score > best_score and score >= MIN_TITLE_SCORE:
+                    best_match, best_score = project_id, score
+
+        return OPENICPSR_PROJECT_URL.format(best_match) if best_match else None
+
+    def close(self):
+        with self._lock:
+            self._db.close()
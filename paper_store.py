@@ -0,0 +1,90 @@
+"""
+Two-phase scraping: a local store of harvested paper metadata
+
+Replication detection is by far the slowest part of a scrape. The scrapers can
+therefore split it off: `harvest_metadata` parses the CrossRef results into
+records without any other network call and saves them in a PaperStore, and
+`enrich_papers` later runs the replication searches over the stored records.
+Each enriched record is saved as soon as its search finishes, so an interrupted
+enrichment resumes with the records still pending.
+"""
+
+import json
+import logging
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+
+from replication_cache import normalize_doi
+
+logger = logging.getLogger(__name__)
+
+
+def record_key(record: Dict) -> str:
+    """Identity of a paper in the store: its DOI, or journal and title for papers without one"""
+    doi = record.get('doi') or ''
+    if doi and doi != 'N/A':
+        return normalize_doi(doi)
+    return f"{record.get('journal', '')}|{record.get('title', '')}"
+
+
+class PaperStore:
+    """Thread-safe SQLite store of paper records awaiting or done with replication enrichment"""
+
+    def __init__(self, path: str = 'papers.sqlite'):
+        """
+        Args:
+            path: SQLite database file (created if missing)
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS papers (
+                key TEXT PRIMARY KEY,
+                journal TEXT NOT NULL,
+                record TEXT NOT NULL,
+                enriched INTEGER NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        """)
+
+    def add(self, records: List[Dict]) -> int:
+        """Store harvested records, keeping papers already in the store; returns the number added"""
+        now = time.time()
+        with self._lock:
+            before = self._db.total_changes
+            self._db.executemany('INSERT OR IGNORE INTO papers VALUES (?, ?, ?, 0, ?)',
+                                 [(record_key(r), r.get('journal', ''), json.dumps(r), now) for r in records])
+            return self._db.total_changes - before
+
+    def pending(self, limit: Optional[int] = None) -> List[Dict]:
+        """Records that have not been enriched yet, in harvest order"""
+        query = 'SELECT record FROM papers WHERE enriched = 0 ORDER BY rowid'
+        if limit is not None:
+            query += f' LIMIT {int(limit)}'
+        with self._lock:
+            return [json.loads(row[0]) for row in self._db.execute(query)]
+
+    def update(self, record: Dict):
+        """Replace a record with its enriched version"""
+        with self._lock:
+            self._db.execute('UPDATE papers SET record = ?, enriched = 1, updated_at = ? WHERE key = ?',
+                             (json.dumps(record), time.time(), record_key(record)))
+
+    def records(self, enriched_only: bool = False) -> List[Dict]:
+        """All stored records in harvest order"""
+        query = 'SELECT record FROM papers' + (' WHERE enriched = 1' if enriched_only else '') + ' ORDER BY rowid'
+        with self._lock:
+            return [json.loads(row[0]) for row in self._db.execute(query)]
+
+    def counts(self) -> Dict[str, int]:
+        """Number of stored records, enriched and still pending"""
+        with self._lock:
+            total, enriched = self._db.execute('SELECT COUNT(*), COALESCE(SUM(enriched), 0) FROM papers').fetchone()
+        return {'total': total, 'enriched': enriched, 'pending': total - enriched}
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,124 @@
+"""
+Persistent DOI -> replication package results for the journal scrapers
+
+`detect_replication_package` runs a chain of repository searches per paper. The
+ReplicationCache remembers the outcome per DOI so later runs can skip the chain:
+confirmed packages are reused as they are, while papers without a package are
+searched again once their result is older than `negative_ttl_days` (authors
+often deposit packages months after publication).
+"""
+
+import logging
+import sqlite3
+import threading
+import time
+from typing import NamedTuple, Optional
+from urllib.parse import urlparse
+
+from response_cache import DAY, match_domain
+
+logger = logging.getLogger(__name__)
+
+# Days after which a paper without a replication package is searched again
+DEFAULT_NEGATIVE_TTL_DAYS = 7
+
+# Repository a package URL belongs to, by host (keys also match subdomains)
+REPLICATION_SOURCES = {
+    'zenodo.org': 'zenodo',
+    'dataverse.harvard.edu': 'dataverse',
+    'osf.io': 'osf',
+    'openicpsr.org': 'openicpsr',
+    'icpsr.umich.edu': 'openicpsr',
+    'aeaweb.org': 'aea',
+    'github.com': 'github',
+    'figshare.com': 'figshare',
+    'researchbox.org': 'researchbox',
+    'aspredicted.org': 'aspredicted',
+    'psycharchives.org': 'psycharchives',
+}
+
+
+def replication_source(url: str) -> str:
+    """Name of the repository hosting a package URL ('journal' for publisher pages)"""
+    if not url:
+        return ''
+    domain = match_domain(urlparse(url).hostname or '', REPLICATION_SOURCES)
+    return REPLICATION_SOURCES[domain] if domain else 'journal'
+
+
+def normalize_doi(doi: str) -> str:
+    """Lowercase a DOI and strip any resolver prefix, e.g. https://doi.org/10.1257/X -> 10.1257/x"""
+    doi = doi.strip().lower()
+    for prefix in ('https://doi.org/', 'http://doi.org/', 'https://dx.doi.org/', 'http://dx.doi.org/', 'doi:'):
+        if doi.startswith(prefix):
+            return doi[len(prefix):]
+    return doi
+
+
+class ReplicationResult(NamedTuple):
+    """Stored outcome of a replication package search"""
+    has_package: int
+    url: str
+    source: str
+    checked_at: float
+
+
+class ReplicationCache:
+    """Thread-safe SQLite store of replication package results keyed by DOI"""
+
+    def __init__(self, path: str = 'replication_cache.sqlite',
+                 negative_ttl_days: float = DEFAULT_NEGATIVE_TTL_DAYS):
+        """
+        Args:
+            path: SQLite database file (created if missing)
+            negative_ttl_days: Days before a paper without a package is searched again
+                               (papers with a package are never searched again)
+        """
+        self.path = path
+        self.negative_ttl_days = negative_ttl_days
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS replication_results (
+                doi TEXT PRIMARY KEY,
+                has_package INTEGER NOT NULL,
+                url TEXT NOT NULL,
+                source TEXT NOT NULL,
+                checked_at REAL NOT NULL
+            )
+        """)
+
+    def lookup(self, doi: str) -> Optional[ReplicationResult]:
+        """Return the stored result for a DOI, whether or not it is still fresh"""
+        with self._lock:
+            row = self._db.execute('SELECT has_package, url, source, checked_at FROM replication_results '
+                                   'WHERE doi = ?', (normalize_doi(doi),)).fetchone()
+        return ReplicationResult(*row) if row else None
+
+    def get(self, doi: str) -> Optional[ReplicationResult]:
+        """Return the result for a DOI if it can be reused, or None if the DOI needs a search"""
+        result = self.lookup(doi)
+        if result is not None and not result.has_package:
+            if time.time() - result.checked_at > self.negative_ttl_days * DAY:
+                result = None
+
+        with self._lock:
+            if result is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return result
+
+    def put(self, doi: str, has_package: int, url: str, source: Optional[str] = None):
+        """Store the result of a search (source defaults to the repository hosting url)"""
+        if source is None:
+            source = replication_source(url)
+        with self._lock:
+            self._db.execute('INSERT OR REPLACE INTO replication_results VALUES (?, ?, ?, ?, ?)',
+                             (normalize_doi(doi), int(has_package), url or '', source, time.time()))
+
+    def close(self):
+        with self._lock:
+            self._db.close()
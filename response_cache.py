@@ -0,0 +1,365 @@
+"""
+Persistent on-disk cache of HTTP responses for the journal scrapers
+
+Responses are keyed by method + full URL (query parameters included) and stored
+zlib-compressed, either in one SQLite file (SQLiteResponseCache) or as one file
+per response in a directory (DirectoryResponseCache). Entries expire after a
+per-host TTL and the least recently used ones are evicted once the cache grows
+beyond `max_size` bytes.
+
+With `offline=True` the cache replays whatever it holds, expired or not, and
+requests it cannot answer fail with a 504 instead of reaching the network.
+
+An expired response that came with an ETag or Last-Modified header is not
+downloaded again: the request is sent with If-None-Match / If-Modified-Since
+(see revalidation_headers) and a 304 answer renews the stored response.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+logger = logging.getLogger(__name__)
+
+DAY = 24 * 3600
+
+# Seconds a cached response stays fresh, per host (keys also match subdomains).
+# Search APIs pick up new deposits, so they expire sooner than publisher pages.
+DEFAULT_CACHE_TTLS = {
+    'api.crossref.org': 1 * DAY,
+    'api.datacite.org': 1 * DAY,
+    'zenodo.org': 1 * DAY,
+    'dataverse.harvard.edu': 1 * DAY,
+    'api.osf.io': 1 * DAY,
+    'openicpsr.org': 1 * DAY,
+}
+
+# TTL for hosts without an entry (publisher pages, doi.org redirects, ...)
+DEFAULT_CACHE_TTL = 7 * DAY
+
+# Query parameters of requests whose responses are never replayed online (TTL 0): a
+# CrossRef deep-paging cursor expires minutes after it is handed out, so a replayed page
+# would lead the next request to an expired cursor. Offline mode still replays them.
+UNCACHED_PARAMS = ('cursor',)
+
+# Default size bound of the cache on disk (compressed bytes)
+DEFAULT_CACHE_MAX_SIZE = 1024 ** 3
+
+# Only stable answers are cached; rate limits and server errors are always retried
+CACHEABLE_STATUSES = (200, 203, 300, 301, 302, 303, 307, 308, 404, 410)
+
+# Eviction trims the cache to this fraction of max_size, so it doesn't run on every write
+EVICT_TO = 0.9
+
+
+def match_domain(host: str, domains) -> Optional[str]:
+    """Return the most specific entry of `domains` that `host` equals or is a subdomain of"""
+    parts = host.lower().split('.')
+    for i in range(len(parts) - 1):
+        domain = '.'.join(parts[i:])
+        if domain in domains:
+            return domain
+    return None
+
+
+class CachedResponse(NamedTuple):
+    """A response replayed from the cache"""
+    status_code: int
+    url: str
+    headers: Dict[str, str]
+    content: bytes
+    stored_at: float
+
+
+def _header(headers: Dict[str, str], name: str) -> Optional[str]:
+    """Value of a response header, whatever the case of its stored name"""
+    name = name.lower()
+    return next((value for key, value in headers.items() if key.lower() == name), None)
+
+
+def revalidation_headers(entry: CachedResponse) -> Dict[str, str]:
+    """Conditional request headers revalidating a stored response (empty without validators)"""
+    headers = {}
+    etag = _header(entry.headers, 'ETag')
+    if etag:
+        headers['If-None-Match'] = etag
+    last_modified = _header(entry.headers, 'Last-Modified')
+    if last_modified:
+        headers['If-Modified-Since'] = last_modified
+    return headers
+
+
+def _encode_entry(status_code: int, url: str, headers: Dict[str, str], content: bytes,
+                  stored_at: float) -> bytes:
+    """Pack a response into a compressed blob: a JSON header line followed by the body"""
+    meta = json.dumps({'status_code': status_code, 'url': url, 'headers': headers,
+                       'stored_at': stored_at}).encode('utf-8')
+    return zlib.compress(meta + b'\n' + content)
+
+
+def _decode_entry(blob: bytes) -> CachedResponse:
+    """Unpack a blob written by _encode_entry"""
+    meta, _, content = zlib.decompress(blob).partition(b'\n')
+    meta = json.loads(meta)
+    return CachedResponse(meta['status_code'], meta['url'], meta['headers'], content, meta['stored_at'])
+
+
+class ResponseCache:
+    """Base class of the on-disk response caches
+
+    Subclasses store compressed blobs and implement _read, _write and _evict;
+    this class handles keys, TTLs, offline mode and hit/miss counters. All methods
+    are thread-safe, so one cache can sit under a scraper's shared session and
+    its async client at the same time.
+    """
+
+    def __init__(self, ttls: Optional[Dict[str, float]] = None, default_ttl: float = DEFAULT_CACHE_TTL,
+                 max_size: int = DEFAULT_CACHE_MAX_SIZE, offline: bool = False):
+        """
+        Args:
+            ttls: Per-host TTLs in seconds overriding DEFAULT_CACHE_TTLS,
+                  e.g. {'api.crossref.org': 3600}
+            default_ttl: TTL in seconds for hosts without an entry
+            max_size: Maximum size of the cache on disk in bytes (least recently used
+                      responses are evicted first)
+            offline: Replay cached responses only, ignoring TTLs and never hitting the network
+        """
+        self.ttls = dict(DEFAULT_CACHE_TTLS)
+        self.ttls.update(ttls or {})
+        self.default_ttl = default_ttl
+        self.max_size = max_size
+        self.offline = offline
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.RLock()
+
+    @staticmethod
+    def key(method: str, url: str) -> str:
+        """Cache key of a request; `url` must already include the encoded query string"""
+        return hashlib.sha256(f"{method.upper()} {url}".encode('utf-8')).hexdigest()
+
+    def ttl(self, url: str) -> float:
+        """TTL in seconds for responses from the URL's host (0 for UNCACHED_PARAMS requests)"""
+        parsed = urlparse(url)
+        if any(param in UNCACHED_PARAMS for param in parse_qs(parsed.query, keep_blank_values=True)):
+            return 0
+        domain = match_domain(parsed.hostname or '', self.ttls)
+        return self.ttls[domain] if domain else self.default_ttl
+
+    def lookup(self, method: str, url: str) -> Optional[CachedResponse]:
+        """Return the stored response for a request, whether or not it has expired"""
+        with self._lock:
+            blob = self._read(self.key(method, url))
+
+        entry = None
+        if blob is not None:
+            try:
+                entry = _decode_entry(blob)
+            except Exception as e:
+                logger.debug(f"Corrupt cache entry for {url}: {e}")
+        return entry
+
+    def get(self, method: str, url: str) -> Optional[CachedResponse]:
+        """Return the cached response for a request, or None if missing or expired"""
+        entry = self.lookup(method, url)
+        if entry is not None and not self.offline and time.time() - entry.stored_at >= self.ttl(url):
+            entry = None
+
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return entry
+
+    def put(self, method: str, url: str, status_code: int, headers: Dict[str, str], content: bytes):
+        """Store a response (ignored unless its status is in CACHEABLE_STATUSES)"""
+        if status_code not in CACHEABLE_STATUSES:
+            return
+
+        stored_at = time.time()
+        blob = _encode_entry(status_code, url, dict(headers), content, stored_at)
+        with self._lock:
+            self._write(self.key(method, url), url, stored_at, blob)
+            self._evict()
+
+    def revalidated(self, method: str, url: str, entry: CachedResponse,
+                    headers: Dict[str, str]) -> CachedResponse:
+        """Renew an expired response after a 304 answer to its revalidation (see revalidation_headers)
+
+        Args:
+            method: HTTP method of the request
+            url: Request URL (with the encoded query string)
+            entry: Stored response that was revalidated
+            headers: Headers of the 304 response; new validators replace the stored ones
+        """
+        entry_headers = dict(entry.headers)
+        for name in ('ETag', 'Last-Modified'):
+            value = _header(headers, name)
+            if value:
+                entry_headers = {k: v for k, v in entry_headers.items() if k.lower() != name.lower()}
+                entry_headers[name] = value
+        self.put(method, url, entry.status_code, entry_headers, entry.content)
+        return entry._replace(headers=entry_headers, stored_at=time.time())
+
+    def close(self):
+        """Release any resources held by the backend"""
+
+    def _read(self, key: str) -> Optional[bytes]:
+        """Return the blob stored under key and mark it as recently used"""
+        raise NotImplementedError
+
+    def _write(self, key: str, url: str, stored_at: float, blob: bytes):
+        """Store or replace the blob under key"""
+        raise NotImplementedError
+
+    def _evict(self):
+        """Drop least recently used entries while the cache is larger than max_size"""
+        raise NotImplementedError
+
+
+class SQLiteResponseCache(ResponseCache):
+    """Response cache kept in a single SQLite database file"""
+
+    def __init__(self, path: str = 'http_cache.sqlite', **kwargs):
+        """
+        Args:
+            path: SQLite database file (created if missing)
+            **kwargs: ttls, default_ttl, max_size and offline (see ResponseCache)
+        """
+        super().__init__(**kwargs)
+        self.path = path
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                url TEXT NOT NULL,
+                stored_at REAL NOT NULL,
+                accessed_at REAL NOT NULL,
+                size INTEGER NOT NULL,
+                data BLOB NOT NULL
+            )
+        """)
+        self._db.execute('CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at)')
+        self._size = self._db.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+
+    def _read(self, key: str) -> Optional[bytes]:
+        row = self._db.execute('SELECT data FROM responses WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return None
+        self._db.execute('UPDATE responses SET accessed_at = ? WHERE key = ?', (time.time(), key))
+        return row[0]
+
+    def _write(self, key: str, url: str, stored_at: float, blob: bytes):
+        old = self._db.execute('SELECT size FROM responses WHERE key = ?', (key,)).fetchone()
+        self._db.execute('INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)',
+                         (key, url, stored_at, stored_at, len(blob), blob))
+        self._size += len(blob) - (old[0] if old else 0)
+
+    def _evict(self):
+        if self._size <= self.max_size:
+            return
+
+        target = self.max_size * EVICT_TO
+        evicted = []
+        for key, size in self._db.execute('SELECT key, size FROM responses ORDER BY accessed_at'):
+            if self._size <= target:
+                break
+            evicted.append((key,))
+            self._size -= size
+
+        self._db.executemany('DELETE FROM responses WHERE key = ?', evicted)
+        logger.debug(f"Evicted {len(evicted)} responses from {self.path}")
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+class DirectoryResponseCache(ResponseCache):
+    """Response cache kept as one compressed file per response under a directory
+
+    Files are spread over 256 subdirectories by key prefix; the file modification
+    time records when an entry was last used.
+    """
+
+    def __init__(self, path: str = 'http_cache', **kwargs):
+        """
+        Args:
+            path: Cache directory (created if missing)
+            **kwargs: ttls, default_ttl, max_size and offline (see ResponseCache)
+        """
+        super().__init__(**kwargs)
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+
+        # key -> (size, last used), loaded once so eviction doesn't rescan the directory
+        self._index: Dict[str, Tuple[int, float]] = {}
+        for root, _, files in os.walk(path):
+            for name in files:
+                if name.endswith('.tmp'):
+                    continue
+                stat = os.stat(os.path.join(root, name))
+                self._index[name] = (stat.st_size, stat.st_mtime)
+        self._size = sum(size for size, _ in self._index.values())
+
+    def _file(self, key: str) -> str:
+        return os.path.join(self.path, key[:2], key)
+
+    def _read(self, key: str) -> Optional[bytes]:
+        if key not in self._index:
+            return None
+        try:
+            with open(self._file(key), 'rb') as f:
+                blob = f.read()
+        except OSError:
+            self._size -= self._index.pop(key)[0]
+            return None
+
+        now = time.time()
+        try:
+            os.utime(self._file(key), (now, now))
+        except OSError:
+            pass
+        self._index[key] = (len(blob), now)
+        return blob
+
+    def _write(self, key: str, url: str, stored_at: float, blob: bytes):
+        file = self._file(key)
+        os.makedirs(os.path.dirname(file), exist_ok=True)
+
+        # Write to a temporary file first so readers never see a partial entry
+        tmp = f"{file}.{threading.get_ident()}.tmp"
+        with open(tmp, 'wb') as f:
+            f.write(blob)
+        os.replace(tmp, file)
+
+        old = self._index.get(key)
+        self._index[key] = (len(blob), stored_at)
+        self._size += len(blob) - (old[0] if old else 0)
+
+    def _evict(self):
+        if self._size <= self.max_size:
+            return
+
+        target = self.max_size * EVICT_TO
+        evicted: List[str] = []
+        for key in sorted(self._index, key=lambda k: self._index[k][1]):
+            if self._size <= target:
+                break
+            try:
+                os.remove(self._file(key))
+            except OSError:
+                pass
+            self._size -= self._index.pop(key)[0]
+            evicted.append(key)
+
+        logger.debug(f"Evicted {len(evicted)} responses from {self.path}")
@@ -0,0 +1,136 @@
+"""
+Checkpoints for long scrape_all_journals runs
+
+A ScrapeCheckpoint appends the progress of a run to a JSON-lines file while it
+happens: every finished paper, each journal's CrossRef cursor after every page,
+and the journals that are complete. With `resume=True`, scrape_all_journals
+reads the file back, restores finished journals without any request and
+continues the others from their last cursor, skipping papers already done.
+"""
+
+import json
+import logging
+import os
+import threading
+from collections import defaultdict
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHECKPOINT_PATH = 'scrape_checkpoint.jsonl'
+
+
+class ScrapeCheckpoint:
+    """Thread-safe, append-only progress journal of a scrape_all_journals run
+
+    Papers are flushed to the file as they finish, so they survive a crash or
+    Ctrl-C; cursors and finished journals are also synced to disk.
+    """
+
+    def __init__(self, path: str = DEFAULT_CHECKPOINT_PATH, run: Optional[Dict[str, Any]] = None,
+                 resume: bool = False):
+        """
+        Args:
+            path: JSON-lines checkpoint file
+            run: Settings of the run (years, paper targets, ...); a checkpoint is only
+                 resumed by a run with the same settings
+            resume: Continue from the progress in an existing file instead of starting over
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._papers: Dict[str, List[Dict]] = defaultdict(list)
+        self._cursors: Dict[str, str] = {}
+        self._finished = set()
+
+        if resume and os.path.exists(path):
+            self._load(run)
+            self._file = open(path, 'a', encoding='utf-8')
+            logger.info(f"Resuming from {path}: {sum(map(len, self._papers.values()))} papers done, "
+                        f"{len(self._finished)} journals finished")
+        else:
+            self._file = open(path, 'w', encoding='utf-8')
+            self._append({'type': 'run', 'run': run}, sync=True)
+
+    def _load(self, run: Optional[Dict[str, Any]]):
+        """Replay the entries of an existing checkpoint file"""
+        path = self.path
+        with open(path, 'r', encoding='utf-8') as f:
+            data = f.read()
+
+        for line in data.splitlines():
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                # The last line is cut short if the run died while writing it
+                logger.debug(f"Skipping incomplete checkpoint entry in {path}")
+                continue
+
+            if entry['type'] == 'run':
+                if entry['run'] != run:
+                    raise ValueError(f"{path} was written by a run with different settings "
+                                     f"({entry['run']}); use another checkpoint file or resume=False")
+            elif entry['type'] == 'paper':
+                self._papers[entry['journal']].append(entry['paper'])
+            elif entry['type'] == 'cursor':
+                self._cursors[entry['journal']] = entry['cursor']
+            elif entry['type'] == 'finished':
+                self._papers[entry['journal']].extend(entry.get('papers', []))
+                self._finished.add(entry['journal'])
+
+        # Start new entries on a fresh line after an incomplete one
+        if data and not data.endswith('\n'):
+            with open(path, 'a', encoding='utf-8') as f:
+                f.write('\n')
+
+    def _append(self, entry: Dict[str, Any], sync: bool = False):
+        with self._lock:
+            self._file.write(json.dumps(entry) + '\n')
+            self._file.flush()
+            if sync:
+                os.fsync(self._file.fileno())
+
+    def papers(self, journal: str) -> List[Dict]:
+        """Papers of a journal finished so far, in the order they were scraped"""
+        with self._lock:
+            return list(self._papers[journal])
+
+    def cursor(self, journal: str) -> Optional[str]:
+        """CrossRef cursor of the next page of a journal, or None if no page is done yet"""
+        with self._lock:
+            return self._cursors.get(journal)
+
+    def is_finished(self, journal: str) -> bool:
+        with self._lock:
+            return journal in self._finished
+
+    def add_paper(self, journal: str, paper: Dict):
+        """Record a finished paper"""
+        with self._lock:
+            self._papers[journal].append(paper)
+        self._append({'type': 'paper', 'journal': journal, 'paper': paper})
+
+    def set_cursor(self, journal: str, cursor: str):
+        """Record the cursor of a journal's next page once the current page is done"""
+        with self._lock:
+            self._cursors[journal] = cursor
+        self._append({'type': 'cursor', 'journal': journal, 'cursor': cursor}, sync=True)
+
+    def finish_journal(self, journal: str, papers: Optional[List[Dict]] = None):
+        """Record that a journal is complete, so a resumed run doesn't query it again
+
+        Args:
+            journal: Journal name
+            papers: Papers of a journal processed in one go (not added with add_paper);
+                    they are written in the same entry, so they are recorded all or nothing
+        """
+        entry: Dict[str, Any] = {'type': 'finished', 'journal': journal}
+        if papers:
+            entry['papers'] = papers
+        with self._lock:
+            self._papers[journal].extend(papers or [])
+            self._finished.add(journal)
+        self._append(entry, sync=True)
+
+    def close(self):
+        with self._lock:
+            self._file.close()
@@ -0,0 +1,1042 @@
+"""
+Shared HTTP helpers for the journal scrapers
+
+The replication searches are written as step generators: instead of calling
+`self.session.get` directly they yield an `HttpRequest` and receive the response
+back. The same search code can then run on a blocking `requests.Session`
+(`run_steps`) or on an asyncio event loop (`run_steps_async`).
+
+All requests, sync or async, are throttled by a per-host `RateLimiter` and can
+be answered from an on-disk `ResponseCache` (see response_cache.py).
+"""
+
+import asyncio
+import json
+import logging
+import queue
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import timezone
+from email.utils import parsedate_to_datetime
+from itertools import count
+from typing import (Any, Callable, Dict, Generator, Hashable, Iterable, Iterator, List, NamedTuple, Optional,
+                    Tuple, TypeVar)
+from urllib.parse import urljoin, urlparse, urlunparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+from response_cache import CachedResponse, ResponseCache, match_domain, revalidation_headers
+
+try:
+    import aiohttp
+    import yarl
+except ImportError:  # Only needed for the async scraping mode
+    aiohttp = None
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar('T')
+
+# Requests per second and burst size for the hosts the scrapers talk to
+# (keys also match subdomains, e.g. 'openicpsr.org' covers www.openicpsr.org)
+DEFAULT_RATE_LIMITS = {
+    'api.crossref.org': (5.0, 5),
+    'api.datacite.org': (5.0, 5),
+    'zenodo.org': (1.0, 5),
+    'dataverse.harvard.edu': (2.0, 5),
+    'api.osf.io': (2.0, 5),
+    'openicpsr.org': (1.0, 2),
+    'aeaweb.org': (1.0, 2),
+}
+
+# Rate limit for hosts without an entry (publisher pages, doi.org, ...)
+DEFAULT_HOST_RATE_LIMIT = (2.0, 4)
+
+# Status codes after which a request is retried when the server sends Retry-After,
+# as long as the requested delay is at most MAX_RETRY_AFTER seconds
+RETRY_AFTER_STATUSES = (429, 503)
+MAX_RETRY_AFTER = 120
+
+# Connections kept alive per host by the shared scraper session
+DEFAULT_POOL_MAXSIZE = 50
+
+# Hosts whose connection pools the session keeps (publisher pages span many hosts)
+DEFAULT_POOL_CONNECTIONS = 100
+
+# Retries of 5xx responses and failed or reset connections, with exponential backoff
+DEFAULT_RETRIES = 2
+DEFAULT_BACKOFF_FACTOR = 0.5
+MAX_BACKOFF = 30
+RETRY_STATUSES = (500, 502, 503, 504)
+
+# Redirects followed by the async client (same limit as requests)
+REDIRECT_STATUSES = (301, 302, 303, 307, 308)
+MAX_REDIRECTS = 30
+
+# Status returned for requests an offline cache cannot answer
+OFFLINE_MISS_STATUS = 504
+
+# Request errors and statuses a TransportWatch counts as failed transport: the server
+# was not reached or did not answer, so a miss proves nothing
+TRANSPORT_ERRORS = (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError,
+                    requests.exceptions.RetryError, asyncio.TimeoutError) + ((aiohttp.ClientError,) if aiohttp else ())
+TRANSPORT_FAILURE_STATUSES = (429,) + RETRY_STATUSES
+
+# Rows per CrossRef works request; 1000 is the most the API returns per page
+CROSSREF_MIN_ROWS = 50
+CROSSREF_MAX_ROWS = 1000
+
+CROSSREF_WORKS_URL = 'https://api.crossref.org/works'
+
+# Methods whose responses go through the ResponseCache
+CACHED_METHODS = ('GET', 'HEAD')
+
+# Entries kept by the per-run memo of verify_url_has_content verdicts
+VERIFY_CACHE_SIZE = 10000
+
+# Bytes of a page verify_url_has_content reads at most while looking for content indicators
+VERIFY_MAX_BYTES = 512 * 1024
+
+# Size of the chunks a streamed response body (HttpRequest.scan) is read in
+STREAM_CHUNK_SIZE = 8192
+
+# Items buffered between the journal threads of iter_papers and its consumer
+STREAM_BUFFER_SIZE = 100
+
+
+class RateLimiter:
+    """Thread-safe token buckets keyed by hostname
+
+    Each host gets `rate` requests per second with bursts of up to `burst` requests.
+    Servers can slow us down with Retry-After and speed us up with CrossRef's
+    X-Rate-Limit-Limit / X-Rate-Limit-Interval headers (see update_from_response).
+    One limiter can be shared by several scrapers and by the async client.
+    """
+
+    def __init__(self, limits: Optional[Dict[str, Tuple[float, int]]] = None,
+                 default: Tuple[float, int] = DEFAULT_HOST_RATE_LIMIT):
+        """
+        Args:
+            limits: Per-host (requests/sec, burst) overriding DEFAULT_RATE_LIMITS,
+                    e.g. {'zenodo.org': (2.0, 10)}
+            default: (requests/sec, burst) for hosts without an entry
+        """
+        self.limits = dict(DEFAULT_RATE_LIMITS)
+        self.limits.update(limits or {})
+        self.default = default
+        self._lock = threading.Lock()
+        self._buckets: Dict[str, Dict[str, float]] = {}
+
+    def _bucket(self, url: str) -> Dict[str, float]:
+        """Get the bucket for a URL's host (call with the lock held)"""
+        host = (urlparse(url).hostname or '').lower()
+
+        # Use the most specific configured domain the host belongs to
+        domain = match_domain(host, self.limits)
+        key, (rate, burst) = (domain, self.limits[domain]) if domain else (host, self.default)
+
+        if key not in self._buckets:
+            self._buckets[key] = {'rate': rate, 'burst': burst, 'tokens': burst,
+                                  'updated': time.monotonic(), 'blocked_until': 0.0}
+        return self._buckets[key]
+
+    def reserve(self, url: str) -> float:
+        """Take a token for the URL's host and return how many seconds to wait before sending
+
+        Tokens may go negative: each caller reserves the next free slot, so waiting
+        threads and coroutines are spaced out at exactly the host's rate.
+        """
+        with self._lock:
+            bucket = self._bucket(url)
+            now = time.monotonic()
+            bucket['tokens'] = min(bucket['burst'], bucket['tokens'] + (now - bucket['updated']) * bucket['rate'])
+            bucket['updated'] = now
+            bucket['tokens'] -= 1
+
+            delay = -bucket['tokens'] / bucket['rate'] if bucket['tokens'] < 0 else 0.0
+            return max(delay, bucket['blocked_until'] - now)
+
+    def wait(self, url: str):
+        """Block until a request to the URL's host is allowed"""
+        delay = self.reserve(url)
+        if delay > 0:
+            time.sleep(delay)
+
+    async def wait_async(self, url: str):
+        """Wait on the event loop until a request to the URL's host is allowed"""
+        delay = self.reserve(url)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def update_from_response(self, url: str, status_code: int, headers) -> Optional[float]:
+        """Adjust the host's bucket from response headers
+
+        Returns the Retry-After delay in seconds if the server sent one, otherwise None.
+        """
+        retry_after = _parse_retry_after(headers.get('Retry-After'))
+        limit = headers.get('X-Rate-Limit-Limit')
+        interval = headers.get('X-Rate-Limit-Interval')
+
+        with self._lock:
+            bucket = self._bucket(url)
+
+            # CrossRef advertises its current limit, e.g. "50" requests per "1s"
+            if limit and interval:
+                try:
+                    limit = int(limit)
+                    seconds = float(interval.rstrip('s'))
+                    if limit > 0 and seconds > 0:
+                        bucket['rate'] = limit / seconds
+                        bucket['burst'] = limit
+                except ValueError:
+                    logger.debug(f"Unparseable rate limit headers for {url}: {limit}/{interval}")
+
+            if retry_after is not None:
+                bucket['blocked_until'] = max(bucket['blocked_until'], time.monotonic() + retry_after)
+                logger.debug(f"Retry-After {retry_after:.0f}s from {url} (status {status_code})")
+
+        return retry_after
+
+
+def _parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parse a Retry-After header (seconds or HTTP date) into seconds from now"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        date = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if date.tzinfo is None:
+        # '-0000' or no zone: HTTP dates are in UTC, not local time
+        date = date.replace(tzinfo=timezone.utc)
+    return max(0.0, date.timestamp() - time.time())
+
+
+def _should_retry(status_code: int, retry_after: Optional[float]) -> bool:
+    """Whether a response asks to be retried after a delay we are willing to wait"""
+    return (status_code in RETRY_AFTER_STATUSES and retry_after is not None
+            and retry_after <= MAX_RETRY_AFTER)
+
+
+class TransportConfig(NamedTuple):
+    """Connection pooling and retry settings of a scraper's session and async client
+
+    Both transports keep connections alive between requests (requests' session does
+    so until the server closes them). HTTP/2 is not available: neither requests nor
+    aiohttp speak it, so connection reuse comes from the per-host pools instead.
+    """
+    pool_maxsize: int = DEFAULT_POOL_MAXSIZE        # connections kept alive per host (sync)
+    pool_connections: int = DEFAULT_POOL_CONNECTIONS  # hosts with a pool kept (sync)
+    keepalive_timeout: float = 30.0                 # seconds an idle connection is kept (async)
+    retries: int = DEFAULT_RETRIES                  # retries of RETRY_STATUSES and connection errors
+    backoff_factor: float = DEFAULT_BACKOFF_FACTOR  # retry n waits backoff_factor * 2 ** (n - 1) seconds
+    retry_statuses: Tuple[int, ...] = RETRY_STATUSES
+
+    def backoff(self, failures: int) -> float:
+        """Seconds to wait before the retry following the given number of failures"""
+        return min(MAX_BACKOFF, self.backoff_factor * 2 ** (failures - 1))
+
+    def should_retry(self, status_code: int, retry_after: Optional[float], failures: int) -> bool:
+        """Whether a server error is retried (not when the server asked for a longer Retry-After)"""
+        return status_code in self.retry_statuses and retry_after is None and failures < self.retries
+
+
+class RateLimitedAdapter(HTTPAdapter):
+    """requests transport adapter sending every request through a RateLimiter
+
+    Responses with status 429/503 and a Retry-After header are retried after the
+    requested delay, up to `retry_after_attempts` times (see _should_retry). Other
+    server errors and failed or reset connections are retried with exponential
+    backoff as configured by `transport`; every attempt goes through the rate limiter.
+
+    With a ResponseCache, GET and HEAD requests are answered from the cache when
+    possible (without using any of the host's rate budget) and cacheable responses
+    are stored; expired responses with validators are revalidated with a conditional
+    request. Redirects are cached hop by hop, since requests follows them through
+    the adapter.
+    """
+
+    def __init__(self, rate_limiter: RateLimiter, retry_after_attempts: int = 2,
+                 cache: Optional[ResponseCache] = None, transport: Optional[TransportConfig] = None,
+                 **kwargs):
+        self.rate_limiter = rate_limiter
+        self.retry_after_attempts = retry_after_attempts
+        self.cache = cache
+        self.transport = transport or TransportConfig()
+        kwargs.setdefault('pool_connections', self.transport.pool_connections)
+        kwargs.setdefault('pool_maxsize', self.transport.pool_maxsize)
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        use_cache = self.cache is not None and request.method in CACHED_METHODS
+        stale = None
+        if use_cache:
+            cached = self.cache.get(request.method, request.url)
+            if cached is not None:
+                return self._cached_response(request, cached.status_code, cached.headers, cached.content)
+            if self.cache.offline:
+                logger.debug(f"Offline cache miss: {request.url}")
+                return self._cached_response(request, OFFLINE_MISS_STATUS, {}, b'')
+
+            # (responses with a TTL of 0 are not revalidated either)
+            stale = self.cache.lookup(request.method, request.url) if self.cache.ttl(request.url) else None
+            conditional = revalidation_headers(stale) if stale is not None else {}
+            if conditional and not any(name in request.headers for name in conditional):
+                request.headers.update(conditional)
+            else:
+                stale = None
+
+        retry_after_attempts = failures = 0
+        while True:
+            self.rate_limiter.wait(request.url)
+            try:
+                response = super().send(request, **kwargs)
+            except requests.ConnectionError as e:
+                if failures >= self.transport.retries:
+                    raise
+                failures += 1
+                logger.debug(f"Retrying {request.url} after connection error: {e}")
+                time.sleep(self.transport.backoff(failures))
+                continue
+
+            retry_after = self.rate_limiter.update_from_response(request.url, response.status_code,
+                                                                 response.headers)
+
+            if _should_retry(response.status_code, retry_after) and retry_after_attempts < self.retry_after_attempts:
+                retry_after_attempts += 1
+            elif self.transport.should_retry(response.status_code, retry_after, failures):
+                failures += 1
+                logger.debug(f"Retrying {request.url} after status {response.status_code}")
+                time.sleep(self.transport.backoff(failures))
+            else:
+                break
+
+            response.close()
+
+        if stale is not None and response.status_code == 304:
+            response.close()
+            logger.debug(f"Revalidated cached response: {request.url}")
+            cached = self.cache.revalidated(request.method, request.url, stale, response.headers)
+            return self._cached_response(request, cached.status_code, cached.headers, cached.content)
+
+        if use_cache and not kwargs.get('stream'):
+            self.cache.put(request.method, request.url, response.status_code, response.headers,
+                           response.content)
+        return response
+
+    def _cached_response(self, request, status_code: int, headers: Dict[str, str],
+                         content: bytes) -> requests.Response:
+        """Build a requests.Response replaying a cached response to `request`"""
+        response = requests.Response()
+        response.status_code = status_code
+        response.headers = CaseInsensitiveDict(headers)
+        response.encoding = get_encoding_from_headers(response.headers)
+        response._content = content
+        response._content_consumed = True
+        response.url = request.url
+        response.request = request
+        response.connection = self
+        return response
+
+
+def create_session(headers: Dict[str, str], rate_limiter: RateLimiter,
+                   pool_maxsize: Optional[int] = None,
+                   cache: Optional[ResponseCache] = None,
+                   transport: Optional[TransportConfig] = None) -> requests.Session:
+    """Create a requests session whose requests all go through the rate limiter
+
+    The session is shared by every thread of a scraper, so its connection pool keeps
+    up to `transport.pool_maxsize` connections per host (`pool_maxsize` overrides it)
+    instead of requests' default of 10. GET requests are served from `cache` when one
+    is given.
+    """
+    transport = transport or TransportConfig()
+    if pool_maxsize is not None:
+        transport = transport._replace(pool_maxsize=pool_maxsize)
+
+    session = requests.Session()
+    session.headers.update(headers)
+
+    adapter = RateLimitedAdapter(rate_limiter, cache=cache, transport=transport)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def crossref_rows(target: int) -> int:
+    """Rows per CrossRef page for a journal target
+
+    Small targets keep the old 50-row pages so no more items are parsed than before;
+    larger ones fetch the whole target per page, up to CROSSREF_MAX_ROWS.
+    """
+    return max(CROSSREF_MIN_ROWS, min(CROSSREF_MAX_ROWS, target))
+
+
+def fetch_crossref_batch(session, journal_issns: Dict[str, str], start_year: int, end_year: int,
+                         targets: Dict[str, int]) -> Dict[str, List[dict]]:
+    """Fetch the CrossRef works of several journals with a single cursor stream
+
+    All ISSNs go into one filter (CrossRef ORs repeated issn clauses), and each item
+    is routed back to its journal by ISSN, falling back to container-title. Items
+    keep CrossRef's newest-first order within each journal. Paging stops once every
+    journal has its target number of items or the results run out.
+
+    Args:
+        session: requests session used for the CrossRef requests
+        journal_issns: Journal name -> ISSN
+        start_year: Starting year for papers
+        end_year: Ending year for papers
+        targets: Journal name -> number of items wanted
+    """
+    journal_by_issn = {issn: name for name, issn in journal_issns.items()}
+    journal_by_title = {name.lower(): name for name in journal_issns}
+    items_by_journal: Dict[str, List[dict]] = {name: [] for name in journal_issns}
+
+    def wanted(name: str) -> bool:
+        return len(items_by_journal[name]) < targets.get(name, 0)
+
+    issn_filter = ','.join(f'issn:{issn}' for issn in journal_issns.values())
+    rows_per_request = crossref_rows(sum(targets.values()))
+    cursor = '*'
+
+    logger.info(f"Fetching {len(journal_issns)} journals from CrossRef in one batch ({start_year}-{end_year})")
+
+    for request_num in count():
+        params = {
+            'filter': f'{issn_filter},from-pub-date:{start_year},until-pub-date:{end_year}',
+            'rows': rows_per_request,
+            'cursor': cursor,
+            'select': 'title,author,published-print,published-online,DOI,abstract,container-title,ISSN',
+            'sort': 'published',
+            'order': 'desc'
+        }
+
+        try:
+            response = session.get(CROSSREF_WORKS_URL, params=params, timeout=30)
+
+            if response.status_code != 200:
+                logger.error(f"  API error: {response.status_code}")
+                break
+
+            data = response.json()
+            items = data.get('message', {}).get('items', [])
+            total_results = data.get('message', {}).get('total-results', 0)
+
+            logger.info(f"  Request {request_num + 1}: Got {len(items)} papers (Total available: {total_results})")
+
+            for item in items:
+                name = next((journal_by_issn[issn] for issn in item.get('ISSN', []) if issn in journal_by_issn),
+                            None)
+                if name is None:
+                    name = next((journal_by_title[title.lower()] for title in item.get('container-title', [])
+                                 if title.lower() in journal_by_title), None)
+                if name is None:
+                    logger.debug(f"  Could not route {item.get('DOI')} to a journal")
+                elif wanted(name):
+                    items_by_journal[name].append(item)
+
+            if not any(wanted(name) for name in journal_issns):
+                break
+
+            # Check if there are more results
+            if len(items) < rows_per_request:
+                break  # No more results
+
+            cursor = data.get('message', {}).get('next-cursor')
+            if not cursor:
+                break
+
+        except Exception as e:
+            logger.error(f"  Error fetching data: {e}")
+            break
+
+    return items_by_journal
+
+
+def iter_threaded(sources: Iterable[Callable[[], Iterator[T]]], max_workers: int,
+                  buffer_size: int = STREAM_BUFFER_SIZE) -> Iterator[T]:
+    """Run several generators on a thread pool and yield their items as they are produced
+
+    Items go through a bounded queue, so a slow consumer holds the workers back instead
+    of letting results pile up in memory. An exception in a worker is re-raised in the
+    consumer; when the consumer stops iterating, the workers stop at their next item.
+
+    Args:
+        sources: Functions returning the generators to run, one per task
+        max_workers: Number of generators run at the same time
+        buffer_size: Maximum number of items waiting for the consumer
+    """
+    sources = list(sources)
+    items: 'queue.Queue[Tuple[str, Any]]' = queue.Queue(maxsize=buffer_size)
+    stop = threading.Event()
+
+    def put(message: Tuple[str, Any]) -> bool:
+        while not stop.is_set():
+            try:
+                items.put(message, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def run(source: Callable[[], Iterator[T]]):
+        try:
+            generator = source()
+            try:
+                for item in generator:
+                    if not put(('item', item)):
+                        return
+            finally:
+                generator.close()
+        except Exception as e:
+            put(('error', e))
+        finally:
+            put(('done', None))
+
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    for source in sources:
+        executor.submit(run, source)
+
+    try:
+        remaining = len(sources)
+        while remaining:
+            kind, value = items.get()
+            if kind == 'done':
+                remaining -= 1
+            elif kind == 'error':
+                raise value
+            else:
+                yield value
+    finally:
+        stop.set()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+class MemoCache:
+    """Bounded, thread-safe least-recently-used mapping with hit/miss counters"""
+
+    def __init__(self, maxsize: int = VERIFY_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._data: 'OrderedDict[Hashable, Any]' = OrderedDict()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Return the value for key (marking it recently used), or default"""
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return default
+
+    def put(self, key: Hashable, value: Any):
+        """Store a value, evicting the least recently used entry when full"""
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            if len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+def normalize_url(url: str) -> str:
+    """Canonical form of a URL for memoization
+
+    Lowercases the scheme and host, drops default ports, fragments and trailing
+    slashes, so e.g. 'HTTPS://Zenodo.org:443/records/1/#files' -> 'https://zenodo.org/records/1'.
+    """
+    parsed = urlparse(url.strip())
+    scheme = parsed.scheme.lower()
+    netloc = (parsed.hostname or '').lower()
+    if parsed.port and (scheme, parsed.port) not in (('http', 80), ('https', 443)):
+        netloc = f"{netloc}:{parsed.port}"
+    return urlunparse((scheme, netloc, parsed.path.rstrip('/'), parsed.params, parsed.query, ''))
+
+
+class JournalCheck(NamedTuple):
+    """A journal page found by check_journal_supporting_info
+
+    `page` is the parsed page the check downloaded (None if it only found a URL),
+    and `verified` is the verify_url_has_content verdict for `url`.
+    """
+    url: str
+    page: Any
+    verified: bool
+
+
+class HttpRequest(NamedTuple):
+    """A request yielded by a step generator (mirrors requests.request arguments; GET by default)
+
+    With `scan`, the body of a 200 response is streamed to it chunk by chunk (bytes)
+    instead of being downloaded whole: reading stops and the connection is closed as
+    soon as `scan` returns True or `max_bytes` were read. The response sent back to
+    the step generator then has no usable body, and is not stored in the ResponseCache.
+    """
+    url: str
+    params: Optional[Dict[str, Any]] = None
+    timeout: float = 10
+    allow_redirects: bool = True
+    scan: Optional[Callable[[bytes], bool]] = None
+    max_bytes: Optional[int] = None
+    method: str = 'GET'
+    headers: Optional[Dict[str, str]] = None
+
+
+class FirstHit(NamedTuple):
+    """A step running several searches (step generators) at the same time
+
+    The runner sends back the result of the first search, in list order, that
+    returns a truthy value, as soon as every search before it has missed; searches
+    after a hit are cancelled. None is sent back if every search misses.
+    """
+    searches: List['Steps[Any]']
+
+
+# A step generator yields HttpRequests (or FirstHits), receives responses and returns a T
+Steps = Generator[Any, Any, T]
+
+
+def first_hit_steps(searches: List[Steps[Optional[T]]], parallel: bool = False) -> Steps[Optional[T]]:
+    """Return the result of the first search in list order that finds something
+
+    Sequentially, the searches after a hit never run. In parallel, they all start
+    at once (see FirstHit), so a paper without a package costs the slowest search
+    instead of the sum of all of them, and the list order still decides the winner.
+    """
+    if parallel and len(searches) > 1:
+        return (yield FirstHit(searches))
+
+    for search in searches:
+        result = yield from search
+        if result:
+            return result
+    return None
+
+
+class TransportWatch:
+    """Records whether a request of a search chain failed in transport
+
+    The repository searches catch their request errors and report a miss like any
+    other. Running a chain through `steps` tells a miss from a chain that could not
+    get every answer (TRANSPORT_ERRORS, or a status in TRANSPORT_FAILURE_STATUSES),
+    with either runner: the requests of the chain, and of the searches of its
+    FirstHits, pass through the watch on their way to the runner.
+    """
+
+    def __init__(self):
+        self.failed = False
+        self.requests = 0
+        # Status of the last response, None if the last request raised
+        self.last_status: Optional[int] = None
+
+    @property
+    def definitive(self) -> bool:
+        """Whether the chain sent no request or its last answer settles it (2xx, 404 or 410)"""
+        return self.requests == 0 or (self.last_status is not None and
+                                      (200 <= self.last_status < 300 or self.last_status in (404, 410)))
+
+    def steps(self, steps: Steps[T]) -> Steps[T]:
+        """Step generator running steps unchanged while watching their requests"""
+        try:
+            request = next(steps)
+            while True:
+                if isinstance(request, FirstHit):
+                    request = FirstHit([self.steps(search) for search in request.searches])
+                is_http = isinstance(request, HttpRequest)
+                if is_http:
+                    self.requests += 1
+                try:
+                    response = yield request
+                except Exception as e:
+                    if isinstance(e, TRANSPORT_ERRORS):
+                        self.failed = True
+                    if is_http:
+                        self.last_status = None
+                    request = steps.throw(e)
+                else:
+                    if is_http:
+                        self.last_status = response.status_code
+                        if response.status_code in TRANSPORT_FAILURE_STATUSES:
+                            self.failed = True
+                    request = steps.send(response)
+        except StopIteration as stop:
+            return stop.value
+        finally:
+            # Closed by the runner (a cancelled search): close the watched steps too
+            steps.close()
+
+
+def url_is_live_steps(url: str, timeout: float = 10) -> Steps[bool]:
+    """Whether a URL answers with status 200, checked without downloading the page
+
+    A HEAD request is tried first. Servers that answer it with anything but 200 or
+    404/410 (some reject HEAD) get a GET for the first byte only (Range: bytes=0-0;
+    if the range is ignored, the body is not read past its first chunk). With a
+    ResponseCache, HEAD answers are kept with their ETag / Last-Modified and later
+    revalidated with a conditional request.
+    """
+    response = yield HttpRequest(url, timeout=timeout, allow_redirects=True, method='HEAD')
+    if response.status_code == 200:
+        return True
+    if response.status_code in (404, 410):
+        return False
+
+    response = yield HttpRequest(url, timeout=timeout, allow_redirects=True, headers={'Range': 'bytes=0-0'},
+                                 scan=lambda chunk: True)
+    return response.status_code in (200, 206)
+
+
+def _scan_done(request: HttpRequest, chunk: bytes, read: int) -> bool:
+    """Feed a body chunk to request.scan; True once it is satisfied or max_bytes were read"""
+    return request.scan(chunk) or bool(request.max_bytes and read >= request.max_bytes)
+
+
+def _scan_response(response: requests.Response, request: HttpRequest):
+    """Stream the body of a (stream=True) 200 response to request.scan, then close the connection"""
+    try:
+        if response.status_code == 200:
+            read = 0
+            for chunk in response.iter_content(STREAM_CHUNK_SIZE):
+                read += len(chunk)
+                if _scan_done(request, chunk, read):
+                    break
+    finally:
+        response.close()
+
+
+def _pick_first_hit(results: List[Any], done: List[bool]) -> Tuple[bool, Any]:
+    """(decided, result) of a FirstHit given the searches finished so far"""
+    for result, finished in zip(results, done):
+        if not finished:
+            return False, None
+        if result:
+            return True, result
+    return True, None
+
+
+def run_steps(steps: Steps[T], session, cancelled: Optional[threading.Event] = None) -> Optional[T]:
+    """Run a step generator to completion with a blocking requests session
+
+    Exceptions raised by the request are thrown back into the generator, so the
+    try/except blocks around each request behave as with a direct session.get.
+    Once `cancelled` is set, the generator is closed before its next request and
+    None is returned.
+    """
+    try:
+        request = next(steps)
+        while True:
+            if cancelled is not None and cancelled.is_set():
+                steps.close()
+                return None
+            if isinstance(request, FirstHit):
+                request = steps.send(_run_first_hit(request.searches, session))
+                continue
+            try:
+                response = session.request(request.method, request.url, params=request.params,
+                                           headers=request.headers, timeout=request.timeout,
+                                           allow_redirects=request.allow_redirects,
+                                           stream=request.scan is not None)
+                if request.scan is not None:
+                    _scan_response(response, request)
+            except Exception as e:
+                request = steps.throw(e)
+            else:
+                request = steps.send(response)
+    except StopIteration as stop:
+        return stop.value
+
+
+def _run_first_hit(searches: List[Steps[Any]], session) -> Any:
+    """Run the searches of a FirstHit on threads sharing the session"""
+    results: List[Any] = [None] * len(searches)
+    done = [False] * len(searches)
+    cancel_events = [threading.Event() for _ in searches]
+
+    executor = ThreadPoolExecutor(max_workers=len(searches))
+    try:
+        futures = {executor.submit(run_steps, search, session, cancel_events[i]): i
+                   for i, search in enumerate(searches)}
+        for future in as_completed(futures):
+            i = futures[future]
+            try:
+                results[i] = future.result()
+            except Exception as e:
+                logger.debug(f"Search failed in parallel search: {e}")
+            done[i] = True
+
+            if results[i]:
+                # Lower-priority searches can no longer win
+                for event in cancel_events[i + 1:]:
+                    event.set()
+
+            decided, result = _pick_first_hit(results, done)
+            if decided:
+                return result
+        return None
+    finally:
+        for event in cancel_events:
+            event.set()
+        executor.shutdown(wait=False)
+
+
+async def run_steps_async(steps: Steps[T], client: 'AsyncHttpClient') -> T:
+    """Run a step generator to completion on the event loop using an AsyncHttpClient"""
+    try:
+        request = next(steps)
+        while True:
+            if isinstance(request, FirstHit):
+                request = steps.send(await _run_first_hit_async(request.searches, client))
+                continue
+            try:
+                response = await client.get(request)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                request = steps.throw(e)
+            else:
+                request = steps.send(response)
+    except StopIteration as stop:
+        return stop.value
+
+
+async def _run_first_hit_async(searches: List[Steps[Any]], client: 'AsyncHttpClient') -> Any:
+    """Run the searches of a FirstHit as tasks on the event loop"""
+    results: List[Any] = [None] * len(searches)
+    done = [False] * len(searches)
+    tasks = [asyncio.ensure_future(run_steps_async(search, client)) for search in searches]
+    index = {task: i for i, task in enumerate(tasks)}
+
+    try:
+        pending = set(tasks)
+        while pending:
+            finished, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in finished:
+                i = index[task]
+                if not task.cancelled():
+                    if task.exception() is not None:
+                        logger.debug(f"Search failed in parallel search: {task.exception()}")
+                    else:
+                        results[i] = task.result()
+                done[i] = True
+
+                if results[i]:
+                    # Lower-priority searches can no longer win
+                    for other in tasks[i + 1:]:
+                        other.cancel()
+
+            decided, result = _pick_first_hit(results, done)
+            if decided:
+                return result
+        return None
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+class AsyncResponse:
+    """Fully-read aiohttp response exposing the parts of requests.Response the scrapers use"""
+
+    def __init__(self, status_code: int, url: str, text: str, headers: Dict[str, str]):
+        self.status_code = status_code
+        self.url = url
+        self.text = text
+        self.headers = headers
+
+    def json(self) -> Any:
+        return json.loads(self.text)
+
+
+def _decode_text(content: bytes, headers: Dict[str, str]) -> str:
+    """Decode a response body using the charset of its Content-Type (UTF-8 otherwise)"""
+    encoding = 'utf-8'
+    for param in (headers.get('Content-Type') or headers.get('content-type') or '').split(';')[1:]:
+        name, _, value = param.strip().partition('=')
+        if name.lower() == 'charset' and value:
+            encoding = value.strip('"\'')
+    try:
+        return content.decode(encoding, errors='replace')
+    except LookupError:
+        return content.decode('utf-8', errors='replace')
+
+
+class AsyncHttpClient:
+    """aiohttp client with global and per-host limits on requests in flight
+
+    Use as an async context manager:
+
+        async with AsyncHttpClient(headers, max_concurrency=100, per_host_limit=10) as client:
+            result = await run_steps_async(steps, client)
+    """
+
+    def __init__(self, headers: Optional[Dict[str, str]] = None, max_concurrency: int = 100,
+                 per_host_limit: int = 10, host_limits: Optional[Dict[str, int]] = None,
+                 rate_limiter: Optional[RateLimiter] = None, retry_after_attempts: int = 2,
+                 cache: Optional[ResponseCache] = None, transport: Optional[TransportConfig] = None):
+        """
+        Args:
+            headers: Default headers sent with every request (e.g. the scraper session headers)
+            max_concurrency: Maximum number of requests in flight overall
+            per_host_limit: Maximum number of requests in flight per host
+            host_limits: Per-host overrides of per_host_limit, e.g. {'zenodo.org': 4}
+            rate_limiter: RateLimiter throttling requests per host (default: a new RateLimiter())
+            retry_after_attempts: Retries of 429/503 responses carrying Retry-After
+            cache: ResponseCache answering GET requests before they reach the network
+            transport: Keep-alive and retry settings (pool sizes are set by the limits above)
+        """
+        self.headers = dict(headers or {})
+        self.rate_limiter = rate_limiter or RateLimiter()
+        self.retry_after_attempts = retry_after_attempts
+        self.cache = cache
+        self.transport = transport or TransportConfig()
+        self.max_concurrency = max_concurrency
+        self.per_host_limit = per_host_limit
+        self.host_limits = dict(host_limits or {})
+        self._session = None
+        self._global_limit = None
+        self._host_semaphores: Dict[str, asyncio.Semaphore] = {}
+
+    async def __aenter__(self) -> 'AsyncHttpClient':
+        if aiohttp is None:
+            raise ImportError("aiohttp is required for async scraping: pip install aiohttp")
+
+        # Limits are enforced with semaphores below, so the connector itself is unbounded
+        connector = aiohttp.TCPConnector(limit=0, limit_per_host=0,
+                                         keepalive_timeout=self.transport.keepalive_timeout)
+        self._session = aiohttp.ClientSession(headers=self.headers, connector=connector)
+        self._global_limit = asyncio.Semaphore(self.max_concurrency)
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self._session.close()
+
+    def _host_semaphore(self, host: str) -> asyncio.Semaphore:
+        """Get (or lazily create) the semaphore limiting requests to one host"""
+        if host not in self._host_semaphores:
+            limit = self.host_limits.get(host, self.per_host_limit)
+            self._host_semaphores[host] = asyncio.Semaphore(limit)
+        return self._host_semaphores[host]
+
+    async def get(self, request: HttpRequest) -> AsyncResponse:
+        """Perform a rate-limited request and read the whole body (or stream it to request.scan)
+
+        Redirects are followed here rather than by aiohttp, so that every hop is
+        rate limited and cached under the same key as with the requests session.
+        """
+        # Encode the query string exactly like requests does, for identical cache keys
+        url = requests.Request('GET', request.url, params=request.params).prepare().url
+
+        for _ in range(MAX_REDIRECTS + 1):
+            response = await self._fetch(url, request)
+            location = response.headers.get('Location') or response.headers.get('location')
+            if not (request.allow_redirects and response.status_code in REDIRECT_STATUSES and location):
+                return response
+            url = requests.Request('GET', urljoin(url, location)).prepare().url
+
+        raise requests.TooManyRedirects(f"Exceeded {MAX_REDIRECTS} redirects: {request.url}")
+
+    async def _fetch(self, url: str, request: HttpRequest) -> AsyncResponse:
+        """Request a single URL, from the cache if possible, retrying as RateLimitedAdapter.send does"""
+        use_cache = self.cache is not None and request.method in CACHED_METHODS
+        stale = None
+        headers = dict(request.headers or {})
+        if use_cache:
+            cached = self.cache.get(request.method, url)
+            if cached is not None:
+                return self._replay(url, request, cached)
+            if self.cache.offline:
+                logger.debug(f"Offline cache miss: {url}")
+                return AsyncResponse(OFFLINE_MISS_STATUS, url, '', {})
+
+            stale = self.cache.lookup(request.method, url) if self.cache.ttl(url) else None
+            conditional = revalidation_headers(stale) if stale is not None else {}
+            if conditional and not any(name.lower() in map(str.lower, headers) for name in conditional):
+                headers.update(conditional)
+            else:
+                stale = None
+
+        retry_after_attempts = failures = 0
+        while True:
+            try:
+                status_code, response_headers, content = await self._get_once(url, request, headers)
+            except aiohttp.ClientConnectionError as e:
+                if failures >= self.transport.retries:
+                    raise
+                failures += 1
+                logger.debug(f"Retrying {url} after connection error: {e}")
+                await asyncio.sleep(self.transport.backoff(failures))
+                continue
+
+            retry_after = self.rate_limiter.update_from_response(url, status_code, response_headers)
+
+            if _should_retry(status_code, retry_after) and retry_after_attempts < self.retry_after_attempts:
+                retry_after_attempts += 1
+            elif self.transport.should_retry(status_code, retry_after, failures):
+                failures += 1
+                logger.debug(f"Retrying {url} after status {status_code}")
+                await asyncio.sleep(self.transport.backoff(failures))
+            else:
+                break
+
+        if stale is not None and status_code == 304:
+            logger.debug(f"Revalidated cached response: {url}")
+            return self._replay(url, request, self.cache.revalidated(request.method, url, stale, response_headers))
+
+        if use_cache and request.scan is None:
+            self.cache.put(request.method, url, status_code, response_headers, content)
+        return AsyncResponse(status_code, url, _decode_text(content, response_headers), response_headers)
+
+    @staticmethod
+    def _replay(url: str, request: HttpRequest, cached: CachedResponse) -> AsyncResponse:
+        """Response to a request from a cached response (whose body is fed to request.scan)"""
+        if request.scan is not None and cached.status_code == 200:
+            for start in range(0, len(cached.content), STREAM_CHUNK_SIZE):
+                chunk = cached.content[start:start + STREAM_CHUNK_SIZE]
+                if _scan_done(request, chunk, start + len(chunk)):
+                    break
+        return AsyncResponse(cached.status_code, url, _decode_text(cached.content, cached.headers), cached.headers)
+
+    async def _get_once(self, url: str, request: HttpRequest,
+                        headers: Dict[str, str]) -> Tuple[int, Dict[str, str], bytes]:
+        host = urlparse(url).hostname or ''
+
+        # Take the host slot first, and wait for the rate limiter before taking a global
+        # slot, so requests queued for a busy host don't hold up other hosts
+        async with self._host_semaphore(host):
+            await self.rate_limiter.wait_async(url)
+
+            async with self._global_limit:
+                client_timeout = aiohttp.ClientTimeout(total=request.timeout)
+                async with self._session.request(request.method, yarl.URL(url, encoded=True), headers=headers,
+                                                 timeout=client_timeout, allow_redirects=False) as response:
+                    if request.scan is None or response.status != 200:
+                        content = await response.read()
+                        return response.status, dict(response.headers), content
+
+                    chunks, read = [], 0
+                    async for chunk in response.content.iter_chunked(STREAM_CHUNK_SIZE):
+                        chunks.append(chunk)
+                        read += len(chunk)
+                        if _scan_done(request, chunk, read):
+                            # Drop the connection rather than read the rest of the body
+                            response.close()
+                            break
+                    return response.status, dict(response.headers), b''.join(chunks)
@@ -0,0 +1,234 @@
+"""
+Keyword scoring of paper topics for the journal scrapers
+
+classify_paper_topic scores every topic by how often its keywords occur in a
+paper's title and abstract (as substrings, some keywords counting double). A
+TopicMatcher compiles all the keyword lists into one regular expression shaped
+like a trie, so the text is scanned once whatever the number of keywords, and
+adds each keyword's occurrences to its topics with weights worked out in
+advance. The counts are those of `text.count(keyword)`.
+
+`TopicMatcher.classify_texts` labels many papers at once with NumPy instead:
+a batch of texts becomes one array of character codes, in which a table of the
+keywords' first three characters picks the candidate positions and every
+keyword is then compared at its candidates in a few vectorized steps. The
+(paper, keyword) counts form a sparse matrix that is multiplied by a keyword x
+topic weight matrix, so a whole archive can be relabelled with new keyword
+lists in seconds, without re-scraping.
+"""
+
+import re
+from collections import Counter
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+# Papers scanned together by classify_texts
+CLASSIFY_BATCH_SIZE = 10000
+
+# Keywords found by the vectorized scan start with a trigram of ASCII characters
+_GRAM = 3
+_ASCII = 128
+
+
+def _trie_pattern(keywords: Iterable[str]) -> str:
+    """Regular expression matching the longest of the keywords starting at a position
+
+    The keywords are merged into a trie (e.g. 'wage|war|welfare' becomes
+    'w(?:a(?:ge|r)|elfare)'), so matching follows one branch per character.
+    """
+    trie: Dict[str, dict] = {}
+    for keyword in keywords:
+        node = trie
+        for char in keyword:
+            node = node.setdefault(char, {})
+        node[''] = {}
+
+    def pattern(node: Dict[str, dict]) -> str:
+        branches = [re.escape(char) + pattern(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ''
+        branch = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        # A keyword ends here: longer keywords are tried first (greedy), then this one
+        return f'(?:{branch})?' if '' in node else branch
+
+    return pattern(trie)
+
+
+def _trigram(codes: np.ndarray) -> np.ndarray:
+    """Number (below _ASCII ** 3) of the trigram of ASCII codes starting at each position"""
+    codes = codes.astype(np.int32)
+    return (codes[:-2] << 14) | (codes[1:-1] << 7) | codes[2:]
+
+
+def _overlaps_itself(keyword: str) -> bool:
+    """Whether two occurrences of a keyword can overlap (e.g. 'abab' in 'ababab')"""
+    return any(keyword[:i] == keyword[-i:] for i in range(1, len(keyword)))
+
+
+class TopicMatcher:
+    """Scores text against the keyword lists of several topics in a single pass"""
+
+    def __init__(self, topic_keywords: Dict[str, List[str]], weighted_keywords: Iterable[str] = (),
+                 weight: int = 2):
+        """
+        Args:
+            topic_keywords: Keywords of each topic (matched in lowercase)
+            weighted_keywords: Lowercase keywords whose occurrences count `weight` times
+            weight: Weight of the weighted keywords (others count once)
+        """
+        self.topic_keywords = {topic: list(keywords) for topic, keywords in topic_keywords.items()}
+        weighted_keywords = set(weighted_keywords)
+
+        # (topic, weight) of each keyword, once per list it appears in
+        self._targets: Dict[str, List[Tuple[str, int]]] = {}
+        for topic, keywords in self.topic_keywords.items():
+            for keyword in keywords:
+                keyword = keyword.lower()
+                self._targets.setdefault(keyword, []).append(
+                    (topic, weight if keyword in weighted_keywords else 1))
+
+        # Keywords whose occurrences can't be counted from the matches (empty or overlapping
+        # themselves) are counted with str.count instead
+        self._counted = [k for k in self._targets if not k or _overlaps_itself(k)]
+        matched = [k for k in self._targets if k and not _overlaps_itself(k)]
+        self._pattern = re.compile(_trie_pattern(matched)) if matched else None
+
+        # Every keyword found at a position implies the keywords that are prefixes of it
+        self._prefixes = {k: [p for p in matched if k.startswith(p)] for k in matched}
+
+        # Weight of each keyword (rows, self._targets order) in each topic (columns)
+        self._topics = list(self.topic_keywords)
+        self._weights = np.zeros((len(self._targets), len(self._topics)), dtype=np.int64)
+        for row, targets in enumerate(self._targets.values()):
+            for topic, topic_weight in targets:
+                self._weights[row, self._topics.index(topic)] += topic_weight
+
+        # Keywords the vectorized scan of classify_texts finds (their rows, grouped by first
+        # trigram, as character codes), and the rows of the others, counted text by text
+        self._scanned: Dict[int, List[Tuple[int, np.ndarray]]] = {}
+        self._batch_counted = []
+        for row, keyword in enumerate(self._targets):
+            codes = np.array([ord(char) for char in keyword], dtype=np.uint8) \
+                if keyword in matched and len(keyword) >= _GRAM and all(0 < ord(c) < _ASCII for c in keyword) \
+                else None
+            if codes is None:
+                self._batch_counted.append(row)
+            else:
+                self._scanned.setdefault(_trigram(codes)[0], []).append((row, codes))
+        self._trigram_table = np.zeros(_ASCII ** _GRAM, dtype=bool)
+        self._trigram_table[list(self._scanned)] = True
+
+    def counts(self, text: str) -> Counter:
+        """Occurrences of each keyword in lowercase text, as text.count(keyword) gives them"""
+        longest: Counter = Counter()
+        if self._pattern is not None:
+            search = self._pattern.search
+            match = search(text)
+            while match:
+                longest[match.group()] += 1
+                match = search(text, match.start() + 1)
+
+        counts: Counter = Counter()
+        for keyword, occurrences in longest.items():
+            for prefix in self._prefixes[keyword]:
+                counts[prefix] += occurrences
+        for keyword in self._counted:
+            counts[keyword] = text.count(keyword)
+        return counts
+
+    def scores(self, text: str) -> Dict[str, int]:
+        """Weighted keyword occurrences of each topic in lowercase text"""
+        scores = dict.fromkeys(self.topic_keywords, 0)
+        for keyword, occurrences in self.counts(text).items():
+            for topic, weight in self._targets[keyword]:
+                scores[topic] += occurrences * weight
+        return scores
+
+    def classify(self, text: str, default: str) -> str:
+        """Topic with the highest score in lowercase text (the first one on ties), or default if none scores"""
+        scores = self.scores(text)
+        if scores:
+            best_topic = max(scores, key=scores.get)
+            if scores[best_topic] > 0:
+                return best_topic
+        return default
+
+    def score_matrix(self, texts: Sequence[str]) -> np.ndarray:
+        """Scores of lowercase texts (rows) in each topic (columns, topic_keywords order)
+
+        Each row equals `scores(text)`. Every occurrence of a keyword becomes a
+        (text, keyword) entry of a sparse count matrix, which is multiplied by the
+        weights of the keywords in each topic.
+        """
+        scores = np.zeros((len(texts), len(self._topics)), dtype=np.int64)
+        for start in range(0, len(texts), CLASSIFY_BATCH_SIZE):
+            batch = list(texts[start:start + CLASSIFY_BATCH_SIZE])
+            scores[start:start + len(batch)] = self._batch_scores(batch)
+        return scores
+
+    def _batch_scores(self, texts: List[str]) -> np.ndarray:
+        scores = np.zeros((len(texts), len(self._topics)), dtype=np.int64)
+
+        if self._scanned and texts:
+            # Character codes of the texts, separated (and padded) by 0, non-ASCII characters
+            # also 0: neither is in a scanned keyword, so no occurrence spans two texts
+            joined = '\x00'.join(texts) + '\x00' * max(len(c) for g in self._scanned.values() for _, c in g)
+            codes = np.frombuffer(joined.encode('utf-32-le'), dtype=np.uint32)
+            codes = np.where(codes < _ASCII, codes, 0).astype(np.uint8)
+            starts = np.cumsum([0] + [len(text) + 1 for text in texts[:-1]])
+
+            # Positions whose trigram starts a keyword, grouped by trigram
+            trigrams = _trigram(codes)
+            candidates = np.flatnonzero(self._trigram_table[trigrams])
+            candidates = candidates[np.argsort(trigrams[candidates], kind='stable')]
+            candidate_trigrams = trigrams[candidates]
+
+            text_indices, rows = [], []
+            for trigram, keywords in self._scanned.items():
+                lo, hi = np.searchsorted(candidate_trigrams, [trigram, trigram + 1])
+                for row, keyword_codes in keywords:
+                    positions = candidates[lo:hi]
+                    for offset in range(_GRAM, len(keyword_codes)):
+                        positions = positions[codes[positions + offset] == keyword_codes[offset]]
+                    text_indices.append(np.searchsorted(starts, positions, side='right') - 1)
+                    rows.append(np.full(len(positions), row))
+
+            # Sparse (text, keyword) -> count matrix, times the keyword weights
+            entries, counts = np.unique(np.concatenate(text_indices) * len(self._targets) + np.concatenate(rows),
+                                        return_counts=True)
+            entry_texts, entry_rows = np.divmod(entries, len(self._targets))
+            np.add.at(scores, entry_texts, counts[:, None] * self._weights[entry_rows])
+
+        if self._batch_counted:
+            keywords = list(self._targets)
+            counts = np.array([[text.count(keywords[row]) for row in self._batch_counted] for text in texts],
+                              dtype=np.int64).reshape(len(texts), len(self._batch_counted))
+            scores += counts @ self._weights[self._batch_counted]
+        return scores
+
+    def classify_texts(self, texts: Sequence[str], default: str) -> np.ndarray:
+        """Topics of many lowercase texts, each as classify(text, default) gives it"""
+        scores = self.score_matrix(texts)
+        labels = np.array(self._topics + [default], dtype=object)
+        if not self._topics:
+            return labels[np.zeros(len(texts), dtype=np.int64)]
+        # argmax takes the first topic on ties, like max in classify
+        best = scores.argmax(axis=1)
+        best[scores.max(axis=1) <= 0] = len(self._topics)
+        return labels[best]
+
+
+def paper_texts(df: pd.DataFrame) -> pd.Series:
+    """Lowercase title and abstract of each paper of a result set, as classify_paper_topic reads them
+
+    Papers without an abstract column (or with a missing or 'N/A' abstract) are read
+    from their title twice, as the scrapers classify them while scraping.
+    """
+    titles = df['title'].fillna('').astype(str) if 'title' in df else pd.Series('', index=df.index)
+    if 'abstract' in df:
+        abstracts = df['abstract'].where(df['abstract'].notna() & (df['abstract'] != 'N/A'), titles).astype(str)
+    else:
+        abstracts = titles
+    return (titles + ' ' + abstracts).str.lower()